@@ -2,32 +2,47 @@
 
 from __future__ import print_function
 import sys
-import json
 import os
 import logging
 import logging.config
+import datetime
 import structlog
-import functools
 import traceback
-try:
-    from rich.console import Console
-    from rich.table import Table
-    from rich.text import Text
-except ImportError:
-    pass
 
 from mflog.utils import level_name_to_level_no, Config, \
-    get_level_no_from_logger_name, write_with_lock, flush_with_lock, \
-    __reset_level_from_logger_name_cache, \
-    get_resolved_fancy_output_config_value
+    get_level_no_from_logger_name, \
+    __reset_level_from_logger_name_cache, reset_extra_context_cache, \
+    get_standard_logger_level_no
 from mflog.utils import dump_locals as _dump_locals
 from mflog.processors import fltr, add_level, add_pid, add_exception_info, \
-    kv_renderer, add_extra_context
+    add_extra_context, truncate, add_callsite, CALLSITE_KEY
 from mflog.unittests import UNIT_TESTS_STDOUT, UNIT_TESTS_STDERR, \
-    UNIT_TESTS_JSON, UNIT_TESTS_MODE
-from mflog.syslog import SyslogLogger
+    UNIT_TESTS_JSON, UNIT_TESTS_MODE  # noqa: F401
+from mflog.syslog import SyslogLogger  # noqa: F401
+from mflog.profiling import wrap_processor, install_report
+from mflog.metrics import record_event, record_error, start_exporter, \
+    stats  # noqa: F401
+from mflog.formatters import register_formatter  # noqa: F401
+from mflog.record import EventRecord, BOUND_CONTEXT_KEY, get_bound_context
+from mflog.sinks import Sink, JsonFileSink, ShmSink, get_sinks, \
+    reset_sinks, flush_console_buffer  # noqa: F401
+from mflog import flight_recorder, volume
+from mflog.context import merge_context, bind_context, unbind_context, \
+    clear_context, reset_context, get_context, bound_context  # noqa: F401
 
 CONFIGURATION_SET = False
+STANDARD_LOGGING_REDIRECT = False
+# names of standard logging loggers with a level set by mflog
+STANDARD_LOGGING_MANAGED_LOGGERS = set()
+# processors applied to flight recorder events (when they are dumped)
+_FLIGHT_RECORDER_CHAIN = [
+    add_level,
+    add_pid,
+    add_extra_context,
+    add_exception_info,
+    truncate,
+    structlog.processors.UnicodeDecoder()
+]
 
 
 class StructlogHandler(logging.Handler):
@@ -51,7 +66,16 @@ class StructlogHandler(logging.Handler):
         return self.__loggers[name]
 
     def emit(self, record):
+        if not flight_recorder.ENABLED and \
+                record.levelno < get_level_no_from_logger_name(record.name):
+            if record.name not in STANDARD_LOGGING_MANAGED_LOGGERS:
+                # this logger was created after the last levels sync
+                _sync_standard_logger_level(logging.getLogger(record.name))
+            return
         kwargs = {'name': record.name}
+        if Config.callsite:
+            kwargs[CALLSITE_KEY] = (record.pathname, record.funcName,
+                                    record.lineno)
         if record.exc_info:
             kwargs['exc_info'] = record.exc_info
         logger = self.__get_logger(record.name)
@@ -77,188 +101,128 @@ class StructlogHandler(logging.Handler):
             f(record.msg, *(record.args), **kwargs)
 
 
-class MFLogLogger(object):
+def _sync_standard_logger_level(logger):
+    name = logger.name
+    if logger.level == logging.NOTSET or \
+            name in STANDARD_LOGGING_MANAGED_LOGGERS:
+        level = get_standard_logger_level_no(name)
+        if logger.level != level:
+            # (setLevel() clears the cache of all loggers)
+            logger.setLevel(level)
+        STANDARD_LOGGING_MANAGED_LOGGERS.add(name)
+
+
+def _sync_standard_logging_levels():
+    """Push mflog levels into standard logging loggers.
+
+    So disabled standard logging calls are filtered by the standard
+    logging library itself (before the creation of a LogRecord).
+
+    Note: loggers with a level explicitly set (by someone else) are
+    not modified.
+
+    """
+    root_logger = logging.getLogger()
+    root_logger.setLevel(get_standard_logger_level_no("root"))
+    STANDARD_LOGGING_MANAGED_LOGGERS.add(root_logger.name)
+    for logger in list(logging.Logger.manager.loggerDict.values()):
+        if isinstance(logger, logging.Logger):
+            _sync_standard_logger_level(logger)
+
+
+def _unsync_standard_logging_levels():
+    for name in STANDARD_LOGGING_MANAGED_LOGGERS:
+        if name == "root":
+            logger = logging.getLogger()
+        else:
+            logger = logging.getLogger(name)
+        logger.setLevel(logging.NOTSET)
+    STANDARD_LOGGING_MANAGED_LOGGERS.clear()
 
-    _unittests_stdout = None
-    _unittests_stderr = None
-    _unittests_json = None
+
+class MFLogLogger(object):
 
     def __init__(self, *args):
-        self._json_file = None
-        self._json_logger = None
-        self._syslog_logger = None
         if len(args) > 0:
             self.name = args[0]
         else:
             self.name = 'root'
-        self._stdout_print_logger = structlog.PrintLogger(sys.stdout)
-        self._stderr_print_logger = structlog.PrintLogger(sys.stderr)
-        if Config.syslog_address:
-            self._syslog_logger = SyslogLogger(Config.syslog_address,
-                                               Config.syslog_format)
-        if Config.json_file or UNIT_TESTS_MODE:
-            if UNIT_TESTS_MODE or Config.json_file is None:
-                self._json_file = open('/dev/null', 'a')
-                self._json_logger = structlog.PrintLogger(self._json_file)
-            else:
-                self._json_file = open(Config.json_file, 'a')
-                self._json_logger = structlog.PrintLogger(self._json_file)
-                self._json_logger._write = functools.partial(write_with_lock,
-                                                             self._json_file)
-                self._json_logger._flush = functools.partial(flush_with_lock,
-                                                             self._json_file)
-        if UNIT_TESTS_MODE:
-            self._stdout_print_logger._flush = lambda *args, **kwargs: None
-            self._stdout_print_logger._write = UNIT_TESTS_STDOUT.append
-            self._stderr_print_logger._flush = lambda *args, **kwargs: None
-            self._stderr_print_logger._write = UNIT_TESTS_STDERR.append
-            self._json_logger._flush = lambda *args, **kwargs: None
-            self._json_logger._write = UNIT_TESTS_JSON.append
-        self._json_only_keys = Config.json_only_keys
 
     def close(self):
-        if self._json_file:
-            try:
-                self._json_file.close()
-            except Exception:
-                pass
-        if self._syslog_logger is not None:
-            self._syslog_logger.close()
+        # outputs are shared sinks (see mflog.sinks), nothing to close here
+        pass
 
-    def __del__(self):
-        self.close()
+    def _msg(self, stream, event_dict):
+        self._write(self._get_records(stream, event_dict))
 
-    def _msg(self, std_logger, **event_dict):
-        try:
-            self._json(**event_dict)
-        except Exception as e:
-            print("MFLOG ERROR: can't write log message to json output "
-                  "with exception: %s" % e, file=sys.stderr)
-            traceback.print_exc(file=sys.stderr)
-        try:
-            self._syslog(**event_dict)
-        except Exception as e:
-            print("MFLOG ERROR: can't write log message to syslog output "
-                  "with exception: %s" % e, file=sys.stderr)
-            traceback.print_exc(file=sys.stderr)
-        fancy = get_resolved_fancy_output_config_value(f=std_logger._file)
-        if fancy:
-            try:
-                self._fancy_msg(std_logger._file, **event_dict)
-                return
-            except Exception:
-                # can't write to fancy output, let's fallback silently to
-                # standard logging
-                pass
-        try:
-            std_logger.msg(self._format(event_dict))
-        except Exception as e:
-            print("MFLOG ERROR: can't write log message to stdout/err "
-                  "with exception: %s" % e, file=sys.stderr)
-            traceback.print_exc(file=sys.stderr)
+    def _get_records(self, stream, event_dict):
+        """Build the event records of an event dict.
 
-    def _fancy_msg(self, f, **event_dict):
-        c = Console(file=f, highlight=False, emoji=False, markup=False)
-        lll = event_dict.pop('level').lower()
-        llu = lll.upper()
-        exc = event_dict.pop('exception', None)
-        event_dict.pop('exception_type', None)
-        event_dict.pop('exception_file', None)
-        name = event_dict.pop('name', 'root')
-        pid = event_dict.pop('pid')
-        ts = event_dict.pop('timestamp')[0:-3] + "Z"
-        try:
-            msg = event_dict.pop('event')
-        except KeyError:
-            msg = "None"
-        for key in self._json_only_keys:  # pylint: disable=E1133
-            try:
-                event_dict.pop(key)
-            except KeyError:
-                pass
-        extra = ""
-        if len(event_dict) > 0:
-            extra = kv_renderer(None, None, event_dict)
-        if lll in ['notset', 'debug', 'info', 'warning',
-                   'error', 'critical']:
-            ls = "logging.level.%s" % lll
-        else:
-            ls = "none"
-        output = Table(show_header=False, expand=True, box=None,
-                       padding=(0, 1, 0, 0))
-        output.add_column(style="log.time")
-        output.add_column(width=10, justify="center")
-        output.add_column(justify="center")
-        output.add_column(ratio=1)
-        row = []
-        row.append(Text(ts))
-        row.append(Text("[%s]" % llu, style=ls))
-        row.append(Text(name, style="bold") + Text("#") + Text("%i" % pid,
-                                                               style="yellow"))
-        row.append(Text(msg))
-        output.add_row(*row)
-        if extra != "":
-            output.add_row(
-                "", "", "",
-                Text("{ ", style="repr.attrib_name") +
-                Text(extra, style="repr.attrib_name") +
-                Text(" }", style="repr.attrib_name"))
-        c.print(output)
-        if exc is not None:
-            c.print_exception()
-            if Config.auto_dump_locals:
-                _dump_locals(f)
-
-    def _msg_stdout(self, **event_dict):
-        self._msg(self._stdout_print_logger, **event_dict)
-
-    def _msg_stderr(self, **event_dict):
-        self._msg(self._stderr_print_logger, **event_dict)
-
-    def _json(self, **event_dict):
-        if Config.json_file is None and not UNIT_TESTS_MODE:
-            return
-        method_level_no = level_name_to_level_no(event_dict['level'])
-        if method_level_no < level_name_to_level_no(Config.json_minimal_level):
-            return
-        self._json_logger.msg(json.dumps(event_dict))
+        Returns:
+            (list) A list of (EventRecord, list of sinks) tuples (with
+            flight recorder events first).
 
-    def _syslog(self, **event_dict):
-        if Config.syslog_address is None:
-            return
-        method_level_no = level_name_to_level_no(event_dict['level'])
-        syslog_minimal_level = Config.syslog_minimal_level
-        if method_level_no < level_name_to_level_no(syslog_minimal_level):
-            return
-        self._syslog_logger.msg(event_dict)
+        """
+        sinks = get_sinks()
+        res = []
+        recorded = event_dict.pop("_mflog_flight_recorder", None)
+        if recorded:
+            res.extend(self._get_flight_recorder_records(recorded, sinks))
+        event = EventRecord(event_dict, stream)
+        res.append((event, [x for x in sinks if x.accept(event)]))
+        return res
+
+    def _write(self, records):
+        for event, sinks in records:
+            for sink in sinks:
+                self._emit(sink, event)
 
-    def _format(self, event_dict):
-        level = "[%s]" % event_dict.pop('level').upper()
-        ts = event_dict.pop('timestamp')
-        name = event_dict.pop('name', 'root')
-        pid = event_dict.pop('pid')
+    def _emit(self, sink, event):
         try:
-            msg = event_dict.pop('event')
-        except KeyError:
-            msg = "None"
-        exc = event_dict.pop('exception', None)
-        event_dict.pop('exception_type', None)
-        event_dict.pop('exception_file', None)
-        for key in self._json_only_keys:  # pylint: disable=E1133
+            size = sink.emit(event)
+            record_event(sink.name, event.level, size)
+        except Exception as e:
+            record_error(sink.name)
+            print("MFLOG ERROR: can't write log message to %s output "
+                  "with exception: %s" % (sink.name, e), file=sys.stderr)
+            traceback.print_exc(file=sys.stderr)
+            return
+        if volume.ENABLED:
+            # (not a sink error, the message is already written)
             try:
-                event_dict.pop(key)
-            except KeyError:
-                pass
-        extra = ""
-        if len(event_dict) > 0:
-            extra = " {%s}" % kv_renderer(None, None, event_dict)
-        tmp = "%s %10s (%s#%i) %s%s" % (ts, level, name, pid, msg, extra)
-        if exc is not None:
-            tmp = tmp + "\n" + exc
-        return tmp
-
-    def _json_format(self, event_dict):
-        return json.dumps(event_dict)
+                volume.record(sink.name, event, size)
+            except Exception as e:
+                print("MFLOG ERROR: can't profile log volume with "
+                      "exception: %s" % e, file=sys.stderr)
+
+    def _get_flight_recorder_records(self, recorded, sinks):
+        # minimal levels of sinks are ignored here
+        sinks = [x for x in sinks if isinstance(x, (JsonFileSink, ShmSink))]
+        if len(sinks) == 0:
+            return []
+        res = []
+        for t, method_name, event_dict, context in recorded:
+            # (the callsite is not resolved for recorded events)
+            event_dict.pop(CALLSITE_KEY, None)
+            if context:
+                # the context captured when the event was recorded (the
+                # current one can be different)
+                for k, v in context.items():
+                    if k not in event_dict:
+                        event_dict[k] = v
+            for processor in _FLIGHT_RECORDER_CHAIN:
+                event_dict = processor(None, method_name, event_dict)
+            event_dict['timestamp'] = datetime.datetime.fromtimestamp(
+                t, datetime.timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+            event_dict['flight_recorder'] = True
+            res.append((EventRecord(event_dict, "stderr"), sinks))
+        return res
+
+    def _msg_stdout(self, event_dict):
+        self._msg("stdout", event_dict)
+
+    def _msg_stderr(self, event_dict):
+        self._msg("stderr", event_dict)
 
     def isEnabledFor(self, level):
         logger_level_no = \
@@ -283,6 +247,21 @@ class MFLogLoggerFactory(object):
 
 class MFBoundLogger(structlog.stdlib.BoundLogger):
 
+    def _process_event(self, method_name, event, event_kw):
+        args, kwargs = structlog.stdlib.BoundLogger._process_event(
+            self, method_name, event, event_kw)
+        # the bound context is pre-rendered once per bound logger
+        # (bind() returns a new logger with a new context dict)
+        try:
+            bound = self._mflog_bound
+        except AttributeError:
+            bound = get_bound_context(self._context)
+            self._mflog_bound = bound
+        if bound is not None and len(args) == 1 and \
+                isinstance(args[0], dict):
+            args[0][BOUND_CONTEXT_KEY] = bound
+        return args, kwargs
+
     def die(self, *args, **kwargs):
         if len(args) == 0:
             self.exception("die() called", **kwargs)
@@ -290,10 +269,11 @@ class MFBoundLogger(structlog.stdlib.BoundLogger):
             self.exception(*args, **kwargs)
         if Config.auto_dump_locals:
             _dump_locals()
+        flush_console_buffer()
         sys.exit(1)
 
-    def dump_locals(self):
-        res = _dump_locals()
+    def dump_locals(self, f=sys.stderr):
+        res = _dump_locals(f)
         if not res:
             self.warning("can't dump locals")
 
@@ -303,13 +283,35 @@ def set_config(minimal_level=None, json_minimal_level=None,
                thread_local_context=False, extra_context_func=None,
                json_only_keys=None, standard_logging_redirect=None,
                override_dict={}, syslog_address=None, syslog_format=None,
-               fancy_output=None, auto_dump_locals=True):
+               fancy_output=None, auto_dump_locals=True,
+               extra_context_ttl=None, extra_context_static=None,
+               contextvars_context=False, aio_queue_size=None,
+               exception_dedup_window=None, dump_locals_target=None,
+               dump_locals_max_value_size=None,
+               dump_locals_max_total_size=None, dump_locals_json=None,
+               metrics_textfile=None, metrics_textfile_interval=None,
+               profile=None, profile_signal=None, sinks=None,
+               flight_recorder_size=None, flight_recorder_scope=None,
+               json_event_template=None, json_transport=None,
+               shm_dir=None, shm_slot_size=None, shm_slot_count=None,
+               gelf_address=None, gelf_minimal_level=None,
+               gelf_compression=None, gelf_chunk_size=None,
+               console_buffer_size=None, console_flush_interval=None,
+               json_durability=None, json_fsync_interval=None,
+               json_sync_level=None, max_field_size=None,
+               max_event_size=None, json_max_event_size=None,
+               syslog_max_event_size=None, volume_profile=None,
+               volume_profile_capacity=None, callsite=None,
+               journald_socket=None, journald_minimal_level=None):
     """Set the logging configuration.
 
     The configuration is cached. So you can call this several times.
 
     """
-    global CONFIGURATION_SET
+    global CONFIGURATION_SET, STANDARD_LOGGING_REDIRECT
+    if thread_local_context and contextvars_context:
+        raise Exception("thread_local_context and contextvars_context "
+                        "can't be used at the same time")
     Config.set_instance(minimal_level=minimal_level,
                         json_minimal_level=json_minimal_level,
                         json_file=json_file,
@@ -321,7 +323,49 @@ def set_config(minimal_level=None, json_minimal_level=None,
                         syslog_address=syslog_address,
                         syslog_format=syslog_format,
                         fancy_output=fancy_output,
-                        auto_dump_locals=auto_dump_locals)
+                        auto_dump_locals=auto_dump_locals,
+                        extra_context_ttl=extra_context_ttl,
+                        extra_context_static=extra_context_static,
+                        aio_queue_size=aio_queue_size,
+                        exception_dedup_window=exception_dedup_window,
+                        dump_locals_target=dump_locals_target,
+                        dump_locals_max_value_size=dump_locals_max_value_size,
+                        dump_locals_max_total_size=dump_locals_max_total_size,
+                        dump_locals_json=dump_locals_json,
+                        metrics_textfile=metrics_textfile,
+                        metrics_textfile_interval=metrics_textfile_interval,
+                        profile=profile, profile_signal=profile_signal,
+                        sinks=sinks,
+                        flight_recorder_size=flight_recorder_size,
+                        flight_recorder_scope=flight_recorder_scope,
+                        json_event_template=json_event_template,
+                        json_transport=json_transport, shm_dir=shm_dir,
+                        shm_slot_size=shm_slot_size,
+                        shm_slot_count=shm_slot_count,
+                        gelf_address=gelf_address,
+                        gelf_minimal_level=gelf_minimal_level,
+                        gelf_compression=gelf_compression,
+                        gelf_chunk_size=gelf_chunk_size,
+                        console_buffer_size=console_buffer_size,
+                        console_flush_interval=console_flush_interval,
+                        json_durability=json_durability,
+                        json_fsync_interval=json_fsync_interval,
+                        json_sync_level=json_sync_level,
+                        max_field_size=max_field_size,
+                        max_event_size=max_event_size,
+                        json_max_event_size=json_max_event_size,
+                        syslog_max_event_size=syslog_max_event_size,
+                        volume_profile=volume_profile,
+                        volume_profile_capacity=volume_profile_capacity,
+                        callsite=callsite,
+                        journald_socket=journald_socket,
+                        journald_minimal_level=journald_minimal_level)
+    reset_sinks()
+    flight_recorder.configure(Config.flight_recorder_size,
+                              Config.flight_recorder_scope,
+                              with_context=contextvars_context)
+    volume.configure(Config.volume_profile, Config.volume_profile_capacity,
+                     Config.profile_signal)
     if standard_logging_redirect is not None:
         slr = standard_logging_redirect
     else:
@@ -346,35 +390,53 @@ def set_config(minimal_level=None, json_minimal_level=None,
         logging.config.dictConfig(d)
         root_logger = logging.getLogger()
         root_logger.addHandler(StructlogHandler())
-        root_logger.setLevel(logging.NOTSET)
+        if flight_recorder.ENABLED:
+            # we need all standard logging events (to record them)
+            _unsync_standard_logging_levels()
+        else:
+            _sync_standard_logging_levels()
     else:
         root_logger = logging.getLogger()
         root_logger.handlers = [x for x in root_logger.handlers
                                 if not isinstance(x, StructlogHandler)]
+        _unsync_standard_logging_levels()
+    STANDARD_LOGGING_REDIRECT = slr
     # Configure structlog
     context_class = None
     if thread_local_context:
         context_class = structlog.threadlocal.wrap_dict(dict)
+    chain = [fltr]
+    if contextvars_context:
+        chain.append(merge_context)
+    if Config.callsite:
+        chain.append(add_callsite)
+    chain = chain + [
+        add_level,
+        add_pid,
+        add_extra_context,
+        structlog.processors.TimeStamper(fmt="iso", utc=True),
+        add_exception_info
+    ]
+    if Config.max_field_size > 0 or Config.max_event_size > 0:
+        chain.append(truncate)
+    # note: positional arguments are formatted lazily (see EventRecord)
+    chain.append(structlog.processors.UnicodeDecoder())
+    if Config.profile:
+        chain = [wrap_processor(x) for x in chain]
+        install_report(Config.profile_signal)
+    # See https://stackoverflow.com/a/51629142
+    # we do the formatting in the Logger (the event dict is passed as
+    # a positional argument to avoid a copy with **kwargs)
+    chain.append(lambda _, __, ed: ((ed,), {}))
     structlog.reset_defaults()
     structlog.configure(
-        processors=[
-            fltr,
-            add_level,
-            add_pid,
-            add_extra_context,
-            structlog.processors.TimeStamper(fmt="iso", utc=True),
-            add_exception_info,
-            structlog.stdlib.PositionalArgumentsFormatter(),
-            structlog.processors.UnicodeDecoder(),
-            # See https://stackoverflow.com/a/51629142
-            # we do the formatting in the Logger
-            lambda _, __, ed: ed
-        ],
+        processors=chain,
         cache_logger_on_first_use=True,
         wrapper_class=MFBoundLogger,
         context_class=context_class,
         logger_factory=MFLogLoggerFactory()
     )
+    start_exporter()
     CONFIGURATION_SET = True
 
 
@@ -403,6 +465,18 @@ def add_override(logger_name_pattern, minimal_level_name):
         # pylint: disable=unsupported-assignment-operation
         d[logger_name_pattern] = minimal_level_name
     __reset_level_from_logger_name_cache()
+    if STANDARD_LOGGING_REDIRECT and not flight_recorder.ENABLED:
+        _sync_standard_logging_levels()
+
+
+def invalidate_extra_context_cache():
+    """Invalidate the cached extra context (if any).
+
+    The configured extra_context_func will be called again for the
+    next log message.
+
+    """
+    reset_extra_context_cache()
 
 
 def getLogger(logger_name='root'):
@@ -0,0 +1,243 @@
+#!/bin/env python3
+
+"""Aggregate statistics of (maybe compressed) mflog JSON files.
+
+Files (and chunks of big uncompressed files) are parsed in parallel by a
+pool of processes and results are merged. Memory is bounded: lines are
+streamed and high cardinality keys (logger names, exception types and
+files, event templates) are counted with the (approximate) Space-Saving
+algorithm.
+
+"""
+
+from __future__ import print_function
+import re
+import json
+import argparse
+import multiprocessing
+from mflog.spacesaving import SpaceSaving
+from mflog.convert import get_chunks
+
+# name of the bucket => length of the timestamp prefix
+BUCKETS = {"minute": 16, "hour": 13, "day": 10}
+# keys counted with a SpaceSaving object
+TOP_KEYS = ("name", "exception_type", "exception_file", "event_template")
+DIGITS = re.compile(r"\d+")
+
+
+def get_event_template(event_dict):
+    """Return the event template (or an approximation).
+
+    Without the json_event_template option, numbers of the message are
+    replaced by N (and the message is truncated to 200 characters).
+
+    """
+    template = event_dict.get("event_template")
+    if template is not None:
+        return str(template)
+    return DIGITS.sub("N", str(event_dict.get("event", ""))[0:200])
+
+
+def open_log_file(path):
+    """Open a (maybe compressed) log file in text mode.
+
+    Files ending with .gz, .bz2 or .xz are decompressed on the fly.
+
+    """
+    if path.endswith(".gz"):
+        import gzip
+        return gzip.open(path, "rt", encoding="utf8", errors="replace")
+    if path.endswith(".bz2"):
+        import bz2
+        return bz2.open(path, "rt", encoding="utf8", errors="replace")
+    if path.endswith(".xz"):
+        import lzma
+        return lzma.open(path, "rt", encoding="utf8", errors="replace")
+    return open(path, "r", encoding="utf8", errors="replace")
+
+
+class Aggregate(object):
+    """Aggregated statistics.
+
+    Args:
+        capacity (int): Capacity of SpaceSaving objects.
+        bucket (string): minute, hour or day.
+
+    """
+
+    def __init__(self, capacity=1000, bucket="hour"):
+        self.bucket = bucket
+        self._prefix_length = BUCKETS[bucket]
+        self.lines = 0
+        self.invalid_lines = 0
+        self.levels = {}
+        self.tops = {k: SpaceSaving(capacity) for k in TOP_KEYS}
+        # time bucket => level => count
+        self.histogram = {}
+
+    def add(self, event_dict):
+        self.lines += 1
+        level = str(event_dict.get("level", "unknown"))
+        self.levels[level] = self.levels.get(level, 0) + 1
+        self.tops["name"].add(str(event_dict.get("name", "root")))
+        exception_type = event_dict.get("exception_type")
+        if exception_type is not None:
+            self.tops["exception_type"].add(str(exception_type))
+            self.tops["exception_file"].add(
+                str(event_dict.get("exception_file")))
+        self.tops["event_template"].add(get_event_template(event_dict))
+        bucket = str(event_dict.get("timestamp", ""))[0:self._prefix_length]
+        tmp = self.histogram.setdefault(bucket, {})
+        tmp[level] = tmp.get(level, 0) + 1
+
+    def add_line(self, line):
+        try:
+            event_dict = json.loads(line)
+            if not isinstance(event_dict, dict):
+                raise ValueError()
+        except ValueError:
+            self.invalid_lines += 1
+            return
+        self.add(event_dict)
+
+    def merge(self, other):
+        self.lines += other.lines
+        self.invalid_lines += other.invalid_lines
+        for level, count in other.levels.items():
+            self.levels[level] = self.levels.get(level, 0) + count
+        for key in TOP_KEYS:
+            self.tops[key].merge(other.tops[key])
+        for bucket, levels in other.histogram.items():
+            tmp = self.histogram.setdefault(bucket, {})
+            for level, count in levels.items():
+                tmp[level] = tmp.get(level, 0) + count
+
+    def as_dict(self, top=10):
+        return {
+            "lines": self.lines,
+            "invalid_lines": self.invalid_lines,
+            "levels": self.levels,
+            "top": {k: [{"key": x[0], "count": x[1], "error": x[2]}
+                        for x in v.top(top)]
+                    for k, v in self.tops.items()},
+            "histogram": {k: self.histogram[k]
+                          for k in sorted(self.histogram.keys())}
+        }
+
+    def get_report(self, top=10):
+        lines = ["lines: %i (invalid: %i)" % (self.lines,
+                                              self.invalid_lines)]
+        lines.append("")
+        lines.append("levels:")
+        for level, count in sorted(self.levels.items(), key=lambda x: -x[1]):
+            lines.append("    %-40s %10i" % (level, count))
+        for key in TOP_KEYS:
+            lines.append("")
+            lines.append("top %s:" % key)
+            for k, count, error in self.tops[key].top(top):
+                approx = "" if error == 0 else " (+/- %i)" % error
+                lines.append("    %-40s %10i%s" % (k, count, approx))
+        lines.append("")
+        lines.append("histogram (by %s):" % self.bucket)
+        for bucket in sorted(self.histogram.keys()):
+            levels = self.histogram[bucket]
+            lines.append("    %-20s %10i  %s" % (
+                bucket, sum(levels.values()),
+                " ".join("%s=%i" % x for x in sorted(levels.items()))))
+        return "\n".join(lines)
+
+
+def aggregate_task(args):
+    """Aggregate a task: (path, None, None) for a whole (compressed) file
+    or (path, start, end) for a chunk of a uncompressed file."""
+    (path, start, end), capacity, bucket = args
+    aggregate = Aggregate(capacity, bucket)
+    if start is None:
+        with open_log_file(path) as f:
+            for line in f:
+                aggregate.add_line(line)
+        return aggregate
+    with open(path, "rb") as f:
+        f.seek(start)
+        remaining = end - start
+        while remaining > 0:
+            line = f.readline(remaining)
+            if not line:
+                break
+            remaining -= len(line)
+            aggregate.add_line(line.decode("utf8", "replace"))
+    return aggregate
+
+
+def _get_tasks(paths, chunk_size):
+    for path in paths:
+        if path.endswith((".gz", ".bz2", ".xz")):
+            yield (path, None, None)
+        else:
+            for chunk in get_chunks(path, chunk_size):
+                yield chunk
+
+
+def aggregate_files(paths, jobs=None, capacity=1000, bucket="hour",
+                    chunk_size=64 * 1024 * 1024):
+    """Aggregate statistics of JSON files.
+
+    Args:
+        paths (list): List of JSON files full paths (.gz, .bz2 and .xz
+            files are decompressed on the fly).
+        jobs (int): Number of worker processes (None means the number of
+            CPUs, 1 means no worker process at all).
+        capacity (int): Capacity of SpaceSaving objects.
+        bucket (string): minute, hour or day.
+        chunk_size (int): The (approximate) size of chunks (in bytes) of
+            uncompressed files.
+
+    Returns:
+        (Aggregate) Aggregated statistics.
+
+    """
+    result = Aggregate(capacity, bucket)
+    tasks = ((x, capacity, bucket) for x in _get_tasks(paths, chunk_size))
+    if jobs == 1:
+        for task in tasks:
+            result.merge(aggregate_task(task))
+        return result
+    pool = multiprocessing.Pool(jobs)
+    try:
+        for tmp in pool.imap_unordered(aggregate_task, tasks):
+            result.merge(tmp)
+    finally:
+        pool.terminate()
+        pool.join()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser("aggregate statistics of mflog JSON "
+                                     "files")
+    parser.add_argument('--jobs', '-j', action="store", type=int,
+                        default=None, help="number of worker processes "
+                        "(default: number of CPUs)")
+    parser.add_argument('--top', action="store", type=int, default=10,
+                        help="number of displayed keys in top lists")
+    parser.add_argument('--capacity', action="store", type=int,
+                        default=1000, help="maximum number of counted "
+                        "keys (for names, exception types...)")
+    parser.add_argument('--bucket', action="store", default="hour",
+                        choices=sorted(BUCKETS.keys()),
+                        help="histogram time bucket")
+    parser.add_argument('--json', action="store_true",
+                        help="JSON output")
+    parser.add_argument('FILE', nargs='+', help="JSON files (can be "
+                        "compressed with gzip, bzip2 or xz)")
+    options = parser.parse_args()
+    result = aggregate_files(options.FILE, options.jobs, options.capacity,
+                             options.bucket)
+    if options.json:
+        print(json.dumps(result.as_dict(options.top), indent=4))
+    else:
+        print(result.get_report(options.top))
+
+
+if __name__ == "__main__":
+    main()
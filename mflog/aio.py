@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+
+"""Non blocking logging API for asyncio programs.
+
+The processor chain (level filtering, timestamp, exception info...) and
+the serialization of events are still executed by the caller, but outputs
+(json file, syslog, stdout/stderr) are written by a dedicated thread. So
+the event loop is never blocked by a file lock or by a syslog send.
+
+Example:
+
+    import mflog.aio
+
+    log = mflog.aio.get_logger("foo.bar")
+    log.info("foo")
+
+    # at the end of your program (in a coroutine)
+    await mflog.aio.aclose()
+
+"""
+
+import os
+import sys
+import queue
+import atexit
+import asyncio
+import threading
+import structlog
+import mflog
+from mflog import MFLogLogger
+from mflog.utils import Config
+
+_WRITER = None
+_WRITER_LOCK = threading.Lock()
+_LOGGERS = {}
+
+
+class _FlushMarker(object):
+
+    def __init__(self, loop, future):
+        self.loop = loop
+        self.future = future
+
+    def done(self):
+        try:
+            self.loop.call_soon_threadsafe(self._set_result)
+        except RuntimeError:
+            # the loop is closed
+            pass
+
+    def _set_result(self):
+        if not self.future.done():
+            self.future.set_result(None)
+
+
+class _QueueWriter(object):
+    """Drain a bounded queue of log events in a dedicated thread."""
+
+    def __init__(self, maxsize):
+        self.queue = queue.Queue(maxsize)
+        self.dropped = 0
+        self.thread = threading.Thread(target=self._run, name="mflog-aio",
+                                       daemon=True)
+        self.thread.start()
+
+    def put(self, item):
+        """Enqueue an item without blocking (drop it if the queue is full)."""
+        try:
+            self.queue.put_nowait(item)
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            try:
+                if item is None:
+                    return
+                if isinstance(item, _FlushMarker):
+                    item.done()
+                    continue
+                self._report_dropped()
+                logger, records = item
+                MFLogLogger._write(logger, records)
+            except Exception as e:
+                print("MFLOG ERROR: can't write log message from asyncio "
+                      "queue with exception: %s" % e, file=sys.stderr)
+            finally:
+                self.queue.task_done()
+
+    def _report_dropped(self):
+        if self.dropped == 0:
+            return
+        dropped = self.dropped
+        self.dropped = 0
+        mflog.get_logger("mflog.aio").warning(
+            "%i log events dropped (asyncio logging queue full)", dropped)
+
+    def stop(self, timeout=None):
+        try:
+            self.queue.put(None, timeout=timeout)
+        except queue.Full:
+            return
+        self.thread.join(timeout)
+
+
+def _get_writer():
+    global _WRITER
+    if _WRITER is None:
+        with _WRITER_LOCK:
+            if _WRITER is None:
+                _WRITER = _QueueWriter(Config.aio_queue_size)
+    return _WRITER
+
+
+def _reset_after_fork():
+    global _WRITER, _WRITER_LOCK
+    # the writer thread does not exist anymore in the child process
+    _WRITER = None
+    _WRITER_LOCK = threading.Lock()
+
+
+class AioMFLogLogger(MFLogLogger):
+    """MFLogLogger which delegates outputs to the writer thread."""
+
+    def _msg(self, stream, event_dict):
+        records = self._get_records(stream, event_dict)
+        # messages are formatted and serialized by the caller (arguments
+        # can be modified after the call), only I/O are delegated
+        for event, sinks in records:
+            event.freeze()
+            for sink in sinks:
+                try:
+                    sink.render(event)
+                except Exception:
+                    # (the error will be reported by the writer thread)
+                    pass
+        _get_writer().put((self, records))
+
+
+def get_logger(logger_name='root'):
+    """Return a non blocking logger (for asyncio programs).
+
+    The returned logger has the same API as mflog.get_logger() ones.
+    """
+    if not mflog.CONFIGURATION_SET:
+        mflog.set_config()
+    try:
+        logger = _LOGGERS[logger_name]
+    except KeyError:
+        logger = _LOGGERS.setdefault(logger_name,
+                                     AioMFLogLogger(logger_name))
+    return structlog.wrap_logger(logger, name=logger_name)
+
+
+async def flush():
+    """Wait for all already enqueued log events to be written."""
+    writer = _WRITER
+    if writer is None:
+        return
+    loop = asyncio.get_running_loop()
+    marker = _FlushMarker(loop, loop.create_future())
+    try:
+        writer.queue.put_nowait(marker)
+    except queue.Full:
+        await loop.run_in_executor(None, writer.queue.put, marker)
+    await marker.future
+
+
+async def aclose():
+    """Flush all enqueued log events and stop the writer thread.
+
+    Note: the writer thread is automatically restarted if you log again.
+    """
+    global _WRITER
+    await flush()
+    writer = _WRITER
+    if writer is None:
+        return
+    _WRITER = None
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(None, writer.stop)
+
+
+def _close_at_exit():
+    writer = _WRITER
+    if writer is not None:
+        writer.stop(timeout=5)
+
+
+atexit.register(_close_at_exit)
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
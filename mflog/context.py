@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+
+import functools
+import inspect
+import contextvars
+
+# The context is stored as a dict in a single context var. This dict is
+# never modified in place: each bind/unbind creates a new one. So
+# copying the context (for a new thread or a new asyncio task) is free and
+# there is no copy at all when logging.
+_CONTEXT = contextvars.ContextVar("mflog_context", default={})
+# (bound_context object, token) tuples of entered bound_context blocks
+# (stored in the context so that the same bound_context object can be
+# entered concurrently by several threads or tasks, or re-entered)
+_BOUND_CONTEXT_TOKENS = contextvars.ContextVar("mflog_bound_context_tokens",
+                                               default=())
+
+
+def get_context():
+    """Return the current contextvars context (as a read only dict)."""
+    return _CONTEXT.get()
+
+
+def bind_context(**new_values):
+    """Bind some key/values in the current contextvars context.
+
+    Returns:
+        A token which can be used with reset_context().
+
+    """
+    tmp = dict(_CONTEXT.get())
+    tmp.update(new_values)
+    return _CONTEXT.set(tmp)
+
+
+def unbind_context(*keys):
+    """Remove some keys from the current contextvars context.
+
+    Note: missing keys are ignored.
+
+    Returns:
+        A token which can be used with reset_context().
+
+    """
+    old = _CONTEXT.get()
+    return _CONTEXT.set({k: v for k, v in old.items() if k not in keys})
+
+
+def clear_context():
+    """Clear the current contextvars context."""
+    _CONTEXT.set({})
+
+
+def reset_context(token):
+    """Restore the contextvars context (as before the bind/unbind call)."""
+    _CONTEXT.reset(token)
+
+
+class bound_context(object):
+    """Bind some key/values in the contextvars context for a block.
+
+    It can be used as a context manager or as a decorator (for standard
+    functions or for coroutine functions).
+
+    Examples:
+        with bound_context(request_id=123):
+            log.info("foo")
+
+        @bound_context(job="cleanup")
+        async def cleanup():
+            log.info("bar")
+
+    """
+
+    def __init__(self, **new_values):
+        self._new_values = new_values
+
+    def __enter__(self):
+        token = bind_context(**self._new_values)
+        _BOUND_CONTEXT_TOKENS.set(_BOUND_CONTEXT_TOKENS.get() +
+                                  ((self, token),))
+        return self
+
+    def __exit__(self, *args):
+        entries = _BOUND_CONTEXT_TOKENS.get()
+        # (the innermost entry of this object)
+        for i in range(len(entries) - 1, -1, -1):
+            if entries[i][0] is self:
+                break
+        else:
+            raise RuntimeError("bound_context exited without being entered "
+                               "in this context")
+        _BOUND_CONTEXT_TOKENS.set(entries[0:i] + entries[i + 1:])
+        reset_context(entries[i][1])
+
+    def __call__(self, f):
+        new_values = self._new_values
+        if inspect.iscoroutinefunction(f):
+            @functools.wraps(f)
+            async def async_wrapper(*args, **kwargs):
+                token = bind_context(**new_values)
+                try:
+                    return await f(*args, **kwargs)
+                finally:
+                    reset_context(token)
+            return async_wrapper
+
+        @functools.wraps(f)
+        def wrapper(*args, **kwargs):
+            token = bind_context(**new_values)
+            try:
+                return f(*args, **kwargs)
+            finally:
+                reset_context(token)
+        return wrapper
+
+
+def merge_context(logger, method_name, event_dict):
+    """Add the contextvars context in the event dict.
+
+    Note: explicit key/values (bound to the logger or given to the
+    logging call) win over the contextvars context.
+
+    """
+    context = _CONTEXT.get()
+    if context:
+        for k, v in context.items():
+            if k not in event_dict:
+                event_dict[k] = v
+    return event_dict
@@ -0,0 +1,224 @@
+#!/bin/env python3
+
+"""Convert mflog JSON files to the human (one line) format.
+
+Big files are split in line-aligned chunks (by byte offsets) which are
+converted in parallel by a pool of processes. The output is written in
+order.
+
+"""
+
+import os
+import sys
+import json
+import fnmatch
+import argparse
+import collections
+import multiprocessing
+from mflog.utils import Config, level_name_to_level_no
+from mflog.record import EventRecord
+from mflog.formatters import format_plain
+
+DEFAULT_CHUNK_SIZE = 4 * 1024 * 1024
+MAX_CHUNKS_IN_FLIGHT_PER_JOB = 2
+
+
+class Filters(object):
+    """Filters applied on JSON events (before formatting).
+
+    Args:
+        minimal_level (string): The minimal level name (or None).
+        names (list): A list of fnmatch patterns on logger names (or None).
+        since (string): Minimal (ISO) timestamp (or None), can be a prefix
+            like 2021-05-10T12.
+        until (string): Maximal (ISO) timestamp (or None), can be a prefix.
+
+    """
+
+    def __init__(self, minimal_level=None, names=None, since=None,
+                 until=None):
+        self.minimal_level_no = None
+        if minimal_level is not None:
+            self.minimal_level_no = level_name_to_level_no(minimal_level)
+        self.names = names
+        self.since = since
+        self.until = until
+
+    def match(self, event_dict):
+        if self.minimal_level_no is not None:
+            try:
+                level_no = level_name_to_level_no(event_dict.get("level",
+                                                                 "notset"))
+            except Exception:
+                level_no = 0
+            if level_no < self.minimal_level_no:
+                return False
+        if self.names:
+            name = event_dict.get("name", "root")
+            if not any(fnmatch.fnmatch(name, x) for x in self.names):
+                return False
+        if self.since is not None or self.until is not None:
+            ts = event_dict.get("timestamp", "")
+            if self.since is not None and ts < self.since:
+                return False
+            # (prefix comparison for until)
+            if self.until is not None and ts[0:len(self.until)] > self.until:
+                return False
+        return True
+
+
+def convert_line(line, filters=None, json_only_keys=None):
+    """Convert a JSON line to the human format.
+
+    Args:
+        line (string): The JSON line.
+        filters (Filters): Filters to apply (or None).
+        json_only_keys (list): Keys not displayed (None means the
+            json_only_keys configuration value).
+
+    Returns:
+        (string) The converted line, the line itself if it is not a JSON
+        mflog event or None if it is filtered out.
+
+    """
+    try:
+        event_dict = json.loads(line)
+        if not isinstance(event_dict, dict):
+            raise ValueError()
+    except ValueError:
+        return line
+    if filters is not None and not filters.match(event_dict):
+        return None
+    if "event" not in event_dict and "event_template" in event_dict:
+        # json_event_template mode
+        event_dict["event"] = event_dict.pop("event_template")
+        args = event_dict.pop("args", None)
+        if isinstance(args, list):
+            event_dict["positional_args"] = tuple(args)
+        elif args:
+            event_dict["positional_args"] = (args,)
+    try:
+        return format_plain(EventRecord(event_dict), json_only_keys)
+    except Exception:
+        return line
+
+
+def get_chunks(path, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Yield line-aligned (path, start, end) chunks of a file."""
+    size = os.path.getsize(path)
+    with open(path, "rb") as f:
+        start = 0
+        while start < size:
+            end = start + chunk_size
+            if end >= size:
+                end = size
+            else:
+                f.seek(end)
+                f.readline()
+                end = f.tell()
+            yield (path, start, end)
+            start = end
+
+
+def convert_chunk(chunk, filters=None, json_only_keys=None):
+    """Convert a (path, start, end) chunk (see convert_line() for options).
+
+    Returns:
+        (string) The converted chunk.
+
+    """
+    path, start, end = chunk
+    with open(path, "rb") as f:
+        f.seek(start)
+        data = f.read(end - start)
+    lines = []
+    for line in data.decode("utf8", "replace").splitlines():
+        tmp = convert_line(line, filters, json_only_keys)
+        if tmp is not None:
+            lines.append(tmp)
+    if len(lines) == 0:
+        return ""
+    return "\n".join(lines) + "\n"
+
+
+def _convert_chunk_with_options(args):
+    return convert_chunk(*args)
+
+
+def convert_files(paths, output, filters=None, jobs=None,
+                  chunk_size=DEFAULT_CHUNK_SIZE, json_only_keys=None):
+    """Convert JSON files (in order) and write the result to output.
+
+    Args:
+        paths (list): List of JSON files full paths.
+        output: A file like object (opened in text mode).
+        filters (Filters): Filters to apply (or None).
+        jobs (int): Number of worker processes (None means the number of
+            CPUs, 1 means no worker process at all).
+        chunk_size (int): The (approximate) size of chunks (in bytes).
+        json_only_keys (list): Keys not displayed (None means the
+            json_only_keys configuration value).
+
+    """
+    if json_only_keys is None:
+        json_only_keys = list(Config.json_only_keys)
+    tasks = ((chunk, filters, json_only_keys) for path in paths
+             for chunk in get_chunks(path, chunk_size))
+    if jobs == 1:
+        for task in tasks:
+            output.write(_convert_chunk_with_options(task))
+        return
+    if jobs is None:
+        jobs = os.cpu_count() or 1
+    pool = multiprocessing.Pool(jobs)
+    try:
+        # results are written in order and the number of chunks in flight
+        # is bounded (so buffered results can't grow with a slow output)
+        pending = collections.deque()
+        for task in tasks:
+            if len(pending) >= jobs * MAX_CHUNKS_IN_FLIGHT_PER_JOB:
+                output.write(pending.popleft().get())
+            pending.append(pool.apply_async(_convert_chunk_with_options,
+                                            (task,)))
+        while pending:
+            output.write(pending.popleft().get())
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def main():
+    parser = argparse.ArgumentParser("convert mflog JSON files to the "
+                                     "human format")
+    parser.add_argument('--jobs', '-j', action="store", type=int,
+                        default=None, help="number of worker processes "
+                        "(default: number of CPUs)")
+    parser.add_argument('--chunk-size', action="store", type=int,
+                        default=DEFAULT_CHUNK_SIZE,
+                        help="chunk size in bytes")
+    parser.add_argument('--minimal-level', action="store", default=None,
+                        help="minimal level (DEBUG, INFO, WARNING...)")
+    parser.add_argument('--name', action="append", default=None,
+                        help="logger name fnmatch pattern (can be used "
+                        "several times)")
+    parser.add_argument('--since', action="store", default=None,
+                        help="minimal ISO timestamp (or prefix), for "
+                        "example: 2021-05-10T12:00")
+    parser.add_argument('--until', action="store", default=None,
+                        help="maximal ISO timestamp (or prefix)")
+    parser.add_argument('--json-only-keys', action="store", default=None,
+                        help="coma separated list of keys not to display "
+                        "(default: MFLOG_JSON_ONLY_KEYS env var)")
+    parser.add_argument('FILE', nargs='+', help="JSON files")
+    options = parser.parse_args()
+    json_only_keys = None
+    if options.json_only_keys is not None:
+        json_only_keys = options.json_only_keys.split(',')
+    filters = Filters(options.minimal_level, options.name, options.since,
+                      options.until)
+    convert_files(options.FILE, sys.stdout, filters, options.jobs,
+                  options.chunk_size, json_only_keys)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+
+"""In-memory flight recorder.
+
+When enabled (with set_config(flight_recorder_size=N) or with
+MFLOG_FLIGHT_RECORDER_SIZE=N env var), events below the minimal level
+(normally dropped) are kept unformatted in a bounded ring buffer (per
+process or per context). When an ERROR (or more) event is logged, the
+buffer is dumped (and cleared) into the JSON outputs.
+
+Only a tuple append is paid for each recorded event, formatting and I/O
+happen only when the buffer is dumped.
+
+"""
+
+import sys
+import time
+import collections
+import contextvars
+from mflog.context import get_context
+from mflog.utils import freeze_positional_args
+
+# set by configure() (module globals to keep the fast path cheap)
+ENABLED = False
+SIZE = 0
+SCOPE = "process"
+WITH_CONTEXT = False
+
+_PROCESS_BUFFER = collections.deque(maxlen=1)
+_CONTEXT_BUFFER = contextvars.ContextVar("mflog_flight_recorder",
+                                         default=None)
+
+
+def configure(size, scope="process", with_context=False):
+    """Configure (and reset) the flight recorder.
+
+    Args:
+        size (int): Maximum number of recorded events (0 => disabled).
+        scope (string): process (one buffer per process) or context (one
+            buffer per thread/asyncio task, see contextvars).
+        with_context (boolean): if True, keep a reference to the
+            contextvars context (see mflog.context) of each event.
+
+    """
+    global ENABLED, SIZE, SCOPE, WITH_CONTEXT, _PROCESS_BUFFER, \
+        _CONTEXT_BUFFER
+    SIZE = size
+    SCOPE = scope
+    WITH_CONTEXT = with_context
+    ENABLED = size > 0
+    _PROCESS_BUFFER = collections.deque(maxlen=max(size, 1))
+    # new ContextVar => forget all per context buffers
+    _CONTEXT_BUFFER = contextvars.ContextVar("mflog_flight_recorder",
+                                             default=None)
+
+
+def _get_buffer():
+    if SCOPE == "process":
+        return _PROCESS_BUFFER
+    buf = _CONTEXT_BUFFER.get()
+    if buf is None:
+        buf = collections.deque(maxlen=SIZE)
+        _CONTEXT_BUFFER.set(buf)
+    return buf
+
+
+def record(method_name, event_dict):
+    """Record an event (dropped by the level filter)."""
+    if event_dict.get("exc_info", None) is True:
+        # sys.exc_info() is only meaningful now
+        event_dict["exc_info"] = sys.exc_info()
+    # (the event is formatted later, maybe with modified arguments)
+    freeze_positional_args(event_dict)
+    context = get_context() if WITH_CONTEXT else None
+    _get_buffer().append((time.time(), method_name, event_dict, context))
+
+
+def pop_all():
+    """Return (and remove) all recorded events (oldest first).
+
+    Returns:
+        (list) A list of (time, method name, event dict, contextvars
+        context) tuples.
+
+    """
+    buf = _get_buffer()
+    res = []
+    while True:
+        try:
+            res.append(buf.popleft())
+        except IndexError:
+            return res
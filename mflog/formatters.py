@@ -0,0 +1,196 @@
+# -*- coding: utf-8 -*-
+
+"""Formatters (serializations) of log events.
+
+A formatter is a function which takes an EventRecord (see mflog.record)
+and returns a string. It must not modify the given record (because the
+same record is shared between all formatters and sinks).
+
+"""
+
+import re
+import json
+import socket
+import datetime
+from mflog.utils import Config
+from mflog.processors import kv_renderer
+
+# level name => syslog severity (for GELF output)
+GELF_LEVELS = {"debug": 7, "info": 6, "warning": 4, "error": 3,
+               "exception": 3, "critical": 2}
+GELF_INVALID_CHARS = re.compile(r"[^\w\.\-]")
+_HOSTNAME = None
+
+# extra keys which are not displayed as extra key/values in human output
+HUMAN_HIDDEN_KEYS = frozenset(["exception_type", "exception_file",
+                               "exception_fingerprint", "exception_repeated",
+                               "exception_locals", "callsite_module",
+                               "callsite_function", "callsite_lineno"])
+
+
+def get_human_extra_dict(record, json_only_keys=None):
+    """Return the extra key/values to display in human output.
+
+    Args:
+        record (EventRecord): The event record.
+        json_only_keys (list): Keys not displayed (None means the
+            json_only_keys configuration value).
+
+    """
+    if json_only_keys is None:
+        json_only_keys = Config.json_only_keys
+    return {k: v for k, v in record.extra.items()
+            if k not in HUMAN_HIDDEN_KEYS and
+            k not in json_only_keys}  # pylint: disable=E1135
+
+
+def _get_human_extra(record, json_only_keys=None):
+    bound, extra_dict = record.split_extra()
+    if json_only_keys is None:
+        json_only_keys = Config.json_only_keys
+    if bound is None:
+        extra_dict = get_human_extra_dict(record, json_only_keys)
+        if len(extra_dict) == 0:
+            return ""
+        return " {%s}" % kv_renderer(None, None, extra_dict)
+    # splice the pre-rendered (and sorted) bound context
+    kv = bound.get_human_kv(HUMAN_HIDDEN_KEYS, json_only_keys)
+    others = [(k, "%s=%s" % (k, v)) for k, v in extra_dict.items()
+              if k not in HUMAN_HIDDEN_KEYS and
+              k not in json_only_keys]  # pylint: disable=E1135
+    if len(others) > 0:
+        kv = kv + others
+        kv.sort()
+    if len(kv) == 0:
+        return ""
+    return " {%s}" % " ".join([x[1] for x in kv])
+
+
+def format_plain(record, json_only_keys=None):
+    """Format an event record in the human (one line) format.
+
+    Args:
+        record (EventRecord): The event record.
+        json_only_keys (list): Keys not displayed (None means the
+            json_only_keys configuration value).
+
+    """
+    level = "[%s]" % record.level.upper()
+    extra = _get_human_extra(record, json_only_keys)
+    tmp = "%s %10s (%s#%i) %s%s" % (record.timestamp, level, record.name,
+                                    record.pid, record.event, extra)
+    if record.exception is not None:
+        tmp = tmp + "\n" + record.exception
+    return tmp
+
+
+def _json_arg(arg):
+    if arg is None or isinstance(arg, (str, int, float, bool)):
+        return arg
+    return repr(arg)
+
+
+def format_json(record):
+    """Format an event record in JSON.
+
+    Note: with the json_event_template option, the message is not
+    formatted and the event_template and args keys are used instead of
+    the event key (for events with positional arguments).
+
+    Note: the pre-rendered JSON fragment of the bound context (if any) is
+    spliced just after core keys (as in the extra dict).
+
+    """
+    with_template = record.args and Config.json_event_template
+    bound, extra = record.split_extra()
+    if bound is None:
+        tmp = record.as_dict(formatted_event=not with_template)
+        others = tmp
+    else:
+        tmp = record.core_dict(formatted_event=not with_template)
+        others = dict(extra)
+        if record.exception is not None:
+            others["exception"] = record.exception
+    if with_template:
+        args = record.args
+        if len(args) == 1 and isinstance(args[0], dict) and args[0]:
+            others["args"] = {k: _json_arg(v) for k, v in args[0].items()}
+        else:
+            others["args"] = [_json_arg(x) for x in args]
+    if bound is None:
+        return json.dumps(tmp)
+    head = json.dumps(tmp)[:-1] + ", " + bound.json
+    if len(others) == 0:
+        return head + "}"
+    return head + ", " + json.dumps(others)[1:]
+
+
+def format_msg_only(record):
+    """Format an event record as its message only."""
+    return record.event
+
+
+def _gelf_value(value):
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return value
+    if isinstance(value, str):
+        return value
+    return str(value)
+
+
+def format_gelf(record):
+    """Format an event record as a GELF 1.1 (JSON) message.
+
+    Note: the level is converted to a syslog severity, the exception (if
+    any) is the full_message and other keys (name, pid and extra keys) are
+    additional fields (prefixed by _).
+
+    """
+    global _HOSTNAME
+    if _HOSTNAME is None:
+        _HOSTNAME = socket.gethostname()
+    try:
+        ts = datetime.datetime.strptime(record.timestamp,
+                                        "%Y-%m-%dT%H:%M:%S.%fZ").replace(
+            tzinfo=datetime.timezone.utc).timestamp()
+    except Exception:
+        ts = None
+    tmp = {
+        "version": "1.1",
+        "host": _HOSTNAME,
+        "short_message": str(record.event),
+        "level": GELF_LEVELS.get(record.level, 6),
+        "_name": record.name,
+        "_pid": record.pid
+    }
+    if ts is not None:
+        tmp["timestamp"] = ts
+    if record.exception is not None:
+        tmp["full_message"] = record.exception
+    for k, v in record.extra.items():
+        k = "_" + GELF_INVALID_CHARS.sub("_", k)
+        if k == "_id":
+            # reserved by GELF
+            k = "__id"
+        tmp[k] = _gelf_value(v)
+    return json.dumps(tmp)
+
+
+FORMATTERS = {
+    "plain": format_plain,
+    "json": format_json,
+    "msg_only": format_msg_only,
+    "gelf": format_gelf
+}
+
+
+def register_formatter(name, formatter):
+    """Register a custom formatter (to be used by sinks).
+
+    Args:
+        name (string): The name of the formatter.
+        formatter (callable): A function which takes an EventRecord and
+            returns a string (without modifying the record).
+
+    """
+    FORMATTERS[name] = formatter
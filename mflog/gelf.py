@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+
+"""GELF (Graylog Extended Log Format) UDP transport.
+
+Messages are compressed (zlib or gzip) and split in chunks when they are
+bigger than the chunk size (see
+https://go2docs.graylog.org/current/getting_in_log_data/gelf.html).
+
+"""
+
+import os
+import gzip
+import zlib
+import socket
+import struct
+
+CHUNK_MAGIC = b"\x1e\x0f"
+CHUNK_HEADER = struct.Struct("=2s8sBB")
+MAX_CHUNKS = 128
+
+
+def compress(data, compression="zlib"):
+    """Compress data (bytes) with zlib, gzip or none."""
+    if compression == "zlib":
+        return zlib.compress(data)
+    elif compression == "gzip":
+        return gzip.compress(data)
+    return data
+
+
+def get_chunks(data, chunk_size):
+    """Split data (bytes) in GELF chunks.
+
+    Args:
+        data (bytes): The (compressed) message.
+        chunk_size (int): The maximum size of a datagram.
+
+    Returns:
+        (list) A list of datagrams (a single one without chunk header if
+        data is small enough).
+
+    Raises:
+        ValueError: if the message needs more than 128 chunks.
+
+    """
+    if len(data) <= chunk_size:
+        return [data]
+    payload_size = chunk_size - CHUNK_HEADER.size
+    count = (len(data) + payload_size - 1) // payload_size
+    if count > MAX_CHUNKS:
+        raise ValueError("message too big for GELF (%i chunks)" % count)
+    message_id = os.urandom(8)
+    return [CHUNK_HEADER.pack(CHUNK_MAGIC, message_id, i, count) +
+            data[i * payload_size:(i + 1) * payload_size]
+            for i in range(count)]
+
+
+class GelfUDPSender(object):
+    """Send GELF messages to a (host, port) address with a single socket.
+
+    Args:
+        address (tuple): A (host, port) tuple.
+        compression (string): zlib, gzip or none.
+        chunk_size (int): The maximum size of a datagram.
+
+    """
+
+    def __init__(self, address, compression="zlib", chunk_size=8154):
+        self.compression = compression
+        self.chunk_size = chunk_size
+        family, _, _, _, self.sockaddr = \
+            socket.getaddrinfo(address[0], address[1], 0,
+                               socket.SOCK_DGRAM)[0]
+        self.socket = socket.socket(family, socket.SOCK_DGRAM)
+
+    def send(self, message):
+        """Send a GELF message (string).
+
+        Returns:
+            (int) The number of sent bytes.
+
+        """
+        data = compress(message.encode("utf8"), self.compression)
+        size = 0
+        for datagram in get_chunks(data, self.chunk_size):
+            size += self.socket.sendto(datagram, self.sockaddr)
+        return size
+
+    def close(self):
+        self.socket.close()
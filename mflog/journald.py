@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+
+"""Native journald protocol transport.
+
+Entries are serialized with the journal native protocol (see
+https://systemd.io/JOURNAL_NATIVE_PROTOCOL/) and sent as datagrams to
+the journal socket. Entries which are too big for a datagram are written
+in a (sealed) memfd which is passed to journald with SCM_RIGHTS.
+
+"""
+
+import os
+import re
+import array
+import fcntl
+import errno
+import socket
+import struct
+import tempfile
+
+DEFAULT_SOCKET = "/run/systemd/journal/socket"
+INVALID_CHARS = re.compile(r"[^A-Z0-9_]")
+LENGTH = struct.Struct("<Q")
+MAX_FIELD_NAME_SIZE = 64
+
+
+def get_field_name(key):
+    """Return a valid journal field name for a key.
+
+    Note: names are uppercased, invalid characters are replaced by _,
+    leading _ (reserved for trusted fields) are removed and names
+    starting with a digit are prefixed by X_.
+
+    """
+    name = INVALID_CHARS.sub("_", key.upper()).lstrip("_")
+    if name == "":
+        name = "X"
+    elif name[0].isdigit():
+        name = "X_" + name
+    return name[0:MAX_FIELD_NAME_SIZE]
+
+
+def serialize(fields):
+    """Serialize fields with the journal native protocol.
+
+    Args:
+        fields (list): A list of (name, value) tuples with valid field
+            names (see get_field_name()) and string values.
+
+    Returns:
+        (bytes) The serialized entry.
+
+    """
+    chunks = []
+    for name, value in fields:
+        name = name.encode("ascii")
+        value = value.encode("utf8")
+        if b"\n" in value:
+            chunks.append(name + b"\n" + LENGTH.pack(len(value)) + value +
+                          b"\n")
+        else:
+            chunks.append(name + b"=" + value + b"\n")
+    return b"".join(chunks)
+
+
+def _get_sealed_fd(data):
+    memfd_create = getattr(os, "memfd_create", None)
+    if memfd_create is None:
+        # old kernels: journald also accepts a (deleted) regular file
+        fd, path = tempfile.mkstemp(prefix="mflog-journal-", dir="/dev/shm")
+        os.unlink(path)
+        os.write(fd, data)
+        return fd
+    fd = memfd_create("mflog-journal",
+                      getattr(os, "MFD_ALLOW_SEALING", 0) |
+                      getattr(os, "MFD_CLOEXEC", 0))
+    try:
+        view = memoryview(data)
+        while len(view) > 0:
+            view = view[os.write(fd, view):]
+        add_seals = getattr(fcntl, "F_ADD_SEALS", None)
+        if add_seals is not None:
+            fcntl.fcntl(fd, add_seals, fcntl.F_SEAL_SHRINK |
+                        fcntl.F_SEAL_GROW | fcntl.F_SEAL_WRITE |
+                        fcntl.F_SEAL_SEAL)
+    except Exception:
+        os.close(fd)
+        raise
+    return fd
+
+
+class JournaldSender(object):
+    """Send entries to the journal socket with a single socket.
+
+    Args:
+        path (string): The path of the journal socket.
+
+    """
+
+    def __init__(self, path=DEFAULT_SOCKET):
+        self.path = path
+        self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+
+    def send(self, fields):
+        """Send an entry (a list of (name, value) tuples).
+
+        Returns:
+            (int) The number of sent bytes.
+
+        """
+        data = serialize(fields)
+        try:
+            return self.socket.sendto(data, self.path)
+        except OSError as e:
+            if e.errno not in (errno.EMSGSIZE, errno.ENOBUFS):
+                raise
+        # too big for a datagram => memfd
+        fd = _get_sealed_fd(data)
+        try:
+            self.socket.sendmsg([], [(socket.SOL_SOCKET, socket.SCM_RIGHTS,
+                                      array.array("i", [fd]))], 0, self.path)
+        finally:
+            os.close(fd)
+        return len(data)
+
+    def close(self):
+        self.socket.close()
@@ -0,0 +1,206 @@
+# -*- coding: utf-8 -*-
+
+"""Runtime metrics of the logging subsystem.
+
+Recording is just a few dict operations (without any lock) so it is
+always enabled. Counters can miss a few increments in case of concurrent
+updates from several threads.
+
+"""
+
+import os
+import time
+import bisect
+import atexit
+import threading
+from mflog.utils import Config
+
+# upper bounds (in seconds) of latency histograms buckets
+LATENCY_BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005,
+                   0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0)
+
+# (sink, level) => number of written events
+EVENTS = {}
+# level => number of events dropped by the level filter
+DROPPED = {}
+# sink => number of errors
+ERRORS = {}
+# sink => number of written bytes
+BYTES = {}
+# name => Histogram
+LATENCIES = {}
+
+_EXPORTER_THREAD = None
+_EXPORTER_LOCK = threading.Lock()
+
+
+class Histogram(object):
+
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(LATENCY_BUCKETS, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def as_dict(self):
+        buckets = {}
+        cumulative = 0
+        for bound, count in zip(LATENCY_BUCKETS + ("+Inf",), self.counts):
+            cumulative += count
+            buckets[bound] = cumulative
+        return {"count": self.count, "sum": self.sum, "buckets": buckets}
+
+
+def record_event(sink, level, size=None):
+    """Record a written event (and its size in bytes if known)."""
+    key = (sink, level)
+    EVENTS[key] = EVENTS.get(key, 0) + 1
+    if size is not None:
+        BYTES[sink] = BYTES.get(sink, 0) + size
+
+
+def record_dropped(level):
+    """Record an event dropped by the level filter."""
+    DROPPED[level] = DROPPED.get(level, 0) + 1
+
+
+def record_error(sink):
+    """Record an error when writing to a sink."""
+    ERRORS[sink] = ERRORS.get(sink, 0) + 1
+
+
+def record_latency(name, seconds):
+    """Record a latency (in seconds) in the histogram called name."""
+    try:
+        histogram = LATENCIES[name]
+    except KeyError:
+        histogram = LATENCIES.setdefault(name, Histogram())
+    histogram.observe(seconds)
+
+
+def reset_stats():
+    """Reset all metrics."""
+    EVENTS.clear()
+    DROPPED.clear()
+    ERRORS.clear()
+    BYTES.clear()
+    LATENCIES.clear()
+
+
+def stats():
+    """Return a snapshot of all metrics (as a dict).
+
+    Returns:
+        (dict) A dict with following keys:
+            - events: sink => level => number of written events
+            - dropped: level => number of events dropped by level filter
+            - errors: sink => number of errors
+            - bytes: sink => number of written bytes
+            - latencies: name => histogram (as a dict with count, sum and
+              cumulative buckets keys)
+
+    """
+    events = {}
+    for (sink, level), count in list(EVENTS.items()):
+        events.setdefault(sink, {})[level] = count
+    return {
+        "events": events,
+        "dropped": dict(DROPPED),
+        "errors": dict(ERRORS),
+        "bytes": dict(BYTES),
+        "latencies": {k: v.as_dict() for k, v in list(LATENCIES.items())}
+    }
+
+
+def _prometheus_lines():
+    pid = os.getpid()
+    lines = []
+    lines.append("# TYPE mflog_events_total counter")
+    for (sink, level), count in sorted(EVENTS.items()):
+        lines.append('mflog_events_total{pid="%i",sink="%s",level="%s"} %i' %
+                     (pid, sink, level, count))
+    lines.append("# TYPE mflog_dropped_events_total counter")
+    for level, count in sorted(DROPPED.items()):
+        lines.append('mflog_dropped_events_total{pid="%i",level="%s"} %i' %
+                     (pid, level, count))
+    lines.append("# TYPE mflog_sink_errors_total counter")
+    for sink, count in sorted(ERRORS.items()):
+        lines.append('mflog_sink_errors_total{pid="%i",sink="%s"} %i' %
+                     (pid, sink, count))
+    lines.append("# TYPE mflog_written_bytes_total counter")
+    for sink, count in sorted(BYTES.items()):
+        lines.append('mflog_written_bytes_total{pid="%i",sink="%s"} %i' %
+                     (pid, sink, count))
+    for name, histogram in sorted(LATENCIES.items()):
+        metric = "mflog_%s_seconds" % name
+        lines.append("# TYPE %s histogram" % metric)
+        for bound, count in histogram.as_dict()["buckets"].items():
+            lines.append('%s_bucket{pid="%i",le="%s"} %i' %
+                         (metric, pid, bound, count))
+        lines.append('%s_sum{pid="%i"} %f' % (metric, pid, histogram.sum))
+        lines.append('%s_count{pid="%i"} %i' %
+                     (metric, pid, histogram.count))
+    return lines
+
+
+def write_prometheus_textfile(path):
+    """Write all metrics in the prometheus textfile format.
+
+    The file is written atomically (with a rename). The "{pid}" string
+    in the path is replaced by the current pid.
+
+    Args:
+        path (string): The full path of the file to write.
+
+    """
+    path = path.replace("{pid}", str(os.getpid()))
+    tmp_path = "%s.%i.tmp" % (path, os.getpid())
+    with open(tmp_path, "w") as f:
+        f.write("\n".join(_prometheus_lines()) + "\n")
+    os.rename(tmp_path, path)
+
+
+def _export_forever():
+    while True:
+        interval = Config.metrics_textfile_interval
+        time.sleep(interval)
+        path = Config.metrics_textfile
+        if path is None:
+            continue
+        try:
+            write_prometheus_textfile(path)
+        except Exception:
+            pass
+
+
+def start_exporter():
+    """Start (if not already started) the periodic textfile export."""
+    global _EXPORTER_THREAD
+    if Config.metrics_textfile is None:
+        return
+    with _EXPORTER_LOCK:
+        if _EXPORTER_THREAD is not None and _EXPORTER_THREAD.is_alive():
+            return
+        _EXPORTER_THREAD = threading.Thread(target=_export_forever,
+                                            name="mflog-metrics",
+                                            daemon=True)
+        _EXPORTER_THREAD.start()
+
+
+def _export_at_exit():
+    path = Config.metrics_textfile
+    if path is not None and _EXPORTER_THREAD is not None:
+        try:
+            write_prometheus_textfile(path)
+        except Exception:
+            pass
+
+
+atexit.register(_export_at_exit)
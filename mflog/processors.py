@@ -1,9 +1,32 @@
 # -*- coding: utf-8 -*-
 
 import os
+import sys
+import logging
 import structlog
+from mflog import flight_recorder
+from mflog.metrics import record_dropped
 from mflog.utils import level_name_to_level_no, get_level_no_from_logger_name
-from mflog.utils import get_extra_context
+from mflog.utils import get_extra_context, get_exception_fingerprint, \
+    is_exception_traceback_already_logged, get_target_frame, get_locals_map, \
+    truncate_event_dict, Config
+
+# frames of these directories are skipped to find the callsite
+_CALLSITE_SKIPPED_DIRS = tuple(
+    os.path.dirname(os.path.abspath(x)) + os.sep
+    for x in (__file__, structlog.__file__, logging.__file__))
+# maximum size of callsite caches (cleared when reached, so that dynamic
+# or reloaded code objects are not kept alive forever)
+CALLSITE_CACHE_MAX_SIZE = 10000
+# code object => True if skipped
+_CALLSITE_SKIPPED_CODES = {}
+# code object => (module, function, filename)
+_CALLSITE_CODES = {}
+# filename => module name
+_CALLSITE_MODULES = {}
+# private key of the event dict with a (filename, function, lineno)
+# callsite (set for standard logging records by the StructlogHandler)
+CALLSITE_KEY = "_mflog_callsite"
 
 
 def fltr(logger, method_name, event_dict):
@@ -12,7 +35,16 @@ def fltr(logger, method_name, event_dict):
     logger_level_no = \
         get_level_no_from_logger_name(event_dict.get('name', ''))
     if method_level_no < logger_level_no:
+        record_dropped(method_name)
+        if flight_recorder.ENABLED:
+            flight_recorder.record(method_name, event_dict)
         raise structlog.DropEvent
+    if flight_recorder.ENABLED and method_level_no >= logging.ERROR:
+        # recorded events are taken here (and not in the logger) to get
+        # the buffer of the right context (even with an asyncio logger)
+        recorded = flight_recorder.pop_all()
+        if recorded:
+            event_dict["_mflog_flight_recorder"] = recorded
     return event_dict
 
 
@@ -29,9 +61,15 @@ def add_pid(logger, method_name, event_dict):
 
 
 def add_extra_context(logger, method_name, event_dict):
-    """Add extra context in the event dict."""
+    """Add extra context in the event dict.
+
+    Note: the (maybe cached) extra context dict is merged into the event
+    dict, it is never copied nor modified.
+
+    """
     extra_context = get_extra_context()
-    event_dict.update(extra_context)
+    if extra_context:
+        event_dict.update(extra_context)
     return event_dict
 
 
@@ -40,9 +78,21 @@ def add_exception_info(logger, method_name, event_dict):
     if exc_info:
         e = structlog.processors._figure_out_exc_info(exc_info)
         if e[0] is not None:
-            event_dict["exception"] = structlog._frames._format_exception(e)
+            fingerprint, formatted = get_exception_fingerprint(e)
+            if is_exception_traceback_already_logged(fingerprint):
+                event_dict["exception"] = \
+                    "(same traceback as the one already logged for " \
+                    "exception_fingerprint=%s)\n%s" % \
+                    (fingerprint, formatted.rsplit("\n", 1)[-1])
+                event_dict["exception_repeated"] = True
+            else:
+                event_dict["exception"] = formatted
+            event_dict["exception_fingerprint"] = fingerprint
             event_dict["exception_type"] = e[0].__name__
             event_dict["exception_file"] = e[-1].tb_frame.f_code.co_filename
+            if Config.dump_locals_json:
+                event_dict["exception_locals"] = \
+                    get_locals_map(get_target_frame(tb=e[-1]))
             event = event_dict.get("event", "")
             if isinstance(event, Exception):
                 # see issue #3
@@ -55,6 +105,81 @@ def add_exception_info(logger, method_name, event_dict):
     return event_dict
 
 
+def truncate(logger, method_name, event_dict):
+    """Truncate huge values (see max_field_size/max_event_size options)."""
+    max_field_size = Config.max_field_size
+    max_event_size = Config.max_event_size
+    if max_field_size > 0 or max_event_size > 0:
+        truncate_event_dict(event_dict, max_field_size, max_event_size)
+    return event_dict
+
+
+def _is_callsite_skipped(code):
+    try:
+        return _CALLSITE_SKIPPED_CODES[code]
+    except KeyError:
+        pass
+    tmp = os.path.abspath(code.co_filename).startswith(
+        _CALLSITE_SKIPPED_DIRS)
+    if len(_CALLSITE_SKIPPED_CODES) >= CALLSITE_CACHE_MAX_SIZE:
+        _CALLSITE_SKIPPED_CODES.clear()
+    _CALLSITE_SKIPPED_CODES[code] = tmp
+    return tmp
+
+
+def _get_module_from_filename(filename):
+    try:
+        return _CALLSITE_MODULES[filename]
+    except KeyError:
+        pass
+    module = None
+    for name, mod in list(sys.modules.items()):
+        if getattr(mod, "__file__", None) == filename:
+            module = name
+            break
+    if module is None:
+        module = os.path.splitext(os.path.basename(filename))[0]
+    if len(_CALLSITE_MODULES) >= CALLSITE_CACHE_MAX_SIZE:
+        _CALLSITE_MODULES.clear()
+    _CALLSITE_MODULES[filename] = module
+    return module
+
+
+def add_callsite(logger, method_name, event_dict):
+    """Add callsite_module, callsite_function and callsite_lineno keys.
+
+    Frames are walked directly (without inspect) and everything but the
+    line number is cached per code object (in bounded caches).
+
+    """
+    callsite = event_dict.pop(CALLSITE_KEY, None)
+    if callsite is not None:
+        # standard logging record
+        filename, function, lineno = callsite
+        module = _get_module_from_filename(filename)
+    else:
+        frame = sys._getframe(1)
+        while frame is not None and _is_callsite_skipped(frame.f_code):
+            frame = frame.f_back
+        if frame is None:
+            return event_dict
+        code = frame.f_code
+        try:
+            module, function, _ = _CALLSITE_CODES[code]
+        except KeyError:
+            module = frame.f_globals.get("__name__", None) or \
+                _get_module_from_filename(code.co_filename)
+            function = getattr(code, "co_qualname", code.co_name)
+            if len(_CALLSITE_CODES) >= CALLSITE_CACHE_MAX_SIZE:
+                _CALLSITE_CODES.clear()
+            _CALLSITE_CODES[code] = (module, function, code.co_filename)
+        lineno = frame.f_lineno
+    event_dict["callsite_module"] = module
+    event_dict["callsite_function"] = function
+    event_dict["callsite_lineno"] = lineno
+    return event_dict
+
+
 def kv_renderer(logger, method_name, event_dict):
     ordered_items = sorted(event_dict.items())
     return " ".join(["%s=%s" % (k, v) for k, v in ordered_items])
@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+
+"""Opt-in profiling of mflog processors and outputs.
+
+When profiling is enabled (with set_config(profile=True) or with
+MFLOG_PROFILE=1 env var), each processor of the structlog chain, each
+sink and each formatter is wrapped with a high resolution timer.
+Results are aggregated by logger name. When profiling is disabled,
+nothing is wrapped (so there is no overhead at all).
+
+"""
+
+from __future__ import print_function
+import os
+import sys
+import time
+import atexit
+import signal
+import functools
+
+# (logger name, step) => [calls, total seconds, max seconds]
+PROFILE = {}
+
+# other reports (functions returning a report string or None, see
+# register_report())
+_REPORTS = []
+
+_INSTALLED_SIGNAL = None
+_ATEXIT_REGISTERED = False
+
+
+def record(logger_name, step, seconds):
+    key = (logger_name, step)
+    try:
+        tmp = PROFILE[key]
+    except KeyError:
+        tmp = PROFILE.setdefault(key, [0, 0.0, 0.0])
+    tmp[0] += 1
+    tmp[1] += seconds
+    if seconds > tmp[2]:
+        tmp[2] = seconds
+
+
+def get_step_name(obj):
+    name = getattr(obj, "__name__", None)
+    if name is None:
+        name = type(obj).__name__
+    return name
+
+
+def wrap_processor(processor):
+    """Wrap a structlog processor with a timer."""
+    step = "processor:%s" % get_step_name(processor)
+
+    @functools.wraps(processor)
+    def wrapper(logger, method_name, event_dict):
+        logger_name = event_dict.get("name", "root")
+        before = time.perf_counter()
+        try:
+            return processor(logger, method_name, event_dict)
+        finally:
+            record(logger_name, step, time.perf_counter() - before)
+
+    return wrapper
+
+
+def wrap_sink_emit(sink_name, emit):
+    """Wrap the emit method of a sink with a timer."""
+    step = "output:%s" % sink_name
+
+    @functools.wraps(emit)
+    def wrapper(event):
+        before = time.perf_counter()
+        try:
+            return emit(event)
+        finally:
+            record(event.name, step, time.perf_counter() - before)
+
+    return wrapper
+
+
+def wrap_formatter(formatter_name, formatter):
+    """Wrap a formatter with a timer."""
+    step = "format:%s" % formatter_name
+
+    @functools.wraps(formatter)
+    def wrapper(event_record):
+        before = time.perf_counter()
+        try:
+            return formatter(event_record)
+        finally:
+            record(event_record.name, step, time.perf_counter() - before)
+
+    return wrapper
+
+
+def reset_profile():
+    PROFILE.clear()
+
+
+def get_report():
+    """Return a profiling report (as a string).
+
+    Lines are sorted by total time (descending).
+
+    """
+    lines = ["mflog profile report (pid: %i)" % os.getpid(),
+             "%-30s %-40s %10s %12s %12s %12s" %
+             ("logger name", "step", "calls", "total (ms)", "mean (us)",
+              "max (us)")]
+    items = sorted(PROFILE.items(), key=lambda x: x[1][1], reverse=True)
+    for (logger_name, step), (calls, total, maximum) in items:
+        lines.append("%-30s %-40s %10i %12.3f %12.3f %12.3f" %
+                     (logger_name, step, calls, total * 1000.0,
+                      total * 1000000.0 / calls, maximum * 1000000.0))
+    return "\n".join(lines)
+
+
+def register_report(func):
+    """Register another report (dumped with the profiling report).
+
+    Args:
+        func (callable): A function without argument which returns a
+            report (as a string) or None (nothing to report).
+
+    """
+    if func not in _REPORTS:
+        _REPORTS.append(func)
+
+
+def _get_reports(force=False):
+    reports = []
+    if force or len(PROFILE) > 0:
+        reports.append(get_report())
+    for func in _REPORTS:
+        tmp = func()
+        if tmp:
+            reports.append(tmp)
+    return reports
+
+
+def dump_report(f=None):
+    if f is None:
+        f = sys.stderr
+    for report in _get_reports(force=len(_REPORTS) == 0):
+        print(report, file=f)
+
+
+def _dump_report_at_exit():
+    for report in _get_reports():
+        print(report, file=sys.stderr)
+
+
+def _signal_handler(signum, frame):
+    dump_report()
+
+
+def install_report(signal_name=None):
+    """Register the report dump at exit (and on a signal if provided).
+
+    Args:
+        signal_name (string): A signal name (SIGUSR2 for example) or None.
+
+    """
+    global _ATEXIT_REGISTERED, _INSTALLED_SIGNAL
+    if not _ATEXIT_REGISTERED:
+        atexit.register(_dump_report_at_exit)
+        _ATEXIT_REGISTERED = True
+    if signal_name is not None and signal_name != _INSTALLED_SIGNAL:
+        try:
+            signal.signal(getattr(signal, signal_name), _signal_handler)
+            _INSTALLED_SIGNAL = signal_name
+        except (AttributeError, ValueError):
+            # unknown signal or not in the main thread
+            print("MFLOG ERROR: can't install a profiling report signal "
+                  "handler for %s" % signal_name, file=sys.stderr)
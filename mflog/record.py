@@ -0,0 +1,253 @@
+# -*- coding: utf-8 -*-
+
+"""Internal log event record.
+
+An EventRecord is built once per log event (at the end of the structlog
+chain) and passed by reference to all sinks and formatters. Core fields
+are slots (no string lookup), other keys are kept in the extra dict.
+Sinks and formatters must not modify it.
+
+Positional arguments of the logging call are not formatted (with %)
+until the first access to the event attribute (so only if an output
+really needs the formatted message).
+
+The context of a bound logger (see MFBoundLogger) can be pre-rendered
+once (as a BoundContext object) and attached to the record. Formatters
+splice the cached fragments into their output (only new keys are
+rendered for each event).
+
+"""
+
+import json
+from mflog.utils import level_name_to_level_no, truncate_event_dict, \
+    format_event  # noqa: F401
+
+_NOT_FORMATTED = object()
+_MISSING = object()
+# keys which are not kept in the extra dict of a record
+CORE_KEYS = frozenset(["timestamp", "level", "name", "pid", "event",
+                       "positional_args", "exception", "exc_info"])
+BOUND_CONTEXT_KEY = "_mflog_bound_context"
+
+
+class BoundContext(object):
+    """Pre-rendered fragments of a bound context.
+
+    Attributes:
+        items (dict): The bound context (key => value).
+        kv (list): Sorted list of (key, "key=value") tuples.
+        json (string): The JSON fragment ("key": value, ...) of items.
+
+    """
+
+    __slots__ = ("items", "kv", "json", "_human_kv")
+
+    def __init__(self, context):
+        self.items = dict(context)
+        self.kv = sorted((k, "%s=%s" % (k, v)) for k, v in self.items.items())
+        self.json = json.dumps(self.items)[1:-1]
+        self._human_kv = (None, None)
+
+    def get_human_kv(self, hidden_keys, json_only_keys):
+        """Return kv tuples without hidden keys (cached)."""
+        if self._human_kv[0] is not json_only_keys:
+            self._human_kv = (json_only_keys,
+                              [x for x in self.kv if x[0] not in hidden_keys
+                               and x[0] not in json_only_keys])
+        return self._human_kv[1]
+
+
+def get_bound_context(context):
+    """Return a BoundContext object for a bound logger context.
+
+    Note: core keys (like the logger name bound by get_logger()) are
+    not pre-rendered (they are core fields of the record).
+
+    Returns:
+        (BoundContext) The BoundContext object or None if the context
+        can't be pre-rendered (no extra key, not a plain dict, non scalar
+        values or special keys).
+
+    """
+    if type(context) is not dict:
+        return None
+    items = {}
+    for k, v in context.items():
+        if k in CORE_KEYS:
+            continue
+        if not isinstance(k, str) or k == BOUND_CONTEXT_KEY:
+            return None
+        if v is not None and not isinstance(v, (str, int, float, bool)):
+            return None
+        items[k] = v
+    if len(items) == 0:
+        return None
+    return BoundContext(items)
+
+
+class EventRecord(object):
+    """A log event with its serializations (computed at most once).
+
+    Attributes:
+        timestamp (string): ISO timestamp.
+        level (string): Level name (lowercase).
+        level_no (int): Level number (0 if unknown).
+        name (string): Logger name.
+        pid (int): Process id.
+        event (string): The (formatted) log message.
+        event_template (string): The log message before formatting.
+        args (tuple): Positional arguments of the logging call (or None).
+        exception (string): Formatted exception (or None).
+        extra (dict): Other (user) keys.
+        stream (string): stdout or stderr (for console outputs).
+        bound (BoundContext): The pre-rendered context of the bound logger
+            (or None).
+
+    """
+
+    __slots__ = ("timestamp", "level", "level_no", "name", "pid",
+                 "event_template", "args", "_event", "exception", "extra",
+                 "stream", "bound", "_cache")
+
+    def __init__(self, event_dict, stream="stdout"):
+        # event_dict is owned by the record (no copy), core keys are
+        # popped out of it and the remaining dict becomes the extra dict
+        self.timestamp = event_dict.pop('timestamp', None)
+        self.level = event_dict.pop('level', 'notset')
+        self.name = event_dict.pop('name', 'root')
+        self.pid = event_dict.pop('pid', 0)
+        self.event_template = event_dict.pop('event', None)
+        self.args = event_dict.pop('positional_args', None) or None
+        self._event = _NOT_FORMATTED
+        self.exception = event_dict.pop('exception', None)
+        self.bound = event_dict.pop(BOUND_CONTEXT_KEY, None)
+        self.extra = event_dict
+        try:
+            self.level_no = level_name_to_level_no(self.level)
+        except Exception:
+            self.level_no = 0
+        self.stream = stream
+        self._cache = {}
+
+    @property
+    def event(self):
+        if self._event is _NOT_FORMATTED:
+            self._event = format_event(self.event_template, self.args)
+        return self._event
+
+    def freeze(self):
+        """Format the message now.
+
+        To be called when the record is used later (in another thread for
+        example) because arguments can be modified after the logging call.
+
+        """
+        if self._event is _NOT_FORMATTED:
+            self._event = format_event(self.event_template, self.args)
+
+    def core_dict(self, formatted_event=True):
+        """Return a (new) dict with core keys only (without exception).
+
+        Args:
+            formatted_event (boolean): see as_dict().
+
+        """
+        res = {"timestamp": self.timestamp, "level": self.level,
+               "name": self.name, "pid": self.pid}
+        if formatted_event:
+            res["event"] = self.event
+        else:
+            res["event_template"] = self.event_template
+        return res
+
+    def as_dict(self, formatted_event=True):
+        """Return a (new) dict with all keys of the event.
+
+        Args:
+            formatted_event (boolean): if False, the event_template key
+                is used (with the unformatted message) instead of the
+                event key.
+
+        """
+        res = self.core_dict(formatted_event)
+        res.update(self.extra)
+        if self.exception is not None:
+            res["exception"] = self.exception
+        return res
+
+    def split_extra(self):
+        """Split the extra dict between the bound context and other keys.
+
+        The bound context is used only if all its keys are still in the
+        extra dict with the very same values (not overridden by the
+        logging call or by a processor).
+
+        Returns:
+            (tuple) (BoundContext, dict of other extra keys) or (None,
+            extra dict).
+
+        """
+        try:
+            return self._cache["split_extra"]
+        except KeyError:
+            pass
+        bound = self.bound
+        extra = self.extra
+        res = (None, extra)
+        if bound is not None:
+            for k, v in bound.items.items():
+                if extra.get(k, _MISSING) is not v:
+                    break
+            else:
+                items = bound.items
+                res = (bound, {k: v for k, v in extra.items()
+                               if k not in items})
+        self._cache["split_extra"] = res
+        return res
+
+    def truncated(self, max_event_size):
+        """Return a copy of this record with huge values truncated.
+
+        Args:
+            max_event_size (int): The maximum (estimated) size of the
+                whole event.
+
+        """
+        key = ("truncated", max_event_size)
+        try:
+            return self._cache[key]
+        except KeyError:
+            pass
+        event_dict = dict(self.extra)
+        event_dict.update({"timestamp": self.timestamp,
+                           "level": self.level, "name": self.name,
+                           "pid": self.pid, "event": self.event_template})
+        if self.args:
+            event_dict["positional_args"] = self.args
+        if self.exception is not None:
+            event_dict["exception"] = self.exception
+        tmp = EventRecord(truncate_event_dict(event_dict, 0, max_event_size),
+                          self.stream)
+        self._cache[key] = tmp
+        return tmp
+
+    def render(self, formatter, formatters):
+        """Render the event with the given formatter (name or callable).
+
+        Args:
+            formatter (string or callable): A formatter name (looked up in
+                the formatters dict) or a function which takes an
+                EventRecord and returns a string.
+            formatters (dict): formatter name => formatter function.
+
+        """
+        try:
+            return self._cache[formatter]
+        except KeyError:
+            pass
+        if callable(formatter):
+            tmp = formatter(self)
+        else:
+            tmp = formatters[formatter](self)
+        self._cache[formatter] = tmp
+        return tmp
@@ -0,0 +1,288 @@
+# -*- coding: utf-8 -*-
+
+"""Shared memory transport between processes and a single writer.
+
+With json_transport="shm" (or MFLOG_JSON_TRANSPORT=shm env var), each
+process writes its serialized (JSON) events into its own ring buffer (a
+mmaped file in the shm_dir directory) instead of writing (with a flock)
+into the JSON file. A single writer process (the mflog_shm_writer command,
+see mflog.shm_writer) drains all rings into the JSON file and to
+syslog.
+
+Each ring has a single producer (the process, threads are serialized
+with a thread lock) and a single consumer (the writer) so no
+interprocess lock is needed. Events are stored in fixed size slots. The
+write index is only updated after the slot is completely written (so an
+event half-written by a crashed process is never read). When the ring is
+full, events are dropped (and counted in the ring header). Rings of dead
+processes are removed by the writer (after being drained).
+
+Ring header layout (native byte order):
+
+    magic (4s), version (I), pid (I), slot_size (I), slot_count (I),
+    padding (4x), write_idx (Q), read_idx (Q), dropped (Q)
+
+Slot layout: length (I), flags (B), payload (length bytes).
+
+"""
+
+from __future__ import print_function
+import os
+import sys
+import glob
+import json
+import mmap
+import time
+import uuid
+import struct
+from mflog.utils import write_with_lock, flush_with_lock
+
+MAGIC = b"MFLR"
+VERSION = 1
+HEADER = struct.Struct("=4sIIII4xQQQ")
+HEADER_SIZE = 64
+WRITE_IDX_OFFSET = 24
+READ_IDX_OFFSET = 32
+DROPPED_OFFSET = 40
+INDEX = struct.Struct("=Q")
+SLOT_HEADER = struct.Struct("=IB")
+
+# slot flags (outputs of the event)
+FLAG_JSON = 1
+FLAG_SYSLOG = 2
+
+
+class Ring(object):
+    """A single producer / single consumer ring buffer in a mmaped file.
+
+    Use Ring.create() (producer side) or Ring.open() (consumer side).
+
+    """
+
+    def __init__(self, path, f, mm):
+        self.path = path
+        self._file = f
+        self._mm = mm
+        magic, version, self.pid, self.slot_size, self.slot_count, _, _, \
+            _ = HEADER.unpack_from(mm, 0)
+        if magic != MAGIC or version != VERSION:
+            raise Exception("%s is not a valid mflog ring" % path)
+        self.max_payload_size = self.slot_size - SLOT_HEADER.size
+
+    @classmethod
+    def create(cls, directory, slot_size=4096, slot_count=1024):
+        """Create a new ring (for the current process) in a directory."""
+        pid = os.getpid()
+        path = os.path.join(directory, "%i-%s.ring" % (pid,
+                                                       uuid.uuid4().hex[:8]))
+        tmp_path = path + ".tmp"
+        size = HEADER_SIZE + slot_size * slot_count
+        f = open(tmp_path, "w+b")
+        f.truncate(size)
+        mm = mmap.mmap(f.fileno(), size)
+        HEADER.pack_into(mm, 0, MAGIC, VERSION, pid, slot_size, slot_count,
+                         0, 0, 0)
+        # the ring is visible by the writer only when initialized
+        os.rename(tmp_path, path)
+        return cls(path, f, mm)
+
+    @classmethod
+    def open(cls, path):
+        """Open an existing ring (writer side)."""
+        f = open(path, "r+b")
+        try:
+            mm = mmap.mmap(f.fileno(), 0)
+        except Exception:
+            f.close()
+            raise
+        return cls(path, f, mm)
+
+    def _get(self, offset):
+        return INDEX.unpack_from(self._mm, offset)[0]
+
+    def _set(self, offset, value):
+        INDEX.pack_into(self._mm, offset, value)
+
+    @property
+    def dropped(self):
+        return self._get(DROPPED_OFFSET)
+
+    def __len__(self):
+        return self._get(WRITE_IDX_OFFSET) - self._get(READ_IDX_OFFSET)
+
+    def put(self, payload, flags=FLAG_JSON):
+        """Put a payload (bytes) in the ring (producer side).
+
+        Returns:
+            (boolean) False if the ring is full (the event is dropped and
+            counted).
+
+        Raises:
+            ValueError: if the payload is bigger than a slot.
+
+        """
+        size = len(payload)
+        if size > self.max_payload_size:
+            raise ValueError("payload too big for a ring slot")
+        write_idx = self._get(WRITE_IDX_OFFSET)
+        if write_idx - self._get(READ_IDX_OFFSET) >= self.slot_count:
+            self._set(DROPPED_OFFSET, self._get(DROPPED_OFFSET) + 1)
+            return False
+        offset = HEADER_SIZE + (write_idx % self.slot_count) * self.slot_size
+        SLOT_HEADER.pack_into(self._mm, offset, size, flags)
+        start = offset + SLOT_HEADER.size
+        self._mm[start:start + size] = payload
+        # publish the slot
+        self._set(WRITE_IDX_OFFSET, write_idx + 1)
+        return True
+
+    def get_all(self):
+        """Get (and remove) all available payloads (consumer side).
+
+        Returns:
+            (list) A list of (flags, payload) tuples.
+
+        """
+        read_idx = self._get(READ_IDX_OFFSET)
+        write_idx = self._get(WRITE_IDX_OFFSET)
+        res = []
+        for idx in range(read_idx, write_idx):
+            offset = HEADER_SIZE + (idx % self.slot_count) * self.slot_size
+            size, flags = SLOT_HEADER.unpack_from(self._mm, offset)
+            start = offset + SLOT_HEADER.size
+            res.append((flags, self._mm[start:start + size]))
+        if len(res) > 0:
+            self._set(READ_IDX_OFFSET, write_idx)
+        return res
+
+    def close(self, unlink=False):
+        try:
+            self._mm.close()
+            self._file.close()
+        except Exception:
+            pass
+        if unlink:
+            try:
+                os.unlink(self.path)
+            except Exception:
+                pass
+
+
+def is_pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class Writer(object):
+    """Drain all rings of a directory into the JSON file (and syslog).
+
+    Args:
+        directory (string): The directory of rings.
+        json_file (string): The full path of the JSON file (or None).
+        syslog_logger (SyslogLogger): A SyslogLogger object (or None).
+        syslog_format (string): msg_only or json.
+
+    """
+
+    def __init__(self, directory, json_file=None, syslog_logger=None,
+                 syslog_format=None):
+        self.directory = directory
+        self.syslog_logger = syslog_logger
+        self.syslog_format = syslog_format
+        self.rings = {}
+        # path => last seen dropped counter
+        self._dropped = {}
+        self._json = None
+        if json_file is not None:
+            self._json = open(json_file, "a")
+
+    def scan(self):
+        """Open new rings of the directory."""
+        for path in glob.glob(os.path.join(self.directory, "*.ring")):
+            if path in self.rings:
+                continue
+            try:
+                self.rings[path] = Ring.open(path)
+            except Exception as e:
+                print("MFLOG ERROR: can't open ring %s with exception: %s" %
+                      (path, e), file=sys.stderr)
+
+    def _dropped_line(self, ring, dropped):
+        return json.dumps({
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S.000000Z",
+                                       time.gmtime()),
+            "level": "warning", "name": "mflog.shm", "pid": ring.pid,
+            "event": "%i log events dropped (shared memory ring full)" %
+            dropped
+        })
+
+    def _syslog(self, payload):
+        event_dict = json.loads(payload)
+        if self.syslog_format == "json":
+            message = payload
+        else:
+            message = event_dict.get("event",
+                                     event_dict.get("event_template", ""))
+        self.syslog_logger.send(message, event_dict.get("name", "unknown"),
+                                event_dict.get("level", "warning"))
+
+    def drain(self):
+        """Drain all opened rings once.
+
+        Returns:
+            (int) The number of read events.
+
+        """
+        lines = []
+        n = 0
+        for path, ring in list(self.rings.items()):
+            # the liveness must be checked before draining (a process can
+            # write a last event and die just after our drain)
+            alive = is_pid_alive(ring.pid)
+            for flags, payload in ring.get_all():
+                n += 1
+                payload = payload.decode("utf8")
+                if flags & FLAG_JSON:
+                    lines.append(payload)
+                if flags & FLAG_SYSLOG and self.syslog_logger is not None:
+                    try:
+                        self._syslog(payload)
+                    except Exception as e:
+                        print("MFLOG ERROR: can't send to syslog with "
+                              "exception: %s" % e, file=sys.stderr)
+            dropped = ring.dropped
+            if dropped != self._dropped.get(path, 0):
+                lines.append(self._dropped_line(
+                    ring, dropped - self._dropped.get(path, 0)))
+                self._dropped[path] = dropped
+            if not alive:
+                # abandoned ring
+                ring.close(unlink=True)
+                del self.rings[path]
+                self._dropped.pop(path, None)
+        if self._json is not None and len(lines) > 0:
+            # one lock for the whole batch
+            write_with_lock(self._json, "\n".join(lines) + "\n")
+            flush_with_lock(self._json)
+        return n
+
+    def run_forever(self, poll_interval=0.01, scan_interval=1.0):
+        last_scan = 0
+        while True:
+            now = time.monotonic()
+            if now - last_scan > scan_interval:
+                self.scan()
+                last_scan = now
+            if self.drain() == 0:
+                time.sleep(poll_interval)
+
+    def close(self):
+        for ring in self.rings.values():
+            ring.close()
+        if self._json is not None:
+            self._json.close()
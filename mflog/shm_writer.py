@@ -0,0 +1,44 @@
+#!/bin/env python3
+
+import os
+import argparse
+from mflog.utils import Config
+from mflog.syslog import SyslogLogger
+from mflog.shm import Writer
+
+
+def main():
+    parser = argparse.ArgumentParser("drain mflog shared memory rings into "
+                                     "the JSON file (and syslog)")
+    parser.add_argument('--shm-dir', action="store", default=None,
+                        help="rings directory (default: MFLOG_SHM_DIR "
+                        "env var)")
+    parser.add_argument('--json-file', action="store", default=None,
+                        help="JSON file full path (default: MFLOG_JSON_FILE "
+                        "env var)")
+    parser.add_argument('--poll-interval', action="store", type=float,
+                        default=0.01, help="sleep time (in seconds) when "
+                        "there is nothing to read")
+    options = parser.parse_args()
+    directory = options.shm_dir or Config.shm_dir
+    json_file = options.json_file or Config.json_file
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    syslog_logger = None
+    if Config.syslog_address:
+        syslog_logger = SyslogLogger(Config.syslog_address,
+                                     Config.syslog_format)
+    writer = Writer(directory, json_file, syslog_logger,
+                    Config.syslog_format)
+    try:
+        writer.run_forever(poll_interval=options.poll_interval)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        writer.scan()
+        writer.drain()
+        writer.close()
+
+
+if __name__ == "__main__":
+    main()
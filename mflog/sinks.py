@@ -0,0 +1,849 @@
+# -*- coding: utf-8 -*-
+
+"""Log outputs (sinks).
+
+Each sink has its own minimal level, formatter and transport. For each
+log event, each serialization (plain, json...) is computed at most once
+and shared between all sinks using it.
+
+Sinks are built (once per configuration) from the configuration (stdout,
+stderr, json file, syslog), from the sinks option of set_config() (or the
+MFLOG_SINKS env var) and from "mflog.sinks" entry points.
+
+Example of a custom sink:
+
+    from mflog.sinks import Sink
+
+    class MySink(Sink):
+
+        name = "my_sink"
+        formatter = "json"
+
+        def write(self, message, event):
+            send_somewhere(message)
+            return len(message)
+
+    mflog.set_config(sinks=[MySink(minimal_level="ERROR")])
+
+"""
+
+from __future__ import print_function
+import os
+import sys
+import time
+import atexit
+import select
+import logging
+import importlib
+import threading
+from mflog.utils import Config, level_name_to_level_no, write_with_lock, \
+    flush_with_lock, get_resolved_fancy_output_config_value
+from mflog.utils import dump_locals as _dump_locals
+from mflog.formatters import FORMATTERS, GELF_LEVELS, get_human_extra_dict
+from mflog.processors import kv_renderer
+from mflog.metrics import record_latency
+from mflog.profiling import wrap_sink_emit, wrap_formatter
+from mflog.syslog import SyslogLogger
+from mflog.shm import Ring, FLAG_JSON, FLAG_SYSLOG
+from mflog.gelf import GelfUDPSender
+from mflog.journald import JournaldSender, get_field_name
+from mflog.unittests import UNIT_TESTS_STDOUT, UNIT_TESTS_STDERR, \
+    UNIT_TESTS_JSON, UNIT_TESTS_MODE
+try:
+    from rich.console import Console
+    from rich.table import Table
+    from rich.text import Text
+except ImportError:
+    pass
+
+ENTRY_POINTS_GROUP = "mflog.sinks"
+SINKS = None
+_OWNED_SINKS = []
+_SINKS_LOCK = threading.Lock()
+_FORMATTERS_IN_USE = FORMATTERS
+_CONSOLE_BUFFER = None
+# maximum size of lines written without lock in atomic append mode
+ATOMIC_APPEND_MAX_SIZE = getattr(select, "PIPE_BUF", 4096)
+
+
+class Sink(object):
+    """Base class for sinks.
+
+    Args:
+        minimal_level (string): The minimal level name of this sink (if
+            None, all events are accepted).
+        formatter (string or callable): The name of a registered formatter
+            or a function which takes an EventRecord and returns a string.
+        name (string): The name of the sink (for metrics and errors).
+        max_event_size (int): If set, events with a serialization bigger
+            than this are serialized again with huge values truncated.
+
+    """
+
+    name = "sink"
+    formatter = "json"
+    max_event_size = None
+
+    def __init__(self, minimal_level=None, formatter=None, name=None,
+                 max_event_size=None):
+        if minimal_level is None:
+            self.minimal_level_no = 0
+        else:
+            self.minimal_level_no = level_name_to_level_no(minimal_level)
+        if formatter is not None:
+            self.formatter = formatter
+        if name is not None:
+            self.name = name
+        if max_event_size:
+            self.max_event_size = max_event_size
+
+    def accept(self, event):
+        """Return True if the given EventRecord must be emitted."""
+        return event.level_no >= self.minimal_level_no
+
+    def render(self, event):
+        """Return the serialized message of the given EventRecord.
+
+        Note: the result is cached by the record (so it can be rendered in
+        advance, before crossing a thread boundary).
+
+        """
+        message = event.render(self.formatter, _FORMATTERS_IN_USE)
+        if self.max_event_size is not None and \
+                len(message) > self.max_event_size:
+            message = event.truncated(self.max_event_size).render(
+                self.formatter, _FORMATTERS_IN_USE)
+        return message
+
+    def emit(self, event):
+        """Emit the given EventRecord.
+
+        Returns:
+            (int) The number of written bytes (or None if unknown).
+
+        """
+        return self.write(self.render(event), event)
+
+    def write(self, message, event):
+        """Write the serialized message (to be overriden)."""
+        raise NotImplementedError()
+
+    def after_fork(self):
+        """Called in the child process after a fork."""
+        pass
+
+    def close(self):
+        pass
+
+
+class ConsoleBuffer(object):
+    """Buffer of console lines (shared between stdout and stderr sinks).
+
+    Buffered lines are written (in order, whole lines only) when the
+    buffer size is reached, every interval seconds (with a background
+    thread), immediately for ERROR (or more) events and at exit.
+
+    Args:
+        size (int): The maximum size of the buffer (in bytes).
+        interval (float): The maximum age of buffered lines (in seconds).
+
+    """
+
+    def __init__(self, size, interval=1.0):
+        self.size = size
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._lines = []
+        self._bytes = 0
+        self._thread = None
+        self._stopped = threading.Event()
+
+    def add(self, stream, line, flush_now=False):
+        """Add a (whole) line for the given stream (stdout or stderr).
+
+        Note: after close(), lines are written immediately.
+
+        """
+        stopped = self._stopped.is_set()
+        with self._lock:
+            self._lines.append((stream, line))
+            self._bytes += len(line)
+            if flush_now or stopped or self._bytes >= self.size:
+                self._flush()
+        if self._thread is None and not stopped:
+            self._start_thread()
+
+    def _start_thread(self):
+        with self._lock:
+            if self._thread is not None or self._stopped.is_set():
+                return
+            self._thread = threading.Thread(target=self._flush_forever,
+                                            name="mflog-console",
+                                            daemon=True)
+            self._thread.start()
+
+    def _flush_forever(self):
+        while not self._stopped.wait(self.interval):
+            self.flush()
+
+    def _flush(self):
+        # (lock acquired)
+        if len(self._lines) == 0:
+            return
+        lines = self._lines
+        self._lines = []
+        self._bytes = 0
+        # consecutive lines of the same stream are written at once
+        current = None
+        chunk = []
+        for stream, line in lines:
+            if stream != current and len(chunk) > 0:
+                self._write(current, "".join(chunk))
+                chunk = []
+            current = stream
+            chunk.append(line)
+        self._write(current, "".join(chunk))
+
+    def _write(self, stream, data):
+        f = sys.stdout if stream == "stdout" else sys.stderr
+        f.write(data)
+        f.flush()
+
+    def flush(self):
+        """Write all buffered lines."""
+        with self._lock:
+            self._flush()
+
+    def close(self):
+        """Stop the background thread and write all buffered lines."""
+        self._stopped.set()
+        thread = self._thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join()
+        self.flush()
+
+    def after_fork(self):
+        self._lock = threading.Lock()
+        # buffered lines are written by the parent process
+        self._lines = []
+        self._bytes = 0
+        self._thread = None
+        self._stopped = threading.Event()
+
+
+class ConsoleSink(Sink):
+    """Human output on stdout (for debug/info) or stderr (for others).
+
+    Args:
+        stream (string): stdout or stderr.
+        buffer (ConsoleBuffer): A shared buffer (None means unbuffered).
+
+    """
+
+    formatter = "plain"
+
+    def __init__(self, stream="stdout", buffer=None, **kwargs):
+        Sink.__init__(self, **kwargs)
+        self.stream = stream
+        self.name = stream
+        self.buffer = buffer
+        self._lock = threading.Lock()
+        if UNIT_TESTS_MODE:
+            if stream == "stdout":
+                self._unittests_list = UNIT_TESTS_STDOUT
+            else:
+                self._unittests_list = UNIT_TESTS_STDERR
+        else:
+            self._unittests_list = None
+
+    def _get_file(self):
+        if self.stream == "stdout":
+            return sys.stdout
+        return sys.stderr
+
+    def accept(self, event):
+        return event.stream == self.stream and \
+            event.level_no >= self.minimal_level_no
+
+    def emit(self, event):
+        f = self._get_file()
+        if self._unittests_list is None and \
+                get_resolved_fancy_output_config_value(f=f):
+            try:
+                with self._lock:
+                    self._fancy_msg(f, event)
+                return None
+            except Exception:
+                # can't write to fancy output, let's fallback silently to
+                # standard logging
+                pass
+        return Sink.emit(self, event)
+
+    def write(self, message, event):
+        line = message + "\n"
+        if self._unittests_list is not None:
+            self._unittests_list.append(line)
+            return len(line)
+        if self.buffer is not None:
+            self.buffer.add(self.stream, line,
+                            flush_now=event.level_no >= logging.ERROR)
+            return len(line)
+        f = self._get_file()
+        with self._lock:
+            f.write(line)
+            f.flush()
+        return len(line)
+
+    def after_fork(self):
+        self._lock = threading.Lock()
+
+    def close(self):
+        if self.buffer is not None:
+            self.buffer.flush()
+
+    def _fancy_msg(self, f, record):
+        c = Console(file=f, highlight=False, emoji=False, markup=False)
+        lll = record.level.lower()
+        llu = lll.upper()
+        exc = record.exception
+        exc_repeated = record.extra.get('exception_repeated', False)
+        name = record.name
+        pid = record.pid
+        ts = record.timestamp[0:-3] + "Z"
+        msg = record.event
+        extra_dict = get_human_extra_dict(record)
+        extra = ""
+        if len(extra_dict) > 0:
+            extra = kv_renderer(None, None, extra_dict)
+        if lll in ['notset', 'debug', 'info', 'warning',
+                   'error', 'critical']:
+            ls = "logging.level.%s" % lll
+        else:
+            ls = "none"
+        output = Table(show_header=False, expand=True, box=None,
+                       padding=(0, 1, 0, 0))
+        output.add_column(style="log.time")
+        output.add_column(width=10, justify="center")
+        output.add_column(justify="center")
+        output.add_column(ratio=1)
+        row = []
+        row.append(Text(ts))
+        row.append(Text("[%s]" % llu, style=ls))
+        row.append(Text(name, style="bold") + Text("#") + Text("%i" % pid,
+                                                               style="yellow"))
+        row.append(Text("%s" % msg))
+        output.add_row(*row)
+        if extra != "":
+            output.add_row(
+                "", "", "",
+                Text("{ ", style="repr.attrib_name") +
+                Text(extra, style="repr.attrib_name") +
+                Text(" }", style="repr.attrib_name"))
+        c.print(output)
+        if exc is not None:
+            # (the already formatted traceback, not rendered again)
+            c.print(Text(exc))
+            if not exc_repeated and Config.auto_dump_locals:
+                _dump_locals(f)
+
+
+class JsonFileSink(Sink):
+    """JSON output in a file (shared between processes with a lock).
+
+    Args:
+        path (string): The full path of the JSON file.
+        durability (string): none (no fsync), interval (fsync every
+            fsync_interval seconds from a background thread) or group
+            (each write waits for a fsync, concurrent writers of the
+            process share the same fsync).
+        fsync_interval (float): see durability.
+        sync_level (string): If set, events with this level (or more)
+            always wait for a fsync (whatever the durability).
+        atomic_append (boolean): If True, lines up to PIPE_BUF bytes are
+            written without any flock with a single os.write() call on an
+            O_APPEND file descriptor (bigger lines are still written with
+            a lock).
+
+    """
+
+    name = "json"
+    formatter = "json"
+
+    def __init__(self, path=None, durability="none", fsync_interval=1.0,
+                 sync_level=None, atomic_append=False, **kwargs):
+        Sink.__init__(self, **kwargs)
+        self.path = path
+        self.atomic_append = atomic_append
+        self.durability = durability
+        self.fsync_interval = fsync_interval
+        self.sync_level_no = None
+        if sync_level is not None:
+            self.sync_level_no = level_name_to_level_no(sync_level)
+        self._lock = threading.Lock()
+        self._file = None
+        self._fd = None
+        if UNIT_TESTS_MODE:
+            self._unittests_list = UNIT_TESTS_JSON
+        else:
+            self._unittests_list = None
+            self._file = open(path, 'a')
+            if atomic_append:
+                # unbuffered, so one line => one write() syscall
+                self._fd = os.open(path,
+                                   os.O_WRONLY | os.O_APPEND | os.O_CREAT,
+                                   0o644)
+        self._init_sync()
+
+    def _init_sync(self):
+        self._sync_cond = threading.Condition()
+        # number of written lines / number of lines covered by a fsync
+        self._written = 0
+        self._synced = 0
+        self._syncing = False
+        self._closed = False
+        self._fsync_thread = None
+        if self._file is not None and self.durability == "interval":
+            self._fsync_thread = threading.Thread(
+                target=self._fsync_forever, name="mflog-fsync", daemon=True)
+            self._fsync_thread.start()
+
+    def write(self, message, event):
+        line = message + "\n"
+        before = time.perf_counter()
+        if self._unittests_list is not None:
+            self._unittests_list.append(line)
+            record_latency("json_write", time.perf_counter() - before)
+            return len(line)
+        data = None
+        if self._fd is not None:
+            data = line.encode("utf8")
+            if len(data) > ATOMIC_APPEND_MAX_SIZE:
+                data = None
+        if data is not None:
+            # (not interleaved with other writers, no lock needed)
+            written = os.write(self._fd, data)
+            while written < len(data):
+                # partial write (disk full...), atomicity is lost anyway
+                data = data[written:]
+                written = os.write(self._fd, data)
+            with self._lock:
+                self._written += 1
+                seq = self._written
+        else:
+            with self._lock:
+                write_with_lock(self._file, line)
+                flush_with_lock(self._file)
+                self._written += 1
+                seq = self._written
+        record_latency("json_write", time.perf_counter() - before)
+        if self.durability == "group" or \
+                (self.sync_level_no is not None and
+                 event.level_no >= self.sync_level_no):
+            self._sync(seq)
+        return len(line)
+
+    def _fsync(self):
+        before = time.perf_counter()
+        os.fsync(self._file.fileno())
+        record_latency("fsync", time.perf_counter() - before)
+
+    def _sync(self, seq):
+        """Wait for a fsync covering the line number seq (group commit)."""
+        with self._sync_cond:
+            while self._synced < seq:
+                if self._syncing:
+                    # another thread is syncing, let's wait for it
+                    self._sync_cond.wait()
+                    continue
+                self._syncing = True
+                # all lines written so far will be covered by our fsync
+                target = self._written
+                ok = False
+                self._sync_cond.release()
+                try:
+                    self._fsync()
+                    ok = True
+                finally:
+                    self._sync_cond.acquire()
+                    self._syncing = False
+                    if ok and target > self._synced:
+                        self._synced = target
+                    self._sync_cond.notify_all()
+
+    def _fsync_forever(self):
+        while not self._closed:
+            time.sleep(self.fsync_interval)
+            try:
+                if self._written > self._synced:
+                    self._sync(self._written)
+            except Exception:
+                pass
+
+    def after_fork(self):
+        # we need a new open file description to get a working flock
+        # between the parent and the child processes
+        if self._file is not None:
+            self._lock = threading.Lock()
+            old_file = self._file
+            self._file = open(self.path, 'a')
+            try:
+                old_file.close()
+            except Exception:
+                pass
+            self._init_sync()
+
+    def close(self):
+        if self._file is not None:
+            self._closed = True
+            try:
+                if self.durability != "none" and \
+                        self._written > self._synced:
+                    self._sync(self._written)
+                self._file.close()
+                if self._fd is not None:
+                    os.close(self._fd)
+                    self._fd = None
+            except Exception:
+                pass
+
+
+class SyslogSink(Sink):
+    """Syslog output (msg_only or json format)."""
+
+    name = "syslog"
+
+    def __init__(self, address, frmt=None, **kwargs):
+        if "formatter" not in kwargs:
+            if frmt is None or frmt == "msg_only":
+                kwargs["formatter"] = "msg_only"
+            else:
+                kwargs["formatter"] = "json"
+        Sink.__init__(self, **kwargs)
+        self._syslog_logger = SyslogLogger(address, frmt)
+
+    def write(self, message, event):
+        before = time.perf_counter()
+        self._syslog_logger.send(message, event.name, event.level)
+        record_latency("syslog_send", time.perf_counter() - before)
+        return len(message)
+
+    def close(self):
+        self._syslog_logger.close()
+
+
+class GelfSink(Sink):
+    """GELF output over UDP (compressed and chunked)."""
+
+    name = "gelf"
+    formatter = "gelf"
+
+    def __init__(self, address, compression="zlib", chunk_size=8154,
+                 **kwargs):
+        Sink.__init__(self, **kwargs)
+        self._sender = GelfUDPSender(address, compression, chunk_size)
+
+    def write(self, message, event):
+        before = time.perf_counter()
+        size = self._sender.send(message)
+        record_latency("gelf_send", time.perf_counter() - before)
+        return size
+
+    def close(self):
+        self._sender.close()
+
+
+class JournaldSink(Sink):
+    """Native journald output.
+
+    The (formatted) message is the MESSAGE field, the level is converted
+    to a syslog PRIORITY, the logger name and the pid are the
+    SYSLOG_IDENTIFIER and SYSLOG_PID fields and other keys are
+    (uppercased) fields.
+
+    """
+
+    name = "journald"
+    formatter = "msg_only"
+
+    # extra keys with a standard journal field name
+    FIELD_NAMES = {"callsite_function": "CODE_FUNC",
+                   "callsite_lineno": "CODE_LINE"}
+    RESERVED_FIELD_NAMES = frozenset(["MESSAGE", "PRIORITY",
+                                      "SYSLOG_IDENTIFIER", "SYSLOG_PID",
+                                      "EXCEPTION"])
+
+    def __init__(self, path, **kwargs):
+        Sink.__init__(self, **kwargs)
+        self._sender = JournaldSender(path)
+
+    def _get_field_name(self, key):
+        # not cached: keys can have a high cardinality and it's cheap
+        name = self.FIELD_NAMES.get(key)
+        if name is not None:
+            return name
+        name = get_field_name(key)
+        if name in self.RESERVED_FIELD_NAMES:
+            name = "EXTRA_" + name
+        return name
+
+    def write(self, message, event):
+        fields = [("MESSAGE", message),
+                  ("PRIORITY", str(GELF_LEVELS.get(event.level, 6))),
+                  ("SYSLOG_IDENTIFIER", event.name),
+                  ("SYSLOG_PID", str(event.pid))]
+        if event.exception is not None:
+            fields.append(("EXCEPTION", event.exception))
+        for k, v in event.extra.items():
+            fields.append((self._get_field_name(k),
+                           v if isinstance(v, str) else str(v)))
+        before = time.perf_counter()
+        size = self._sender.send(fields)
+        record_latency("journald_send", time.perf_counter() - before)
+        return size
+
+    def close(self):
+        self._sender.close()
+
+
+class ShmSink(Sink):
+    """JSON output (and syslog output) through a shared memory ring.
+
+    Events are written in a ring buffer of the process (see mflog.shm)
+    and drained by the writer process into the JSON file (and syslog).
+    Events bigger than a ring slot are written directly (with a lock in
+    the JSON file and/or to syslog).
+
+    """
+
+    name = "shm"
+    formatter = "json"
+
+    def __init__(self, directory, json_path=None, json_minimal_level=None,
+                 syslog_address=None, syslog_format=None,
+                 syslog_minimal_level=None, slot_size=4096,
+                 slot_count=1024):
+        self.json_minimal_level_no = \
+            level_name_to_level_no(json_minimal_level or "DEBUG")
+        minimal_level_no = self.json_minimal_level_no
+        self.syslog_minimal_level_no = None
+        if syslog_address:
+            self.syslog_minimal_level_no = \
+                level_name_to_level_no(syslog_minimal_level or "DEBUG")
+            minimal_level_no = min(minimal_level_no,
+                                   self.syslog_minimal_level_no)
+        Sink.__init__(self)
+        self.minimal_level_no = minimal_level_no
+        self.directory = directory
+        self.json_path = json_path
+        self.syslog_address = syslog_address
+        self.syslog_format = syslog_format
+        self.slot_size = slot_size
+        self.slot_count = slot_count
+        self._lock = threading.Lock()
+        self._ring = None
+        self._fallback_json = None
+        self._fallback_syslog = None
+
+    def _get_ring(self):
+        if self._ring is None:
+            if not os.path.isdir(self.directory):
+                os.makedirs(self.directory, exist_ok=True)
+            self._ring = Ring.create(self.directory, self.slot_size,
+                                     self.slot_count)
+        return self._ring
+
+    def _fallback(self, message, event, flags):
+        # the event is too big for a ring slot
+        if flags & FLAG_JSON and self.json_path is not None:
+            if self._fallback_json is None:
+                self._fallback_json = JsonFileSink(self.json_path)
+            self._fallback_json.write(message, event)
+        if flags & FLAG_SYSLOG:
+            if self._fallback_syslog is None:
+                self._fallback_syslog = SyslogSink(self.syslog_address,
+                                                   self.syslog_format)
+            self._fallback_syslog.emit(event)
+
+    def write(self, message, event):
+        flags = 0
+        if event.level_no >= self.json_minimal_level_no or \
+                "flight_recorder" in event.extra:
+            # (flight recorder events are dumped whatever their level)
+            flags = FLAG_JSON
+        if self.syslog_minimal_level_no is not None and \
+                event.level_no >= self.syslog_minimal_level_no:
+            flags = flags | FLAG_SYSLOG
+        payload = message.encode("utf8")
+        with self._lock:
+            ring = self._get_ring()
+            if len(payload) > ring.max_payload_size:
+                self._fallback(message, event, flags)
+            else:
+                ring.put(payload, flags)
+        return len(payload)
+
+    def after_fork(self):
+        # rings are single producer => a new ring for the child process
+        self._lock = threading.Lock()
+        if self._ring is not None:
+            self._ring.close()
+            self._ring = None
+        for sink in (self._fallback_json, self._fallback_syslog):
+            if sink is not None:
+                sink.after_fork()
+
+    def close(self):
+        if self._ring is not None:
+            self._ring.close()
+            self._ring = None
+        for sink in (self._fallback_json, self._fallback_syslog):
+            if sink is not None:
+                sink.close()
+
+
+def _get_entry_points():
+    try:
+        from importlib.metadata import entry_points
+    except ImportError:
+        return []
+    eps = entry_points()
+    if hasattr(eps, "select"):
+        return list(eps.select(group=ENTRY_POINTS_GROUP))
+    return list(eps.get(ENTRY_POINTS_GROUP, []))
+
+
+def _get_object_by_path(path):
+    # (as get_func_by_path() but raises instead of exiting)
+    module_path, _, name = path.rpartition(".")
+    if module_path == "":
+        raise ValueError("%s must follow 'pkg.name'" % path)
+    return getattr(importlib.import_module(module_path), name)
+
+
+def _instantiate(obj):
+    if isinstance(obj, Sink):
+        return (obj, False)
+    return (obj(), True)
+
+
+def _build_sinks():
+    """Build sinks from the configuration.
+
+    Returns:
+        (list) A list of (sink, owned) tuples (owned sinks are closed by
+        reset_sinks()).
+
+    """
+    global _CONSOLE_BUFFER
+    sinks = []
+    if Config.console_buffer_size > 0:
+        _CONSOLE_BUFFER = ConsoleBuffer(Config.console_buffer_size,
+                                        Config.console_flush_interval)
+    else:
+        _CONSOLE_BUFFER = None
+    sinks.append((ConsoleSink("stdout", _CONSOLE_BUFFER), True))
+    sinks.append((ConsoleSink("stderr", _CONSOLE_BUFFER), True))
+    if Config.json_transport == "shm":
+        sinks.append((ShmSink(Config.shm_dir, Config.json_file,
+                              Config.json_minimal_level,
+                              Config.syslog_address, Config.syslog_format,
+                              Config.syslog_minimal_level,
+                              Config.shm_slot_size, Config.shm_slot_count),
+                      True))
+    elif Config.json_file or UNIT_TESTS_MODE:
+        sinks.append((JsonFileSink(Config.json_file,
+                                   Config.json_durability,
+                                   Config.json_fsync_interval,
+                                   Config.json_sync_level,
+                                   Config.json_transport == "append",
+                                   minimal_level=Config.json_minimal_level,
+                                   max_event_size=Config.json_max_event_size),
+                      True))
+    if Config.syslog_address and Config.json_transport != "shm":
+        sinks.append((SyslogSink(Config.syslog_address,
+                                 Config.syslog_format,
+                                 minimal_level=Config.syslog_minimal_level,
+                                 max_event_size=Config.syslog_max_event_size),
+                      True))
+    if Config.gelf_address:
+        sinks.append((GelfSink(Config.gelf_address, Config.gelf_compression,
+                               Config.gelf_chunk_size,
+                               minimal_level=Config.gelf_minimal_level),
+                      True))
+    if Config.journald_socket:
+        sinks.append((JournaldSink(
+            Config.journald_socket,
+            minimal_level=Config.journald_minimal_level), True))
+    custom = list(Config.sinks)
+    for ep in _get_entry_points():
+        try:
+            custom.append(ep.load())
+        except Exception as e:
+            print("MFLOG ERROR: can't load sink entry point %s with "
+                  "exception: %s" % (ep.name, e), file=sys.stderr)
+    for obj in custom:
+        try:
+            if isinstance(obj, str):
+                obj = _get_object_by_path(obj)
+            sinks.append(_instantiate(obj))
+        except Exception as e:
+            print("MFLOG ERROR: can't build sink %s with exception: %s" %
+                  (obj, e), file=sys.stderr)
+    return sinks
+
+
+def get_sinks():
+    """Return the list of configured sinks."""
+    global SINKS, _OWNED_SINKS, _FORMATTERS_IN_USE
+    if SINKS is None:
+        with _SINKS_LOCK:
+            if SINKS is None:
+                tmp = _build_sinks()
+                if Config.profile:
+                    _FORMATTERS_IN_USE = {k: wrap_formatter(k, v)
+                                          for k, v in FORMATTERS.items()}
+                    for sink, _ in tmp:
+                        sink.emit = wrap_sink_emit(sink.name, sink.emit)
+                else:
+                    _FORMATTERS_IN_USE = FORMATTERS
+                _OWNED_SINKS = [x[0] for x in tmp if x[1]]
+                SINKS = [x[0] for x in tmp]
+    return SINKS
+
+
+def reset_sinks():
+    """Close (owned) sinks, they will be rebuilt with the configuration."""
+    global SINKS, _OWNED_SINKS, _CONSOLE_BUFFER
+    with _SINKS_LOCK:
+        owned_sinks = _OWNED_SINKS
+        console_buffer = _CONSOLE_BUFFER
+        SINKS = None
+        _OWNED_SINKS = []
+        _CONSOLE_BUFFER = None
+    for sink in owned_sinks:
+        sink.close()
+    if console_buffer is not None:
+        console_buffer.close()
+
+
+def flush_console_buffer():
+    """Write buffered console lines (if any)."""
+    if _CONSOLE_BUFFER is not None:
+        _CONSOLE_BUFFER.flush()
+
+
+def _after_fork_in_child():
+    global _SINKS_LOCK
+    _SINKS_LOCK = threading.Lock()
+    if _CONSOLE_BUFFER is not None:
+        _CONSOLE_BUFFER.after_fork()
+    if SINKS is not None:
+        for sink in SINKS:
+            sink.after_fork()
+
+
+atexit.register(flush_console_buffer)
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
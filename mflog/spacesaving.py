@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+
+"""Approximate top-N counting with bounded memory (Space-Saving).
+
+Used by the volume profiler (see mflog.volume) and by the log statistics
+aggregator (see mflog.aggregate).
+
+"""
+
+import heapq
+import threading
+
+
+class SpaceSaving(object):
+    """Approximate counting of the most frequent keys (bounded memory).
+
+    This is the "Space-Saving" algorithm: at most capacity keys are
+    counted. When a new key arrives and the table is full, the key with
+    the minimal count is replaced by the new one (which inherits its
+    count, so counts are overestimated by at most this value).
+
+    Note: methods are thread safe.
+
+    Args:
+        capacity (int): The maximum number of counted keys.
+
+    """
+
+    def __init__(self, capacity=1000):
+        self.capacity = capacity
+        # key => [count, maximum overestimation]
+        self.counters = {}
+        # lazy min-heap of (count, key) (entries can be outdated)
+        self._heap = []
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        # (sent between processes by the aggregator)
+        with self._lock:
+            state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def add(self, key, count=1):
+        with self._lock:
+            self._add(key, count)
+
+    def _add(self, key, count):
+        # (lock acquired)
+        counter = self.counters.get(key)
+        if counter is not None:
+            counter[0] += count
+            return
+        if len(self.counters) < self.capacity:
+            self.counters[key] = [count, 0]
+            heapq.heappush(self._heap, (count, key))
+            return
+        # replace the key with the minimal count
+        while True:
+            min_count, min_key = heapq.heappop(self._heap)
+            current = self.counters[min_key][0]
+            if current == min_count:
+                break
+            # outdated entry
+            heapq.heappush(self._heap, (current, min_key))
+        del self.counters[min_key]
+        self.counters[key] = [min_count + count, min_count]
+        heapq.heappush(self._heap, (min_count + count, key))
+
+    def _get_min_count(self):
+        # keys absent from a full table may have been counted up to the
+        # minimal count (0 if the table is not full)
+        if len(self.counters) < self.capacity:
+            return 0
+        return min(x[0] for x in self.counters.values())
+
+    def merge(self, other):
+        """Merge counts (and overestimations) of another SpaceSaving object.
+
+        Note: for a key absent from one of the objects, the minimal count
+        of this object is added (to the count and to the overestimation).
+        Then, only the capacity most frequent keys are kept.
+
+        """
+        with other._lock:
+            min2 = other._get_min_count()
+            other_counters = {k: tuple(v) for k, v in other.counters.items()}
+        with self._lock:
+            min1 = self._get_min_count()
+            counters = {}
+            for key in set(self.counters) | set(other_counters):
+                count1, error1 = self.counters.get(key, (min1, min1))
+                count2, error2 = other_counters.get(key, (min2, min2))
+                counters[key] = [count1 + count2, error1 + error2]
+            items = sorted(counters.items(), key=lambda x: x[1][0],
+                           reverse=True)
+            self.counters = dict(items[0:self.capacity])
+            self._heap = [(v[0], k) for k, v in self.counters.items()]
+            heapq.heapify(self._heap)
+
+    def top(self, n=10):
+        """Return the n most frequent keys.
+
+        Returns:
+            (list) A list of (key, count, maximum overestimation) tuples.
+
+        """
+        with self._lock:
+            items = [(k, v[0], v[1]) for k, v in self.counters.items()]
+        items.sort(key=lambda x: x[1], reverse=True)
+        return items[0:n]
@@ -1,6 +1,198 @@
 from logging.handlers import SysLogHandler
 from logging import LogRecord
+import os
 import json
+import time
+import errno
+import socket
+import threading
+from mflog.utils import level_name_to_level_no
+from mflog.formatters import GELF_LEVELS
+
+# syslog address prefixes of unix sockets => socket type (None: auto)
+UNIX_PREFIXES = {"unix": None, "unix-dgram": socket.SOCK_DGRAM,
+                 "unix-stream": socket.SOCK_STREAM}
+# bounded reconnect backoff (in seconds)
+RECONNECT_MIN_DELAY = 0.1
+RECONNECT_MAX_DELAY = 5.0
+# maximum size of the not yet sent data of a stream socket
+MAX_PENDING_SIZE = 65536
+LOG_USER = 1
+
+# (path, socket type) => UnixSyslogTransport (shared by all loggers)
+_TRANSPORTS = {}
+_TRANSPORTS_LOCK = threading.Lock()
+
+
+def is_unix_address(address):
+    """Return True if the (string) syslog address is a unix socket."""
+    return address.startswith("/") or \
+        address.split(":", 1)[0] in UNIX_PREFIXES
+
+
+def parse_unix_address(address):
+    """Parse a unix socket syslog address.
+
+    Args:
+        address (string): /path, unix:/path, unix-dgram:/path or
+            unix-stream:/path.
+
+    Returns:
+        (tuple) (path, socket type or None for auto).
+
+    """
+    if address.startswith("/"):
+        return (address, None)
+    prefix, path = address.split(":", 1)
+    return (path, UNIX_PREFIXES[prefix])
+
+
+class UnixSyslogTransport(object):
+    """Non blocking transport to a local syslog daemon (unix socket).
+
+    When the daemon is unavailable (restart...), messages are dropped
+    (and counted) and the connection is retried with a bounded
+    exponential backoff. So the caller is never blocked.
+
+    Args:
+        path (string): The path of the unix socket.
+        socktype (int): socket.SOCK_DGRAM, socket.SOCK_STREAM or None
+            (auto: datagram first then stream).
+
+    """
+
+    def __init__(self, path, socktype=None):
+        self.path = path
+        self.socktype = socktype
+        self.dropped = 0
+        self._socket = None
+        self._socket_type = None
+        self._pending = b""
+        self._delay = RECONNECT_MIN_DELAY
+        self._retry_at = 0.0
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        if self.socktype is None:
+            socktypes = (socket.SOCK_DGRAM, socket.SOCK_STREAM)
+        else:
+            socktypes = (self.socktype,)
+        for socktype in socktypes:
+            sock = socket.socket(socket.AF_UNIX, socktype)
+            sock.setblocking(False)
+            try:
+                sock.connect(self.path)
+            except OSError:
+                sock.close()
+                continue
+            self._socket = sock
+            self._socket_type = socktype
+            self._delay = RECONNECT_MIN_DELAY
+            if self.dropped > 0:
+                dropped = self.dropped
+                self.dropped = 0
+                try:
+                    self._send(("<%i>mflog: %i syslog messages dropped "
+                                "(syslog daemon unavailable)\000" %
+                                (LOG_USER * 8 + 4, dropped)).encode("utf8"))
+                except OSError:
+                    # the new connection is already broken
+                    self._disconnect()
+                    self.dropped += dropped
+                    break
+            return True
+        self._retry_at = time.monotonic() + self._delay
+        self._delay = min(self._delay * 2, RECONNECT_MAX_DELAY)
+        return False
+
+    def _disconnect(self):
+        if self._socket is not None:
+            try:
+                self._socket.close()
+            except Exception:
+                pass
+        self._socket = None
+        self._pending = b""
+
+    def _send(self, data):
+        if self._socket_type == socket.SOCK_DGRAM:
+            try:
+                return self._socket.send(data)
+            except BlockingIOError:
+                # the daemon is too slow
+                self.dropped += 1
+                return 0
+        if self._pending:
+            data = self._pending + data
+        try:
+            sent = self._socket.send(data)
+        except BlockingIOError:
+            sent = 0
+        if sent == len(data):
+            self._pending = b""
+        elif sent == 0 and not self._pending:
+            # nothing written => the message can be dropped
+            self.dropped += 1
+        else:
+            # (the rest of a partially written message must be sent)
+            self._pending = data[sent:]
+            if len(self._pending) > MAX_PENDING_SIZE:
+                self.dropped += 1
+                self._disconnect()
+                self._retry_at = time.monotonic() + self._delay
+        return sent
+
+    def send(self, data):
+        """Send a (framed) message.
+
+        Returns:
+            (int) The number of sent bytes (0 if the message is dropped).
+
+        """
+        with self._lock:
+            if self._socket is None:
+                if time.monotonic() < self._retry_at or \
+                        not self._connect():
+                    self.dropped += 1
+                    return 0
+            try:
+                return self._send(data)
+            except OSError as e:
+                if e.errno == errno.EMSGSIZE:
+                    raise
+            # the daemon has probably been restarted, let's reconnect once
+            self._disconnect()
+            if self._connect():
+                try:
+                    return self._send(data)
+                except OSError:
+                    self._disconnect()
+            self.dropped += 1
+            return 0
+
+    def close(self):
+        with self._lock:
+            self._disconnect()
+
+
+def get_unix_transport(path, socktype=None):
+    """Return the (shared) transport of a unix socket."""
+    key = (path, socktype)
+    with _TRANSPORTS_LOCK:
+        try:
+            return _TRANSPORTS[key]
+        except KeyError:
+            pass
+        tmp = UnixSyslogTransport(path, socktype)
+        _TRANSPORTS[key] = tmp
+        return tmp
+
+
+def _reset_transports_after_fork():
+    global _TRANSPORTS_LOCK
+    # (sockets of the parent are not closed, they are still used by it)
+    _TRANSPORTS_LOCK = threading.Lock()
+    _TRANSPORTS.clear()
 
 
 class SyslogLoggerMsgOnlyFormatter(object):
@@ -15,27 +207,70 @@ class SyslogLoggerJSONFormatter(object):
         return json.dumps(record.msg)
 
 
+class SyslogLoggerPreformattedFormatter(object):
+
+    def format(self, record):
+        return record.msg
+
+
 class SyslogLogger(object):
 
     __syslog_handler = None
+    __transport = None
+    __formatter = None
 
     def __init__(self, address, frmt=None):
-        self.__syslog_handler = SysLogHandler(address)
+        if isinstance(address, str) and is_unix_address(address):
+            self.__transport = get_unix_transport(
+                *parse_unix_address(address))
+        else:
+            self.__syslog_handler = SysLogHandler(address)
+            self.__syslog_handler.formatter = \
+                SyslogLoggerPreformattedFormatter()
         if frmt is None or frmt == "msg_only":
-            self.__syslog_handler.formatter = SyslogLoggerMsgOnlyFormatter()
+            self.__formatter = SyslogLoggerMsgOnlyFormatter()
         else:
-            self.__syslog_handler.formatter = SyslogLoggerJSONFormatter()
+            self.__formatter = SyslogLoggerJSONFormatter()
 
     def close(self):
-        self.__syslog_handler.close()
+        # (unix transports are shared)
+        if self.__syslog_handler is not None:
+            self.__syslog_handler.close()
 
     def msg(self, event_dict):
+        """Send the event to syslog.
+
+        Returns:
+            (int) The size of the formatted message.
+
+        """
         record = LogRecord(event_dict.get("name", "unknown"),
                            event_dict.get("level", "WARNING"),
                            "/not_used/not_used.py", 1,
                            event_dict, [], None)
+        message = self.__formatter.format(record)
+        self.send(message, record.name, event_dict.get("level", "WARNING"))
+        return len(message)
+
+    def send(self, message, name, level):
+        """Send an already formatted message to syslog."""
+        if self.__transport is not None:
+            priority = LOG_USER * 8 + GELF_LEVELS.get(str(level).lower(), 4)
+            self.__transport.send(("<%i>%s\000" % (priority, message))
+                                  .encode("utf8"))
+            return
+        try:
+            level_no = level_name_to_level_no(level)
+        except Exception:
+            level_no = 30
+        record = LogRecord(name, level_no, "/not_used/not_used.py", 1,
+                           message, [], None)
         self.__syslog_handler.acquire()
         try:
             self.__syslog_handler.emit(record)
         finally:
             self.__syslog_handler.release()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_transports_after_fork)
@@ -8,15 +8,25 @@ import fcntl
 import sys
 import six
 import importlib
-import inspect
+import time
+import reprlib
+import builtins
+import hashlib
+import traceback
 try:
     from rich.console import Console
-    from rich.tabulate import tabulate_mapping
+    from rich.table import Table
 except ImportError:
     pass
 
 OVERRIDE_LINES_CACHE = None
 LEVEL_FROM_LOGGER_NAME_CACHE = {}
+# None or an (expiration monotonic time, extra context dict) tuple
+# (replaced in a single assignment, so it's always consistent)
+EXTRA_CONTEXT_CACHE = None
+EXCEPTION_CACHE = {}
+EXCEPTION_CACHE_MAX_SIZE = 1000
+EXCEPTION_LAST_FULL_TRACEBACK = {}
 
 
 def write_with_lock(f, message):
@@ -34,6 +44,11 @@ def __reset_level_from_logger_name_cache():
     LEVEL_FROM_LOGGER_NAME_CACHE = {}
 
 
+def reset_extra_context_cache():
+    global EXTRA_CONTEXT_CACHE
+    EXTRA_CONTEXT_CACHE = None
+
+
 def get_func_by_path(func_path):
     func_name = func_path.split('.')[-1]
     module_path = ".".join(func_path.split('.')[0:-1])
@@ -79,12 +94,50 @@ class Config(object):
     _override_files = None
     _override_dict = None
     _extra_context_func = None
+    _extra_context_ttl = 0
+    _extra_context_static = False
     _json_only_keys = None
     _syslog_address = None
     _syslog_format = None
     _syslog_minimal_level = None
     _fancy_output = None
     _auto_dump_locals = True
+    _aio_queue_size = 10000
+    _exception_dedup_window = 0
+    _dump_locals_target = "outermost"
+    _dump_locals_max_value_size = 10000
+    _dump_locals_max_total_size = 100000
+    _dump_locals_json = False
+    _metrics_textfile = None
+    _metrics_textfile_interval = 60
+    _profile = False
+    _profile_signal = None
+    _sinks = None
+    _flight_recorder_size = 0
+    _flight_recorder_scope = "process"
+    _json_event_template = False
+    _json_transport = "lock"
+    _shm_dir = "/dev/shm/mflog"
+    _shm_slot_size = 4096
+    _shm_slot_count = 1024
+    _gelf_address = None
+    _gelf_minimal_level = None
+    _gelf_compression = "zlib"
+    _gelf_chunk_size = 8154
+    _console_buffer_size = 0
+    _console_flush_interval = 1.0
+    _json_durability = "none"
+    _json_fsync_interval = 1.0
+    _json_sync_level = None
+    _max_field_size = 0
+    _max_event_size = 0
+    _json_max_event_size = 0
+    _syslog_max_event_size = 0
+    _volume_profile = False
+    _volume_profile_capacity = 1000
+    _callsite = False
+    _journald_socket = None
+    _journald_minimal_level = None
 
     def __init__(self, minimal_level=None, json_minimal_level=None,
                  json_file=None, override_files=None,
@@ -93,10 +146,31 @@ class Config(object):
                  override_dict={}, syslog_address=None, syslog_format=None,
                  syslog_minimal_level=None,
                  fancy_output=None,
-                 auto_dump_locals=True):
-        global LEVEL_FROM_LOGGER_NAME_CACHE, OVERRIDE_LINES_CACHE
+                 auto_dump_locals=True,
+                 extra_context_ttl=None, extra_context_static=None,
+                 aio_queue_size=None, exception_dedup_window=None,
+                 dump_locals_target=None, dump_locals_max_value_size=None,
+                 dump_locals_max_total_size=None, dump_locals_json=None,
+                 metrics_textfile=None, metrics_textfile_interval=None,
+                 profile=None, profile_signal=None, sinks=None,
+                 flight_recorder_size=None, flight_recorder_scope=None,
+                 json_event_template=None, json_transport=None,
+                 shm_dir=None, shm_slot_size=None, shm_slot_count=None,
+                 gelf_address=None, gelf_minimal_level=None,
+                 gelf_compression=None, gelf_chunk_size=None,
+                 console_buffer_size=None, console_flush_interval=None,
+                 json_durability=None, json_fsync_interval=None,
+                 json_sync_level=None, max_field_size=None,
+                 max_event_size=None, json_max_event_size=None,
+                 syslog_max_event_size=None, volume_profile=None,
+                 volume_profile_capacity=None, callsite=None,
+                 journald_socket=None, journald_minimal_level=None):
+        global LEVEL_FROM_LOGGER_NAME_CACHE, OVERRIDE_LINES_CACHE, \
+            EXCEPTION_LAST_FULL_TRACEBACK
         OVERRIDE_LINES_CACHE = {}
         LEVEL_FROM_LOGGER_NAME_CACHE = {}
+        EXCEPTION_LAST_FULL_TRACEBACK = {}
+        reset_extra_context_cache()
         if minimal_level is not None:
             self._minimal_level = minimal_level
         else:
@@ -133,7 +207,13 @@ class Config(object):
             tmpsyslog = os.environ.get("MFLOG_SYSLOG_ADDRESS", None)
             if tmpsyslog == "null":
                 tmpsyslog = None
-        if isinstance(tmpsyslog, six.string_types):
+        if isinstance(tmpsyslog, six.string_types) and \
+                (tmpsyslog.startswith('/') or
+                 tmpsyslog.split(':', 1)[0] in ('unix', 'unix-dgram',
+                                                'unix-stream')):
+            # unix socket (see mflog.syslog)
+            self._syslog_address = tmpsyslog
+        elif isinstance(tmpsyslog, six.string_types):
             tmpsyslog2 = tmpsyslog.split(':')
             if len(tmpsyslog2) == 1:
                 self._syslog_address = (tmpsyslog2[0], 514)
@@ -160,6 +240,16 @@ class Config(object):
                   file=sys.stderr)
             print("=> EXIT", file=sys.stderr)
             sys.exit(1)
+        if extra_context_ttl is not None:
+            self._extra_context_ttl = float(extra_context_ttl)
+        else:
+            self._extra_context_ttl = \
+                float(os.environ.get('MFLOG_EXTRA_CONTEXT_TTL', '0'))
+        if extra_context_static is not None:
+            self._extra_context_static = extra_context_static
+        else:
+            self._extra_context_static = \
+                (os.environ.get('MFLOG_EXTRA_CONTEXT_STATIC', '0') == '1')
         if json_only_keys is not None:
             self._json_only_keys = json_only_keys
         else:
@@ -177,6 +267,228 @@ class Config(object):
         else:
             self._fancy_output = fancy_output
         self._auto_dump_locals = auto_dump_locals
+        if aio_queue_size is not None:
+            self._aio_queue_size = aio_queue_size
+        else:
+            self._aio_queue_size = \
+                int(os.environ.get('MFLOG_AIO_QUEUE_SIZE', '10000'))
+        if exception_dedup_window is not None:
+            self._exception_dedup_window = float(exception_dedup_window)
+        else:
+            self._exception_dedup_window = \
+                float(os.environ.get('MFLOG_EXCEPTION_DEDUP_WINDOW', '0'))
+        if dump_locals_target is not None:
+            self._dump_locals_target = dump_locals_target
+        else:
+            self._dump_locals_target = \
+                os.environ.get('MFLOG_DUMP_LOCALS_TARGET', 'outermost')
+        if self._dump_locals_target not in ('outermost', 'caller',
+                                            'exception'):
+            raise Exception("unknown dump_locals_target: %s => must be "
+                            "outermost, caller or exception" %
+                            self._dump_locals_target)
+        if dump_locals_max_value_size is not None:
+            self._dump_locals_max_value_size = dump_locals_max_value_size
+        else:
+            self._dump_locals_max_value_size = \
+                int(os.environ.get('MFLOG_DUMP_LOCALS_MAX_VALUE_SIZE',
+                                   '10000'))
+        if dump_locals_max_total_size is not None:
+            self._dump_locals_max_total_size = dump_locals_max_total_size
+        else:
+            self._dump_locals_max_total_size = \
+                int(os.environ.get('MFLOG_DUMP_LOCALS_MAX_TOTAL_SIZE',
+                                   '100000'))
+        if dump_locals_json is not None:
+            self._dump_locals_json = dump_locals_json
+        else:
+            self._dump_locals_json = \
+                (os.environ.get('MFLOG_DUMP_LOCALS_JSON', '0') == '1')
+        if metrics_textfile is not None:
+            self._metrics_textfile = metrics_textfile
+        else:
+            self._metrics_textfile = \
+                os.environ.get('MFLOG_METRICS_TEXTFILE', None)
+            if self._metrics_textfile == "null":
+                self._metrics_textfile = None
+        if metrics_textfile_interval is not None:
+            self._metrics_textfile_interval = metrics_textfile_interval
+        else:
+            self._metrics_textfile_interval = \
+                float(os.environ.get('MFLOG_METRICS_TEXTFILE_INTERVAL',
+                                     '60'))
+        if profile is not None:
+            self._profile = profile
+        else:
+            self._profile = (os.environ.get('MFLOG_PROFILE', '0') == '1')
+        if profile_signal is not None:
+            self._profile_signal = profile_signal
+        else:
+            self._profile_signal = \
+                os.environ.get('MFLOG_PROFILE_SIGNAL', None)
+            if self._profile_signal == "null":
+                self._profile_signal = None
+        if sinks is not None:
+            self._sinks = sinks
+        else:
+            self._sinks = [x.strip() for x in
+                           os.environ.get("MFLOG_SINKS", "").split(';')
+                           if x.strip() != ""]
+        if flight_recorder_size is not None:
+            self._flight_recorder_size = flight_recorder_size
+        else:
+            self._flight_recorder_size = \
+                int(os.environ.get('MFLOG_FLIGHT_RECORDER_SIZE', '0'))
+        if flight_recorder_scope is not None:
+            self._flight_recorder_scope = flight_recorder_scope
+        else:
+            self._flight_recorder_scope = \
+                os.environ.get('MFLOG_FLIGHT_RECORDER_SCOPE', 'process')
+        if self._flight_recorder_scope not in ('process', 'context'):
+            raise Exception("unknown flight_recorder_scope: %s => must be "
+                            "process or context" %
+                            self._flight_recorder_scope)
+        if json_event_template is not None:
+            self._json_event_template = json_event_template
+        else:
+            self._json_event_template = \
+                (os.environ.get('MFLOG_JSON_EVENT_TEMPLATE', '0') == '1')
+        if json_transport is not None:
+            self._json_transport = json_transport
+        else:
+            self._json_transport = \
+                os.environ.get('MFLOG_JSON_TRANSPORT', 'lock')
+        if self._json_transport not in ('lock', 'append', 'shm'):
+            raise Exception("unknown json_transport: %s => must be lock, "
+                            "append or shm" % self._json_transport)
+        if shm_dir is not None:
+            self._shm_dir = shm_dir
+        else:
+            self._shm_dir = os.environ.get('MFLOG_SHM_DIR', '/dev/shm/mflog')
+        if shm_slot_size is not None:
+            self._shm_slot_size = shm_slot_size
+        else:
+            self._shm_slot_size = \
+                int(os.environ.get('MFLOG_SHM_SLOT_SIZE', '4096'))
+        if shm_slot_count is not None:
+            self._shm_slot_count = shm_slot_count
+        else:
+            self._shm_slot_count = \
+                int(os.environ.get('MFLOG_SHM_SLOT_COUNT', '1024'))
+        if gelf_address is not None:
+            tmpgelf = gelf_address
+        else:
+            tmpgelf = os.environ.get("MFLOG_GELF_ADDRESS", None)
+            if tmpgelf == "null":
+                tmpgelf = None
+        if isinstance(tmpgelf, six.string_types):
+            tmpgelf2 = tmpgelf.split(':')
+            if len(tmpgelf2) == 1:
+                self._gelf_address = (tmpgelf2[0], 12201)
+            elif len(tmpgelf2) == 2:
+                self._gelf_address = (tmpgelf2[0], int(tmpgelf2[1]))
+            else:
+                raise Exception("wrong gelf_address type: %s" % tmpgelf)
+        else:
+            self._gelf_address = tmpgelf
+        if gelf_minimal_level is not None:
+            self._gelf_minimal_level = gelf_minimal_level
+        else:
+            self._gelf_minimal_level = \
+                os.environ.get('MFLOG_GELF_MINIMAL_LEVEL', 'WARNING')
+        if gelf_compression is not None:
+            self._gelf_compression = gelf_compression
+        else:
+            self._gelf_compression = \
+                os.environ.get('MFLOG_GELF_COMPRESSION', 'zlib')
+        if self._gelf_compression not in ('zlib', 'gzip', 'none'):
+            raise Exception("unknown gelf_compression: %s => must be zlib, "
+                            "gzip or none" % self._gelf_compression)
+        if gelf_chunk_size is not None:
+            self._gelf_chunk_size = gelf_chunk_size
+        else:
+            self._gelf_chunk_size = \
+                int(os.environ.get('MFLOG_GELF_CHUNK_SIZE', '8154'))
+        if console_buffer_size is not None:
+            self._console_buffer_size = console_buffer_size
+        else:
+            self._console_buffer_size = \
+                int(os.environ.get('MFLOG_CONSOLE_BUFFER_SIZE', '0'))
+        if console_flush_interval is not None:
+            self._console_flush_interval = console_flush_interval
+        else:
+            self._console_flush_interval = \
+                float(os.environ.get('MFLOG_CONSOLE_FLUSH_INTERVAL', '1'))
+        if json_durability is not None:
+            self._json_durability = json_durability
+        else:
+            self._json_durability = \
+                os.environ.get('MFLOG_JSON_DURABILITY', 'none')
+        if self._json_durability not in ('none', 'interval', 'group'):
+            raise Exception("unknown json_durability: %s => must be none, "
+                            "interval or group" % self._json_durability)
+        if json_fsync_interval is not None:
+            self._json_fsync_interval = json_fsync_interval
+        else:
+            self._json_fsync_interval = \
+                float(os.environ.get('MFLOG_JSON_FSYNC_INTERVAL', '1'))
+        if json_sync_level is not None:
+            self._json_sync_level = json_sync_level
+        else:
+            self._json_sync_level = \
+                os.environ.get('MFLOG_JSON_SYNC_LEVEL', None)
+            if self._json_sync_level == "null":
+                self._json_sync_level = None
+        if self._json_sync_level is not None:
+            # just to raise an exception here if the level is incorrect
+            level_name_to_level_no(self._json_sync_level)
+        if max_field_size is not None:
+            self._max_field_size = max_field_size
+        else:
+            self._max_field_size = \
+                int(os.environ.get('MFLOG_MAX_FIELD_SIZE', '0'))
+        if max_event_size is not None:
+            self._max_event_size = max_event_size
+        else:
+            self._max_event_size = \
+                int(os.environ.get('MFLOG_MAX_EVENT_SIZE', '0'))
+        if json_max_event_size is not None:
+            self._json_max_event_size = json_max_event_size
+        else:
+            self._json_max_event_size = \
+                int(os.environ.get('MFLOG_JSON_MAX_EVENT_SIZE', '0'))
+        if syslog_max_event_size is not None:
+            self._syslog_max_event_size = syslog_max_event_size
+        else:
+            self._syslog_max_event_size = \
+                int(os.environ.get('MFLOG_SYSLOG_MAX_EVENT_SIZE', '0'))
+        if volume_profile is not None:
+            self._volume_profile = volume_profile
+        else:
+            self._volume_profile = \
+                (os.environ.get('MFLOG_VOLUME_PROFILE', '0') == '1')
+        if volume_profile_capacity is not None:
+            self._volume_profile_capacity = volume_profile_capacity
+        else:
+            self._volume_profile_capacity = \
+                int(os.environ.get('MFLOG_VOLUME_PROFILE_CAPACITY', '1000'))
+        if callsite is not None:
+            self._callsite = callsite
+        else:
+            self._callsite = \
+                (os.environ.get('MFLOG_CALLSITE', '0') == '1')
+        if journald_socket is not None:
+            self._journald_socket = journald_socket
+        else:
+            self._journald_socket = \
+                os.environ.get('MFLOG_JOURNALD_SOCKET', None)
+            if self._journald_socket == "null":
+                self._journald_socket = None
+        if journald_minimal_level is not None:
+            self._journald_minimal_level = journald_minimal_level
+        else:
+            self._journald_minimal_level = \
+                os.environ.get('MFLOG_JOURNALD_MINIMAL_LEVEL', 'WARNING')
 
     @classmethod
     def get_instance(cls):
@@ -196,10 +508,162 @@ class Config(object):
     def auto_dump_locals(cls):  # pylint: disable=E0213
         return cls.get_instance()._auto_dump_locals
 
+    @classproperty
+    def aio_queue_size(cls):  # pylint: disable=E0213
+        return cls.get_instance()._aio_queue_size
+
+    @classproperty
+    def exception_dedup_window(cls):  # pylint: disable=E0213
+        return cls.get_instance()._exception_dedup_window
+
+    @classproperty
+    def dump_locals_target(cls):  # pylint: disable=E0213
+        return cls.get_instance()._dump_locals_target
+
+    @classproperty
+    def dump_locals_max_value_size(cls):  # pylint: disable=E0213
+        return cls.get_instance()._dump_locals_max_value_size
+
+    @classproperty
+    def dump_locals_max_total_size(cls):  # pylint: disable=E0213
+        return cls.get_instance()._dump_locals_max_total_size
+
+    @classproperty
+    def dump_locals_json(cls):  # pylint: disable=E0213
+        return cls.get_instance()._dump_locals_json
+
+    @classproperty
+    def metrics_textfile(cls):  # pylint: disable=E0213
+        return cls.get_instance()._metrics_textfile
+
+    @classproperty
+    def metrics_textfile_interval(cls):  # pylint: disable=E0213
+        return cls.get_instance()._metrics_textfile_interval
+
+    @classproperty
+    def profile(cls):  # pylint: disable=E0213
+        return cls.get_instance()._profile
+
+    @classproperty
+    def profile_signal(cls):  # pylint: disable=E0213
+        return cls.get_instance()._profile_signal
+
+    @classproperty
+    def sinks(cls):  # pylint: disable=E0213
+        return cls.get_instance()._sinks
+
+    @classproperty
+    def flight_recorder_size(cls):  # pylint: disable=E0213
+        return cls.get_instance()._flight_recorder_size
+
+    @classproperty
+    def flight_recorder_scope(cls):  # pylint: disable=E0213
+        return cls.get_instance()._flight_recorder_scope
+
+    @classproperty
+    def json_event_template(cls):  # pylint: disable=E0213
+        return cls.get_instance()._json_event_template
+
+    @classproperty
+    def json_transport(cls):  # pylint: disable=E0213
+        return cls.get_instance()._json_transport
+
+    @classproperty
+    def shm_dir(cls):  # pylint: disable=E0213
+        return cls.get_instance()._shm_dir
+
+    @classproperty
+    def shm_slot_size(cls):  # pylint: disable=E0213
+        return cls.get_instance()._shm_slot_size
+
+    @classproperty
+    def shm_slot_count(cls):  # pylint: disable=E0213
+        return cls.get_instance()._shm_slot_count
+
+    @classproperty
+    def gelf_address(cls):  # pylint: disable=E0213
+        return cls.get_instance()._gelf_address
+
+    @classproperty
+    def gelf_minimal_level(cls):  # pylint: disable=E0213
+        return cls.get_instance()._gelf_minimal_level
+
+    @classproperty
+    def gelf_compression(cls):  # pylint: disable=E0213
+        return cls.get_instance()._gelf_compression
+
+    @classproperty
+    def gelf_chunk_size(cls):  # pylint: disable=E0213
+        return cls.get_instance()._gelf_chunk_size
+
+    @classproperty
+    def console_buffer_size(cls):  # pylint: disable=E0213
+        return cls.get_instance()._console_buffer_size
+
+    @classproperty
+    def console_flush_interval(cls):  # pylint: disable=E0213
+        return cls.get_instance()._console_flush_interval
+
+    @classproperty
+    def json_durability(cls):  # pylint: disable=E0213
+        return cls.get_instance()._json_durability
+
+    @classproperty
+    def json_fsync_interval(cls):  # pylint: disable=E0213
+        return cls.get_instance()._json_fsync_interval
+
+    @classproperty
+    def json_sync_level(cls):  # pylint: disable=E0213
+        return cls.get_instance()._json_sync_level
+
+    @classproperty
+    def max_field_size(cls):  # pylint: disable=E0213
+        return cls.get_instance()._max_field_size
+
+    @classproperty
+    def max_event_size(cls):  # pylint: disable=E0213
+        return cls.get_instance()._max_event_size
+
+    @classproperty
+    def json_max_event_size(cls):  # pylint: disable=E0213
+        return cls.get_instance()._json_max_event_size
+
+    @classproperty
+    def syslog_max_event_size(cls):  # pylint: disable=E0213
+        return cls.get_instance()._syslog_max_event_size
+
+    @classproperty
+    def volume_profile(cls):  # pylint: disable=E0213
+        return cls.get_instance()._volume_profile
+
+    @classproperty
+    def volume_profile_capacity(cls):  # pylint: disable=E0213
+        return cls.get_instance()._volume_profile_capacity
+
+    @classproperty
+    def callsite(cls):  # pylint: disable=E0213
+        return cls.get_instance()._callsite
+
+    @classproperty
+    def journald_socket(cls):  # pylint: disable=E0213
+        return cls.get_instance()._journald_socket
+
+    @classproperty
+    def journald_minimal_level(cls):  # pylint: disable=E0213
+        return cls.get_instance()._journald_minimal_level
+
     @classproperty
     def extra_context_func(cls):  # pylint: disable=E0213
         return cls.get_instance()._extra_context_func
 
+    @classproperty
+    def extra_context_ttl(cls):  # pylint: disable=E0213
+        return cls.get_instance()._extra_context_ttl
+
+    @classproperty
+    def extra_context_static(cls):  # pylint: disable=E0213
+        return cls.get_instance()._extra_context_static
+
     @classproperty
     def json_minimal_level(cls):  # pylint: disable=E0213
         return cls.get_instance()._json_minimal_level
@@ -315,20 +779,132 @@ def _get_override_lines(path):
 def get_extra_context():
     """Return an extra context by calling an external configured python func.
 
+    Note: if the extra context func is declared as static (or if a ttl is
+    configured), the result is cached (in memory). The returned dict
+    is then shared between calls, so it must not be modified.
+
     Returns:
         (dict) A dict of extra context key/values as strings.
 
     """
+    global EXTRA_CONTEXT_CACHE
     extra_context_f = Config.extra_context_func
     if extra_context_f is None:
         return {}
+    cache = EXTRA_CONTEXT_CACHE
+    if cache is not None and time.monotonic() < cache[0]:
+        return cache[1]
     extra_context = extra_context_f()  # pylint: disable=E1120
     if not isinstance(extra_context, dict):
         print("bad extra_context (not a dict) => ignoring", file=sys.stderr)
         return {}
+    if Config.extra_context_static:
+        EXTRA_CONTEXT_CACHE = (float("inf"), extra_context)
+    elif Config.extra_context_ttl > 0:
+        EXTRA_CONTEXT_CACHE = \
+            (time.monotonic() + Config.extra_context_ttl, extra_context)
     return extra_context
 
 
+def _exception_key(exc_value, exc_type, tb, seen):
+    frames = []
+    while tb is not None:
+        frames.append((tb.tb_frame.f_code.co_filename, tb.tb_lineno))
+        tb = tb.tb_next
+    chained = None
+    if exc_value is not None:
+        seen.add(id(exc_value))
+        if exc_value.__cause__ is not None:
+            chained = exc_value.__cause__
+        elif exc_value.__context__ is not None and \
+                not exc_value.__suppress_context__:
+            chained = exc_value.__context__
+    if chained is not None and id(chained) not in seen:
+        chained_key = _exception_key(chained, type(chained),
+                                     chained.__traceback__, seen)
+    else:
+        chained_key = None
+    return (exc_type.__module__, exc_type.__qualname__, tuple(frames),
+            chained_key)
+
+
+def _format_exception_only(exc_type, exc_value):
+    return "".join(traceback.format_exception_only(exc_type,
+                                                   exc_value)).rstrip("\n")
+
+
+def get_exception_fingerprint(exc_info):
+    """Return a fingerprint and a formatted traceback for an exception.
+
+    The fingerprint is computed from the exception type and from the
+    (file, line) frame chain (chained exceptions included). So the same
+    exception raised at the same place gets the same fingerprint (even
+    with a different message).
+
+    Note: the frames part of the formatted traceback is cached (in memory)
+    by fingerprint, only the (cheap) last exception line is formatted for
+    each call.
+
+    Args:
+        exc_info (tuple): A (type, value, traceback) tuple.
+
+    Returns:
+        (couple) A (fingerprint, formatted traceback) tuple.
+
+    """
+    exc_type, exc_value, tb = exc_info
+    key = _exception_key(exc_value, exc_type, tb, set())
+    try:
+        fingerprint, frames = EXCEPTION_CACHE[key]
+    except KeyError:
+        fingerprint = hashlib.sha1(repr(key).encode("utf-8")).hexdigest()[:16]
+        if key[3] is None and tb is not None and \
+                not hasattr(exc_value, "exceptions"):
+            frames = "Traceback (most recent call last):\n" + \
+                "".join(traceback.format_tb(tb))
+        else:
+            # chained exceptions or exception groups: no cache for the
+            # formatted traceback
+            frames = None
+        if len(EXCEPTION_CACHE) >= EXCEPTION_CACHE_MAX_SIZE:
+            EXCEPTION_CACHE.clear()
+        EXCEPTION_CACHE[key] = (fingerprint, frames)
+    if frames is None:
+        formatted = "".join(traceback.format_exception(exc_type, exc_value,
+                                                       tb)).rstrip("\n")
+    else:
+        formatted = frames + _format_exception_only(exc_type, exc_value)
+    return (fingerprint, formatted)
+
+
+def is_exception_traceback_already_logged(fingerprint):
+    """Return True if a full traceback was logged for this fingerprint.
+
+    Note: this is only relevant if the exception_dedup_window option is
+    set. Within the window (in seconds) after the full traceback
+    logging, the function returns True. Then, it returns False again
+    (and the window starts again).
+
+    Args:
+        fingerprint (string): An exception fingerprint.
+
+    Returns:
+        (boolean) True if we can avoid to log the full traceback.
+
+    """
+    window = Config.exception_dedup_window
+    if window <= 0:
+        return False
+    now = time.monotonic()
+    last = EXCEPTION_LAST_FULL_TRACEBACK.get(fingerprint)
+    if last is not None and now - last < window:
+        return True
+    if len(EXCEPTION_LAST_FULL_TRACEBACK) >= EXCEPTION_CACHE_MAX_SIZE:
+        EXCEPTION_LAST_FULL_TRACEBACK.clear()
+    EXCEPTION_LAST_FULL_TRACEBACK[fingerprint] = now
+    return False
+
+
 def get_level_no_from_logger_name(logger_name):
     """Get the level number to use for the given logger name.
 
@@ -375,6 +951,63 @@ def get_level_no_from_logger_name(logger_name):
     return LEVEL_FROM_LOGGER_NAME_CACHE[logger_name]
 
 
+def _get_override_items():
+    # pylint: disable=no-member
+    items = list(Config.override_dict.items())
+    for path in Config.override_files:  # pylint: disable=E1133
+        items.extend(_get_override_lines(path))
+    return items
+
+
+def get_lowest_level_no():
+    """Get the lowest level number of the configuration.
+
+    This is the minimum of the default minimal level and of all
+    levels of overrides (override_dict and override_files).
+
+    Returns:
+        (int) The lowest level number.
+
+    """
+    levels = [level_name_to_level_no(v) for _, v in _get_override_items()]
+    levels.append(level_name_to_level_no(Config.minimal_level))
+    return min(levels)
+
+
+def _could_match_a_child(pattern, logger_name):
+    child_prefix = logger_name + "."
+    for i, c in enumerate(pattern):
+        if c in "*?[":
+            literal_prefix = pattern[0:i]
+            return literal_prefix.startswith(child_prefix) or \
+                child_prefix.startswith(literal_prefix)
+    return pattern.startswith(child_prefix)
+
+
+def get_standard_logger_level_no(logger_name):
+    """Get the level number to set on a standard logging logger.
+
+    The returned level is the level of the logger name (see
+    get_level_no_from_logger_name()) but lowered if an override
+    could match a child logger (because child loggers with a NOTSET
+    level inherit the level of their parent).
+
+    Args:
+        logger_name (string): The logger name ("root" for the root logger).
+
+    Returns:
+        (int) The level number to set on this logger.
+
+    """
+    if logger_name == "root":
+        return get_lowest_level_no()
+    level = get_level_no_from_logger_name(logger_name)
+    for pattern, level_name in _get_override_items():
+        if _could_match_a_child(pattern, logger_name):
+            level = min(level, level_name_to_level_no(level_name))
+    return level
+
+
 def get_resolved_fancy_output_config_value(f=sys.stderr):
     fancy = Config.fancy_output
     if fancy is None:
@@ -385,27 +1018,340 @@ def get_resolved_fancy_output_config_value(f=sys.stderr):
     return fancy
 
 
-def dump_locals(f=sys.stderr):
+def _is_mflog_internal_frame(frame):
+    module = frame.f_globals.get("__name__", "")
+    return module.split('.')[0] in ("mflog", "structlog", "logging")
+
+
+def get_target_frame(target=None, tb=None):
+    """Return the frame to use for a locals dump.
+
+    Args:
+        target (string): outermost (the outermost frame of the current
+            stack), caller (the first frame outside mflog, structlog and
+            logging) or exception (the innermost frame of the given
+            traceback or of the exception being handled, fallback to
+            caller). If None, the dump_locals_target configuration value
+            is used.
+        tb: A traceback object (if given, its innermost frame is always
+            returned whatever the target).
+
+    Returns:
+        A frame object (or None).
+
+    """
+    if target is None:
+        target = Config.dump_locals_target
+    if tb is not None or target == "exception":
+        if tb is None:
+            tb = sys.exc_info()[2]
+        if tb is not None:
+            while tb.tb_next is not None:
+                tb = tb.tb_next
+            return tb.tb_frame
+        target = "caller"
+    frame = sys._getframe(1)
+    if target == "caller":
+        while frame is not None and _is_mflog_internal_frame(frame):
+            frame = frame.f_back
+        return frame
+    while frame.f_back is not None:
+        frame = frame.f_back
+    return frame
+
+
+class _BoundedRepr(reprlib.Repr):
+    """A reprlib.Repr which slices strings and bytes before rendering them.
+
+    Other objects are rendered with their own repr() (cut to maxother
+    characters, see reprlib).
+
+    """
+
+    def repr_bytes(self, x, level):
+        if len(x) <= self.maxstring:
+            return builtins.repr(x)
+        return builtins.repr(bytes(x[0:self.maxstring])) + "..."
+
+    repr_bytearray = repr_bytes
+
+    def repr_instance(self, x, level):
+        if isinstance(x, str):
+            return self.repr_str(str(x[0:self.maxstring + 1]), level)
+        if isinstance(x, (bytes, bytearray)):
+            return self.repr_bytes(x, level)
+        return reprlib.Repr.repr_instance(self, x, level)
+
+
+def get_locals_map(frame, max_value_size=None, max_total_size=None):
+    """Return a bounded repr of the locals variables of the given frame.
+
+    Values are rendered with reprlib (so huge containers, strings or
+    bytes are never fully rendered) and truncated to max_value_size
+    characters. When the total size reaches max_total_size, other values
+    are hidden.
+
+    Args:
+        frame: A frame object.
+        max_value_size (int): The maximum size of a value repr (if None,
+            the dump_locals_max_value_size configuration value is used).
+        max_total_size (int): The maximum size of the whole dump (if None,
+            the dump_locals_max_total_size configuration value is used).
+
+    Returns:
+        (dict) A dict variable name => (bounded) repr of the value.
+
+    """
+    if max_value_size is None:
+        max_value_size = Config.dump_locals_max_value_size
+    if max_total_size is None:
+        max_total_size = Config.dump_locals_max_total_size
+    r = _BoundedRepr()
+    r.maxstring = r.maxother = r.maxlong = max_value_size
+    r.maxlevel = 3
+    r.maxtuple = r.maxlist = r.maxarray = r.maxdict = r.maxset = \
+        r.maxfrozenset = r.maxdeque = 20
+    total = 0
+    locals_map = {}
+    for key, value in frame.f_locals.items():
+        if key.startswith("__"):
+            continue
+        if total >= max_total_size:
+            locals_map[key] = "(hidden => total dump size limit reached)"
+            continue
+        try:
+            tmp = r.repr(value)
+        except Exception:
+            tmp = "(can't get a repr of this value)"
+        if len(tmp) > max_value_size:
+            tmp = tmp[0:max_value_size] + "..."
+        total += len(tmp)
+        locals_map[key] = tmp
+    return locals_map
+
+
+def dump_locals(f=sys.stderr, target=None):
+    """Dump locals variables of a frame on the given file.
+
+    Args:
+        f: A file object.
+        target (string): see get_target_frame().
+
+    Returns:
+        (boolean) True if the dump was ok.
+
+    """
     fancy = get_resolved_fancy_output_config_value(f=f)
-    stack_offset = -1
     try:
-        caller = inspect.stack()[stack_offset]
-        locals_map = {
-            key: value
-            for key, value in caller.frame.f_locals.items()
-            if not key.startswith("__")
-        }
-        for k, v in locals_map.items():
-            if len(repr(v)) > 10000:
-                locals_map[k] = \
-                    "(too big value => hidden in this variables dump)"
+        frame = get_target_frame(target)
+        locals_map = get_locals_map(frame)
+        del frame
         if fancy:
-            c = Console(file=sys.stderr)
-            c.print(tabulate_mapping(locals_map, title="Locals"))
+            table = Table(title="Locals", show_header=False)
+            table.add_column(style="repr.attrib_name")
+            table.add_column()
+            for k, v in locals_map.items():
+                table.add_row(k, v)
+            c = Console(file=f, highlight=False, emoji=False, markup=False)
+            c.print(table)
         else:
             print("Locals dump", file=f)
             for k, v in locals_map.items():
-                print("%s: %r" % (k, v))
+                print("%s: %s" % (k, v), file=f)
     except Exception:
         return False
     return True
+
+
+def format_event(template, args):
+    """Format the event template with positional arguments (like logging).
+
+    Note: as in the standard logging library, a single dict argument is
+    used as a mapping.
+
+    """
+    if not args:
+        return template
+    if len(args) == 1 and isinstance(args[0], dict) and args[0]:
+        args = args[0]
+    return template % args
+
+
+def estimate_size(value, budget):
+    """Estimate the serialized size of a value (without rendering it).
+
+    The walk stops as soon as the estimation is greater than budget (so
+    the cost is bounded even for huge values).
+
+    Args:
+        value: The value to estimate.
+        budget (int): The size over which the estimation can stop.
+
+    Returns:
+        (int) The estimated size (maybe partial but greater than budget
+        in this case).
+
+    """
+    if isinstance(value, (str, bytes, bytearray)):
+        return len(value) + 2
+    if value is None or isinstance(value, (bool, int, float)):
+        return 8
+    if isinstance(value, (list, tuple, set, frozenset)):
+        size = 2
+        for item in value:
+            size += estimate_size(item, budget - size) + 2
+            if size > budget:
+                break
+        return size
+    if isinstance(value, dict):
+        size = 2
+        for k, v in value.items():
+            size += estimate_size(k, budget - size) + \
+                estimate_size(v, budget - size) + 4
+            if size > budget:
+                break
+        return size
+    # unknown object => it will be rendered with repr()
+    return 64
+
+
+def truncate_value(value, max_size):
+    """Truncate a value (if needed) to about max_size characters.
+
+    Strings and bytes are sliced, other values (collections, objects...)
+    bigger than max_size are replaced by a bounded repr. A marker with the
+    original length is added to truncated values.
+
+    Returns:
+        A (value, truncated) tuple.
+
+    """
+    if isinstance(value, str):
+        if len(value) <= max_size:
+            return (value, False)
+        return ("%s...[truncated, original length: %i]" %
+                (value[0:max_size], len(value)), True)
+    if isinstance(value, (bytes, bytearray)):
+        if len(value) <= max_size:
+            return (value, False)
+        return ("%s...[truncated, original length: %i]" %
+                (bytes(value[0:max_size]).decode("utf8", "replace"),
+                 len(value)), True)
+    if value is None or isinstance(value, (bool, int, float)) or \
+            estimate_size(value, max_size) <= max_size:
+        return (value, False)
+    r = reprlib.Repr()
+    r.maxstring = r.maxother = r.maxlong = max_size
+    r.maxlevel = 3
+    r.maxtuple = r.maxlist = r.maxarray = r.maxdict = r.maxset = \
+        r.maxfrozenset = r.maxdeque = 20
+    try:
+        tmp = r.repr(value)[0:max_size]
+    except Exception:
+        tmp = "(can't get a repr of this value)"
+    try:
+        return ("%s...[truncated, original length: %i]" % (tmp, len(value)),
+                True)
+    except Exception:
+        return ("%s...[truncated]" % tmp, True)
+
+
+# keys never truncated (with internal _mflog_* keys)
+TRUNCATE_SKIPPED_KEYS = frozenset(["level", "timestamp", "name", "pid"])
+# keys only truncated by the max_event_size limit
+TRUNCATE_FIELD_SKIPPED_KEYS = frozenset(["exception"])
+
+
+def _is_truncate_skipped(key):
+    return key in TRUNCATE_SKIPPED_KEYS or \
+        (isinstance(key, str) and key.startswith("_mflog_"))
+
+
+def _format_positional_args(event_dict):
+    """Format the event with its positional arguments (in place).
+
+    So the formatted message can be truncated (a truncated template or
+    argument can't be formatted anymore).
+
+    Returns:
+        (boolean) False if the formatting failed (then the event and its
+        arguments must not be truncated).
+
+    """
+    args = event_dict.get("positional_args")
+    if not args:
+        return True
+    try:
+        event_dict["event"] = format_event(event_dict.get("event"), args)
+    except Exception:
+        return False
+    del event_dict["positional_args"]
+    return True
+
+
+# types of positional arguments which can be formatted later
+_IMMUTABLE_ARG_TYPES = (str, bytes, int, float, bool, type(None))
+
+
+def freeze_positional_args(event_dict):
+    """Format the event now (in place) if an argument is mutable.
+
+    To be called for events formatted later (arguments can be modified
+    after the logging call). Events with immutable arguments only are
+    still formatted lazily.
+
+    """
+    args = event_dict.get("positional_args")
+    if args and not all(isinstance(x, _IMMUTABLE_ARG_TYPES) for x in args):
+        _format_positional_args(event_dict)
+    return event_dict
+
+
+def truncate_event_dict(event_dict, max_field_size=0, max_event_size=0):
+    """Truncate (in place) huge values of an event dict.
+
+    Args:
+        event_dict (dict): The event dict to truncate.
+        max_field_size (int): The maximum size of a single value (0 means
+            no limit).
+        max_event_size (int): The maximum (estimated) size of the whole
+            event (0 means no limit). When reached, biggest values are
+            truncated to an equal share of this size.
+
+    Returns:
+        (dict) The event dict.
+
+    """
+    not_truncated = ()
+    if max_field_size > 0:
+        if event_dict.get("positional_args") and \
+                (estimate_size(event_dict.get("event"), max_field_size) >
+                 max_field_size or
+                 any(estimate_size(x, max_field_size) > max_field_size
+                     for x in event_dict["positional_args"])):
+            if not _format_positional_args(event_dict):
+                not_truncated = ("event", "positional_args")
+        for k, v in list(event_dict.items()):
+            if _is_truncate_skipped(k) or \
+                    k in TRUNCATE_FIELD_SKIPPED_KEYS or k in not_truncated:
+                continue
+            event_dict[k] = truncate_value(v, max_field_size)[0]
+    if max_event_size > 0:
+        sizes = {k: estimate_size(v, max_event_size)
+                 for k, v in event_dict.items()
+                 if not _is_truncate_skipped(k)}
+        if sum(sizes.values()) <= max_event_size:
+            return event_dict
+        if "positional_args" in sizes and not not_truncated:
+            if _format_positional_args(event_dict):
+                del sizes["positional_args"]
+                sizes["event"] = estimate_size(event_dict["event"],
+                                               max_event_size)
+            else:
+                not_truncated = ("event", "positional_args")
+        share = max(max_event_size // max(len(sizes), 1), 16)
+        for k, size in sizes.items():
+            if size <= share or k in not_truncated:
+                continue
+            event_dict[k] = truncate_value(event_dict[k], share)[0]
+    return event_dict
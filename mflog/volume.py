@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+
+"""Opt-in log volume profiler.
+
+When enabled (with set_config(volume_profile=True) or with
+MFLOG_VOLUME_PROFILE=1 env var), emitted events and serialized sizes are
+attributed (per sink) to (logger name, level, event template) keys. Keys
+are counted with the (approximate) Space-Saving algorithm so memory is
+bounded (see volume_profile_capacity option).
+
+Without the positional arguments of the logging call, the event template
+is the message with numbers replaced by N (truncated to 200 characters).
+
+The report is dumped on stderr at exit (and on the profile_signal signal
+if configured), see also get_report().
+
+"""
+
+import os
+import re
+import threading
+from mflog.spacesaving import SpaceSaving
+from mflog.profiling import install_report, register_report
+
+# set by configure() (module global to keep the fast path cheap)
+ENABLED = False
+CAPACITY = 1000
+
+# sink name => [events, bytes, SpaceSaving (events), SpaceSaving (bytes)]
+VOLUME = {}
+
+DIGITS = re.compile(r"\d+")
+# (events and bytes counters are updated from several threads)
+_LOCK = threading.Lock()
+
+
+def configure(enabled, capacity=1000, signal_name=None):
+    """Configure (and reset) the volume profiler.
+
+    Args:
+        enabled (boolean): Enable the volume profiler.
+        capacity (int): Maximum number of counted keys (per sink).
+        signal_name (string): A signal name (SIGUSR2 for example) to dump
+            the report on (or None).
+
+    """
+    global ENABLED, CAPACITY
+    ENABLED = enabled
+    CAPACITY = capacity
+    reset_volume()
+    if enabled:
+        register_report(_get_report_if_any)
+        install_report(signal_name)
+
+
+def reset_volume():
+    VOLUME.clear()
+
+
+def get_key(record):
+    """Return the (logger name, level, event template) key of a record."""
+    try:
+        return record._cache["volume_key"]
+    except KeyError:
+        pass
+    template = record.event_template
+    if record.args:
+        template = str(template)
+    else:
+        template = DIGITS.sub("N", str(template)[0:200])
+    key = (record.name, record.level, template)
+    record._cache["volume_key"] = key
+    return key
+
+
+def record(sink_name, event, size):
+    """Attribute an emitted event record (of the given size) to its key."""
+    try:
+        tmp = VOLUME[sink_name]
+    except KeyError:
+        tmp = VOLUME.setdefault(sink_name, [0, 0, SpaceSaving(CAPACITY),
+                                            SpaceSaving(CAPACITY)])
+    key = get_key(event)
+    size = size or 0
+    with _LOCK:
+        tmp[0] += 1
+        tmp[1] += size
+    tmp[2].add(key)
+    tmp[3].add(key, size)
+
+
+def get_volume(top=10):
+    """Return volume statistics (as a dict).
+
+    Returns:
+        (dict) sink name => dict with events, bytes, top_events and
+        top_bytes keys (top lists of dicts with name, level, template,
+        count and error keys).
+
+    """
+    res = {}
+    for sink_name, (events, size, top_events, top_bytes) in VOLUME.items():
+        res[sink_name] = {
+            "events": events,
+            "bytes": size,
+            "top_events": [{"name": k[0], "level": k[1], "template": k[2],
+                            "count": count, "error": error}
+                           for k, count, error in top_events.top(top)],
+            "top_bytes": [{"name": k[0], "level": k[1], "template": k[2],
+                           "count": count, "error": error}
+                          for k, count, error in top_bytes.top(top)]
+        }
+    return res
+
+
+def _format_top(lines, title, total, items):
+    lines.append("    %s:" % title)
+    for (name, level, template), count, error in items:
+        approx = "" if error == 0 else " (+/- %i)" % error
+        percent = count * 100.0 / total if total > 0 else 0.0
+        lines.append("        %12i %5.1f%%  %-30s %-9s %s%s" %
+                     (count, percent, name, level, template[0:60], approx))
+
+
+def get_report(top=10):
+    """Return a volume report (as a string)."""
+    lines = ["mflog volume report (pid: %i)" % os.getpid()]
+    for sink_name in sorted(VOLUME.keys()):
+        events, size, top_events, top_bytes = VOLUME[sink_name]
+        lines.append("")
+        lines.append("sink %s: %i events, %i bytes" %
+                     (sink_name, events, size))
+        _format_top(lines, "top bytes", size, top_bytes.top(top))
+        _format_top(lines, "top events", events, top_events.top(top))
+    return "\n".join(lines)
+
+
+def _get_report_if_any():
+    if len(VOLUME) == 0:
+        return None
+    return get_report()
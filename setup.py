@@ -16,7 +16,7 @@ setup(
     name='mflog',
     version="0.0.0",
     license="BSD 3",
-    python_requires='>=2.7',
+    python_requires='>=3.8',
     url="https://github.com/metwork-framework/mflog",
     description="opinionated python (structured) logging library "
     "built on structlog",
@@ -27,6 +27,9 @@ setup(
     entry_points={
         "console_scripts": [
             "log = mflog.log:main",
+            "mflog_shm_writer = mflog.shm_writer:main",
+            "mflog2human = mflog.convert:main",
+            "mflog_stats = mflog.aggregate:main",
         ]
     }
 )
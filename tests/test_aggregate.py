@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+
+import gzip
+import json
+import force_unittests_mode  # noqa: F401
+from mflog.aggregate import aggregate_files, get_event_template
+
+
+def _get_lines(n=300):
+    for i in range(n):
+        event_dict = {
+            "timestamp": "2021-05-10T%02i:00:00.000000Z" % (i % 3),
+            "level": "error" if i % 3 == 0 else "info",
+            "name": "foo.bar%i" % (i % 2), "pid": 123,
+            "event": "message %i" % i}
+        if i % 3 == 0:
+            event_dict["exception_type"] = "ValueError"
+            event_dict["exception_file"] = "/foo.py"
+        yield json.dumps(event_dict) + "\n"
+
+
+def test_event_template():
+    assert get_event_template({"event": "foo 123 bar 4"}) == "foo N bar N"
+    assert get_event_template({"event_template": "foo %i",
+                               "args": [1]}) == "foo %i"
+
+
+def test_aggregate_files(tmp_path):
+    path1 = str(tmp_path / "log.json")
+    path2 = str(tmp_path / "log.json.gz")
+    with open(path1, "w") as f:
+        f.write("".join(_get_lines()))
+        f.write("not json\n")
+    with gzip.open(path2, "wt") as f:
+        f.write("".join(_get_lines()))
+    res1 = aggregate_files([path1, path2], jobs=1)
+    res2 = aggregate_files([path1, path2], jobs=2, chunk_size=1000)
+    assert res1.as_dict() == res2.as_dict()
+    tmp = res1.as_dict()
+    assert tmp["lines"] == 600
+    assert tmp["invalid_lines"] == 1
+    assert tmp["levels"] == {"error": 200, "info": 400}
+    assert tmp["top"]["exception_type"] == \
+        [{"key": "ValueError", "count": 200, "error": 0}]
+    assert tmp["top"]["event_template"] == \
+        [{"key": "message N", "count": 600, "error": 0}]
+    assert tmp["histogram"]["2021-05-10T00"] == {"error": 200}
+    assert "foo.bar0" in res1.get_report()
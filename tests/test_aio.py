@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+import threading
+import force_unittests_mode  # noqa: F401
+import mflog.aio
+from mflog import MFLogLogger
+from mflog import UNIT_TESTS_STDOUT, UNIT_TESTS_JSON
+from mflog.unittests import reset_unittests
+
+
+def test_aio_logger(monkeypatch):
+    reset_unittests()
+    written = []
+
+    def fake_write(self, records):
+        for event, sinks in records:
+            written.append((threading.current_thread().name, event.event))
+
+    monkeypatch.setattr(MFLogLogger, "_write", fake_write)
+
+    async def main():
+        log = mflog.aio.get_logger("foo.bar")
+        log.info("foo%s", "bar")
+        log.debug("ignored")
+        log.warning("baz", k1=1)
+        await mflog.aio.flush()
+        assert written == [("mflog-aio", "foobar"), ("mflog-aio", "baz")]
+        await mflog.aio.aclose()
+
+    asyncio.run(main())
+
+
+def test_aio_mutable_arguments():
+    reset_unittests()
+
+    async def main():
+        log = mflog.aio.get_logger("foo.bar")
+        args = [1]
+        kwargs = {"k": [1]}
+        log.info("foo %s", args)
+        log.warning("bar %s", args, data=kwargs)
+        # modified after the call
+        args.append(2)
+        kwargs["k"].append(2)
+        await mflog.aio.flush()
+        assert UNIT_TESTS_STDOUT[0].endswith("foo [1]\n")
+        assert '"event": "bar [1]"' in UNIT_TESTS_JSON[0]
+        assert '"data": {"k": [1]}' in UNIT_TESTS_JSON[0]
+        await mflog.aio.aclose()
+
+    asyncio.run(main())
+    reset_unittests()
+
+
+def test_aio_queue_full(monkeypatch):
+    reset_unittests()
+    block = threading.Event()
+    monkeypatch.setattr(MFLogLogger, "_write",
+                        lambda *args, **kwargs: block.wait())
+    writer = mflog.aio._QueueWriter(1)
+    for i in range(5):
+        writer.put((None, []))
+    # at most one item is consumed, one item is in the queue
+    assert writer.dropped >= 3
+    writer.dropped = 0
+    block.set()
+    writer.stop()
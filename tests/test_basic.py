@@ -2,12 +2,15 @@
 
 import pytest
 import sys
+import time
 import os
 import force_unittests_mode  # noqa: F401
 import json
-from mflog import get_logger, set_config, add_override
+from mflog import get_logger, set_config, add_override, \
+    invalidate_extra_context_cache
 from mflog import UNIT_TESTS_STDOUT, UNIT_TESTS_STDERR, UNIT_TESTS_JSON
 from mflog.unittests import reset_unittests, extra_context
+from mflog.utils import get_extra_context
 import logging
 
 
@@ -333,3 +336,96 @@ def test_is_enabled_for():
     assert x.isEnabledFor(40)
     assert x.getEffectiveLevel() == 20
     reset_unittests()
+
+
+def test_extra_context_static():
+    reset_unittests()
+    calls = []
+
+    def f():
+        calls.append(1)
+        return {"k": "v"}
+
+    set_config(extra_context_func=f, extra_context_static=True)
+    assert get_extra_context() == {"k": "v"}
+    assert get_extra_context() is get_extra_context()
+    assert len(calls) == 1
+    invalidate_extra_context_cache()
+    get_extra_context()
+    assert len(calls) == 2
+
+
+def test_extra_context_ttl():
+    reset_unittests()
+    calls = []
+
+    def f():
+        calls.append(1)
+        return {"k": "v"}
+
+    set_config(extra_context_func=f, extra_context_ttl=3600)
+    get_extra_context()
+    get_extra_context()
+    assert len(calls) == 1
+    values = []
+    set_config(extra_context_func=lambda: {"k": len(values)},
+               extra_context_ttl=0.05)
+    values.append(1)
+    assert get_extra_context() == {"k": 1}
+    values.append(1)
+    assert get_extra_context() == {"k": 1}
+    time.sleep(0.1)
+    # refreshed after the expiration
+    assert get_extra_context() == {"k": 2}
+    set_config(extra_context_func=f)
+    get_extra_context()
+    get_extra_context()
+    assert len(calls) == 3
+
+
+def test_standard_logging_levels():
+    reset_unittests()
+    lib_logger = logging.getLogger("mflog_test_lib.sub")
+    set_config(minimal_level="INFO")
+    assert not lib_logger.isEnabledFor(logging.DEBUG)
+    assert lib_logger.isEnabledFor(logging.INFO)
+    add_override("mflog_test_lib.*", "DEBUG")
+    assert lib_logger.isEnabledFor(logging.DEBUG)
+    assert logging.getLogger("mflog_test_lib").isEnabledFor(logging.DEBUG)
+    add_override("mflog_test_lib.*", None)
+    assert not lib_logger.isEnabledFor(logging.DEBUG)
+
+
+def test_standard_logging_levels_new_logger():
+    reset_unittests()
+    set_config(minimal_level="INFO", override_dict={"foo3.*": "DEBUG"})
+    # the root logger level must not filter foo3.* debug messages
+    assert logging.getLogger().level == logging.DEBUG
+    new_logger = logging.getLogger("mflog_test_new")
+    assert new_logger.level == logging.NOTSET
+    new_logger.debug("dropped")
+    assert new_logger.level == logging.INFO
+    set_config(standard_logging_redirect=False)
+    assert new_logger.level == logging.NOTSET
+    reset_unittests()
+
+
+def test_standard_logging_levels_sync_once(monkeypatch):
+    reset_unittests()
+    # foo4 debug messages pass the standard logging level (because of
+    # the override of its children) but are dropped by mflog
+    set_config(minimal_level="INFO", override_dict={"foo4.*": "DEBUG"})
+    new_logger = logging.getLogger("foo4")
+    calls = []
+    real_set_level = logging.Logger.setLevel
+
+    def set_level(self, level):
+        calls.append(level)
+        real_set_level(self, level)
+
+    monkeypatch.setattr(logging.Logger, "setLevel", set_level)
+    for i in range(0, 100):
+        new_logger.debug("dropped")
+    assert len(calls) <= 1
+    assert len(UNIT_TESTS_STDOUT) == 0
+    reset_unittests()
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+
+import json
+import force_unittests_mode  # noqa: F401
+import mflog
+from mflog import get_logger, set_config
+from mflog import UNIT_TESTS_STDOUT, UNIT_TESTS_JSON
+from mflog.record import EventRecord, get_bound_context, BOUND_CONTEXT_KEY
+from mflog.formatters import format_plain, format_json
+from mflog.unittests import reset_unittests
+
+
+def _records(event_dict, context):
+    without = EventRecord(dict(event_dict))
+    tmp = dict(event_dict)
+    tmp[BOUND_CONTEXT_KEY] = get_bound_context(context)
+    return without, EventRecord(tmp)
+
+
+def test_get_bound_context():
+    assert get_bound_context({}) is None
+    assert get_bound_context({"foo": [1, 2]}) is None
+    assert get_bound_context({"name": "foo"}) is None
+    bound = get_bound_context({"b": 1, "a": "x"})
+    assert bound.kv == [("a", "a=x"), ("b", "b=1")]
+    assert bound.json == '"b": 1, "a": "x"'
+
+
+def test_same_output():
+    context = {"user": "bob", "request_id": 12}
+    event_dict = {"timestamp": "2021-01-01T00:00:00.000000Z",
+                  "level": "info", "name": "foo", "pid": 1,
+                  "event": "bar %s", "positional_args": ("baz",)}
+    event_dict.update(context)
+    event_dict["a"] = 1
+    event_dict["zzz"] = None
+    event_dict["exception"] = "Traceback..."
+    without, record = _records(event_dict, context)
+    assert record.split_extra()[0] is not None
+    assert format_plain(record) == format_plain(without)
+    assert format_json(record) == format_json(without)
+    set_config(json_event_template=True)
+    try:
+        assert format_json(record) == format_json(without)
+    finally:
+        set_config()
+
+
+def test_override():
+    context = {"user": "bob"}
+    event_dict = {"event": "foo", "user": "alice"}
+    without, record = _records(event_dict, context)
+    assert record.split_extra()[0] is None
+    assert format_plain(record) == format_plain(without)
+    assert json.loads(format_json(record))["user"] == "alice"
+
+
+def test_bound_logger():
+    reset_unittests()
+    x = get_logger("foo.bar").bind(user="bob", k=1)
+    x.info("foo", a=2)
+    x.info("bar", user="alice")
+    assert UNIT_TESTS_STDOUT[0].endswith("foo {a=2 k=1 user=bob}\n")
+    assert UNIT_TESTS_STDOUT[1].endswith("bar {k=1 user=alice}\n")
+    x.warning("baz", a=2)
+    tmp = json.loads(UNIT_TESTS_JSON[0])
+    assert tmp["user"] == "bob" and tmp["a"] == 2 and tmp["k"] == 1
+
+
+def test_bound_logger_reuse(monkeypatch):
+    reset_unittests()
+    calls = []
+    real = mflog.get_bound_context
+
+    def spy(context):
+        tmp = real(context)
+        calls.append(tmp)
+        return tmp
+
+    monkeypatch.setattr(mflog, "get_bound_context", spy)
+    x = get_logger("foo.reuse").bind(user="bob")
+    assert get_bound_context(x._context) is not None
+    x.warning("foo")
+    x.warning("bar")
+    assert len(calls) == 1
+    assert calls[0] is not None
+    assert calls[0].items == {"user": "bob"}
+    assert x._mflog_bound is calls[0]
+    for line in UNIT_TESTS_JSON:
+        tmp = json.loads(line)
+        assert tmp["name"] == "foo.reuse" and tmp["user"] == "bob"
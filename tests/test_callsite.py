@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+
+import json
+import logging
+import force_unittests_mode  # noqa: F401
+import mflog
+from mflog import UNIT_TESTS_JSON, UNIT_TESTS_STDERR, processors
+from mflog.unittests import reset_unittests
+
+
+def _log_here(logger):
+    logger.warning("foo")
+
+
+def test_callsite():
+    reset_unittests()
+    mflog.set_config(callsite=True)
+    _log_here(mflog.get_logger("foo.callsite"))
+    _log_here(mflog.get_logger("foo.callsite").bind(k=1))
+    for line in UNIT_TESTS_JSON:
+        tmp = json.loads(line)
+        assert tmp["callsite_module"] == __name__
+        assert tmp["callsite_function"] == "_log_here"
+        assert tmp["callsite_lineno"] == 12
+    # (not displayed in human output)
+    assert UNIT_TESTS_STDERR[0].endswith(" foo\n")
+    mflog.set_config()
+    reset_unittests()
+
+
+def test_callsite_cache_size(monkeypatch):
+    reset_unittests()
+    mflog.set_config(callsite=True)
+    monkeypatch.setattr(processors, "CALLSITE_CACHE_MAX_SIZE", 2)
+    for i in range(0, 5):
+        code = compile("logger.warning('foo')", "dynamic%i" % i, "exec")
+        exec(code, {"logger": mflog.get_logger("foo.callsite")})
+    assert len(UNIT_TESTS_JSON) == 5
+    assert json.loads(UNIT_TESTS_JSON[-1])["callsite_lineno"] == 1
+    assert len(processors._CALLSITE_CODES) <= 2
+    assert len(processors._CALLSITE_SKIPPED_CODES) <= 2
+    mflog.set_config()
+    reset_unittests()
+
+
+def test_callsite_standard_logging():
+    reset_unittests()
+    mflog.set_config(callsite=True)
+    _log_here(logging.getLogger("foo.callsite_std"))
+    tmp = json.loads(UNIT_TESTS_JSON[0])
+    assert tmp["callsite_module"] == __name__
+    assert tmp["callsite_function"] == "_log_here"
+    assert tmp["callsite_lineno"] == 12
+    mflog.set_config()
+    reset_unittests()
+
+
+def test_no_callsite():
+    reset_unittests()
+    mflog.set_config()
+    _log_here(mflog.get_logger("foo.callsite"))
+    assert "callsite_module" not in json.loads(UNIT_TESTS_JSON[0])
+    reset_unittests()
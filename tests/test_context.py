@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+
+import json
+import asyncio
+import force_unittests_mode  # noqa: F401
+from mflog import UNIT_TESTS_JSON
+from mflog import set_config, get_logger, bind_context, unbind_context, \
+    clear_context, bound_context, get_context
+from mflog.context import merge_context
+from mflog.unittests import reset_unittests
+
+
+def test_bind_unbind():
+    reset_unittests()
+    clear_context()
+    bind_context(k1=1, k2="foo")
+    assert get_context() == {"k1": 1, "k2": "foo"}
+    unbind_context("k1", "missing")
+    assert get_context() == {"k2": "foo"}
+    clear_context()
+    assert get_context() == {}
+
+
+def test_bound_context_manager():
+    clear_context()
+    with bound_context(k1=1):
+        assert get_context() == {"k1": 1}
+        with bound_context(k2=2):
+            assert get_context() == {"k1": 1, "k2": 2}
+        assert get_context() == {"k1": 1}
+    assert get_context() == {}
+
+
+def test_bound_context_decorator():
+    clear_context()
+
+    @bound_context(k1=1)
+    def f():
+        return dict(get_context())
+
+    assert f() == {"k1": 1}
+    assert get_context() == {}
+
+
+def test_bound_context_tasks():
+    clear_context()
+
+    @bound_context(task="a")
+    async def a():
+        await asyncio.sleep(0.01)
+        return get_context()["task"]
+
+    @bound_context(task="b")
+    async def b():
+        await asyncio.sleep(0.01)
+        return get_context()["task"]
+
+    async def main():
+        return await asyncio.gather(a(), b())
+
+    assert asyncio.run(main()) == ["a", "b"]
+    assert get_context() == {}
+
+
+def test_bound_context_shared_object():
+    clear_context()
+    shared = bound_context(k1=1)
+    with shared:
+        with bound_context(k2=2):
+            # re-entered
+            with shared:
+                assert get_context() == {"k1": 1, "k2": 2}
+            assert get_context() == {"k1": 1, "k2": 2}
+        assert get_context() == {"k1": 1}
+    assert get_context() == {}
+
+    # entered concurrently by several tasks
+    async def task(name, delay):
+        with shared:
+            with bound_context(task=name):
+                await asyncio.sleep(delay)
+            return dict(get_context())
+
+    async def main():
+        return await asyncio.gather(task("a", 0.01), task("b", 0.02))
+
+    assert asyncio.run(main()) == [{"k1": 1}, {"k1": 1}]
+    assert get_context() == {}
+
+
+def test_merge_context():
+    clear_context()
+    with bound_context(k1=1, k2=2):
+        event_dict = merge_context(None, "info", {"k1": 3, "event": "foo"})
+    assert event_dict == {"k1": 3, "k2": 2, "event": "foo"}
+
+
+def test_contextvars_context_logging():
+    reset_unittests()
+    set_config(contextvars_context=True)
+    with bound_context(request_id=123):
+        get_logger("foo.bar").warning("foo")
+    get_logger("foo.bar").warning("bar")
+    assert len(UNIT_TESTS_JSON) == 2
+    assert json.loads(UNIT_TESTS_JSON[0])["request_id"] == 123
+    assert "request_id" not in json.loads(UNIT_TESTS_JSON[1])
+    reset_unittests()
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+
+import io
+import json
+import force_unittests_mode  # noqa: F401
+from mflog import set_config
+from mflog.utils import Config
+from mflog.unittests import reset_unittests
+from mflog.convert import Filters, convert_line, convert_files, get_chunks
+
+
+def _write_json_file(path, n=200):
+    with open(path, "w") as f:
+        for i in range(n):
+            level = "warning" if i % 2 == 0 else "info"
+            f.write(json.dumps({
+                "timestamp": "2021-05-10T12:%02i:00.000000Z" % (i % 60),
+                "level": level, "name": "foo.bar%i" % (i % 3), "pid": 123,
+                "event": "message %i" % i, "k1": i}) + "\n")
+        f.write("not a json line\n")
+
+
+def test_convert_line():
+    line = json.dumps({"timestamp": "2021-05-10T12:00:00.000000Z",
+                       "level": "info", "name": "foo", "pid": 1,
+                       "event": "bar", "k1": 1, "k2": 2})
+    assert convert_line(line) == \
+        "2021-05-10T12:00:00.000000Z     [INFO] (foo#1) bar {k1=1 k2=2}"
+    assert convert_line("foo") == "foo"
+    assert convert_line(line, Filters(minimal_level="WARNING")) is None
+    line = json.dumps({"timestamp": "2021-05-10T12:00:00.000000Z",
+                       "level": "info", "name": "foo", "pid": 1,
+                       "event_template": "foo %s", "args": ["bar"]})
+    assert convert_line(line).endswith("foo bar")
+
+
+def test_get_chunks(tmp_path):
+    path = str(tmp_path / "log.json")
+    _write_json_file(path)
+    chunks = list(get_chunks(path, 1000))
+    assert len(chunks) > 5
+    with open(path, "rb") as f:
+        data = f.read()
+    for _, start, end in chunks:
+        assert data[end - 1:end] == b"\n"
+    assert b"".join(data[start:end] for _, start, end in chunks) == data
+
+
+def test_convert_files(tmp_path):
+    path = str(tmp_path / "log.json")
+    _write_json_file(path)
+    output1 = io.StringIO()
+    convert_files([path], output1, jobs=1)
+    output2 = io.StringIO()
+    convert_files([path, path], output2, jobs=2, chunk_size=1000)
+    lines = output1.getvalue().splitlines()
+    assert len(lines) == 201
+    assert lines[0].endswith("(foo.bar0#123) message 0 {k1=0}")
+    assert lines[-1] == "not a json line"
+    assert output2.getvalue() == output1.getvalue() * 2
+
+
+def test_convert_filters(tmp_path):
+    path = str(tmp_path / "log.json")
+    _write_json_file(path)
+    output = io.StringIO()
+    filters = Filters(minimal_level="WARNING", names=["foo.bar1"],
+                      since="2021-05-10T12:10", until="2021-05-10T12:20")
+    convert_files([path], output, filters, jobs=1)
+    lines = output.getvalue().splitlines()
+    assert len(lines) > 0
+    for line in lines[:-1]:
+        assert "[WARNING] (foo.bar1#123)" in line
+        assert "T12:1" in line or "T12:20" in line
+
+
+def test_convert_files_keep_config(tmp_path):
+    path = str(tmp_path / "log.json")
+    _write_json_file(path)
+    set_config(minimal_level="ERROR")
+    instance = Config.get_instance()
+    output1 = io.StringIO()
+    convert_files([path], output1, jobs=1, json_only_keys=["k1"])
+    output2 = io.StringIO()
+    convert_files([path], output2, jobs=2, chunk_size=100,
+                  json_only_keys=["k1"])
+    assert "k1=" not in output1.getvalue()
+    assert output2.getvalue() == output1.getvalue()
+    assert Config.get_instance() is instance
+    assert Config.minimal_level == "ERROR"
+    assert "k1" not in Config.json_only_keys
+    reset_unittests()
@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+
+import os
+import time
+import threading
+import force_unittests_mode  # noqa: F401
+import mflog.sinks
+from mflog.sinks import JsonFileSink
+from mflog.record import EventRecord
+from mflog.metrics import stats, reset_stats
+
+
+def _get_sink(monkeypatch, tmp_path, **kwargs):
+    monkeypatch.setattr(mflog.sinks, "UNIT_TESTS_MODE", False)
+    return JsonFileSink(str(tmp_path / "log.json"), **kwargs)
+
+
+def _write(sink, level="info"):
+    event = EventRecord({"level": level, "event": "foo"})
+    sink.emit(event)
+
+
+def test_durability_none(monkeypatch, tmp_path):
+    calls = []
+    monkeypatch.setattr(os, "fsync", lambda fd: calls.append(fd))
+    sink = _get_sink(monkeypatch, tmp_path)
+    _write(sink)
+    assert calls == []
+    sink.close()
+    assert calls == []
+
+
+def test_sync_level(monkeypatch, tmp_path):
+    calls = []
+    monkeypatch.setattr(os, "fsync", lambda fd: calls.append(fd))
+    reset_stats()
+    sink = _get_sink(monkeypatch, tmp_path, sync_level="ERROR")
+    _write(sink)
+    assert calls == []
+    _write(sink, "critical")
+    assert len(calls) == 1
+    assert stats()["latencies"]["fsync"]["count"] == 1
+    sink.close()
+
+
+def test_durability_group(monkeypatch, tmp_path):
+    calls = []
+
+    def slow_fsync(fd):
+        calls.append(fd)
+        time.sleep(0.05)
+
+    monkeypatch.setattr(os, "fsync", slow_fsync)
+    sink = _get_sink(monkeypatch, tmp_path, durability="group")
+    _write(sink)
+    assert len(calls) == 1
+    threads = [threading.Thread(target=_write, args=(sink,))
+               for i in range(20)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # concurrent writers share fsyncs
+    assert 1 < len(calls) < 21
+    assert sink._synced == 21
+    sink.close()
+    with open(str(tmp_path / "log.json")) as f:
+        assert len(f.readlines()) == 21
+
+
+def test_durability_interval(monkeypatch, tmp_path):
+    calls = []
+    monkeypatch.setattr(os, "fsync", lambda fd: calls.append(fd))
+    sink = _get_sink(monkeypatch, tmp_path, durability="interval",
+                     fsync_interval=0.01)
+    _write(sink)
+    assert calls == []
+    for i in range(500):
+        if len(calls) > 0:
+            break
+        time.sleep(0.01)
+    assert len(calls) == 1
+    sink.close()
+
+
+def test_atomic_append(monkeypatch, tmp_path):
+    sink = _get_sink(monkeypatch, tmp_path, atomic_append=True)
+    writes = []
+    real_write = os.write
+
+    def fake_write(fd, data):
+        writes.append(len(data))
+        return real_write(fd, data)
+
+    monkeypatch.setattr(os, "write", fake_write)
+    _write(sink)
+    assert len(writes) == 1
+    # too big for an atomic write => locked write
+    event = EventRecord({"level": "info",
+                         "event": "x" * (mflog.sinks.ATOMIC_APPEND_MAX_SIZE)})
+    sink.emit(event)
+    assert len(writes) == 1
+    sink.close()
+    with open(str(tmp_path / "log.json")) as f:
+        lines = f.readlines()
+    assert len(lines) == 2
+    assert '"foo"' in lines[0]
+    assert "xxxx" in lines[1]
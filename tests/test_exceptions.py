@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+
+import io
+import sys
+import collections
+import structlog
+import force_unittests_mode  # noqa: F401
+from mflog import set_config
+from mflog.processors import add_exception_info
+from mflog.unittests import reset_unittests
+from mflog.utils import get_exception_fingerprint, get_locals_map, \
+    dump_locals
+
+
+def _raise(msg):
+    raise ValueError(msg)
+
+
+def _exc_info(msg):
+    try:
+        _raise(msg)
+    except Exception:
+        return sys.exc_info()
+
+
+def _chained_exc_info():
+    try:
+        try:
+            1 / 0
+        except Exception:
+            _raise("chained")
+    except Exception:
+        return sys.exc_info()
+
+
+def test_fingerprint():
+    reset_unittests()
+    e1 = _exc_info("foo")
+    e2 = _exc_info("bar")
+    fp1, formatted1 = get_exception_fingerprint(e1)
+    fp2, formatted2 = get_exception_fingerprint(e2)
+    assert fp1 == fp2
+    assert formatted1 == structlog._frames._format_exception(e1)
+    assert formatted2 == structlog._frames._format_exception(e2)
+    assert formatted2.endswith("ValueError: bar")
+    fp3, formatted3 = get_exception_fingerprint(_chained_exc_info())
+    assert fp3 != fp1
+    assert "ZeroDivisionError" in formatted3
+
+
+def test_add_exception_info():
+    reset_unittests()
+    set_config()
+    event_dict = add_exception_info(None, "error",
+                                    {"exc_info": _exc_info("foo")})
+    assert event_dict["exception_type"] == "ValueError"
+    assert len(event_dict["exception_fingerprint"]) == 16
+    assert event_dict["exception"].startswith("Traceback")
+    assert "exception_repeated" not in event_dict
+
+
+def test_exception_dedup_window():
+    reset_unittests()
+    set_config(exception_dedup_window=3600)
+    ed1 = add_exception_info(None, "error", {"exc_info": _exc_info("foo")})
+    ed2 = add_exception_info(None, "error", {"exc_info": _exc_info("bar")})
+    assert "exception_repeated" not in ed1
+    assert ed2["exception_repeated"]
+    assert ed2["exception_fingerprint"] == ed1["exception_fingerprint"]
+    assert "Traceback" not in ed2["exception"]
+    assert ed2["exception"].endswith("ValueError: bar")
+    reset_unittests()
+
+
+def test_dump_locals_caller():
+    reset_unittests()
+    set_config(fancy_output=False)
+    big = "x" * 100000
+    small = [1, 2, 3]  # noqa: F841
+    f = io.StringIO()
+    assert dump_locals(f, target="caller")
+    output = f.getvalue()
+    assert "small: [1, 2, 3]" in output
+    assert len(output) < len(big)
+
+
+def test_locals_map_bounded():
+    reset_unittests()
+    set_config()
+    big_list = list(range(100000))  # noqa: F841
+    big_string = "x" * 100000  # noqa: F841
+    locals_map = get_locals_map(sys._getframe(), max_value_size=50,
+                                max_total_size=40)
+    assert len(locals_map["big_list"]) <= 53
+    assert "hidden" in locals_map["big_string"]
+
+
+class _BrokenRepr(object):
+
+    def __repr__(self):
+        raise Exception("broken")
+
+
+def test_locals_map_bounded_repr():
+    big_bytes = b"x" * 1000000  # noqa: F841
+    point = collections.namedtuple("P", "x y")(1, 2)  # noqa: F841
+    broken = _BrokenRepr()  # noqa: F841
+    big_point = collections.namedtuple("P", "x")("y" * 1000)  # noqa: F841
+    locals_map = get_locals_map(sys._getframe(), max_value_size=50,
+                                max_total_size=10000)
+    assert locals_map["big_bytes"].startswith("b'xxx")
+    assert len(locals_map["big_bytes"]) <= 53
+    assert locals_map["point"] == "P(x=1, y=2)"
+    assert "_BrokenRepr instance at" in locals_map["broken"]
+    assert locals_map["big_point"].startswith("P(x='yyy")
+    assert len(locals_map["big_point"]) <= 53
+
+
+def test_exception_locals_json():
+    reset_unittests()
+    set_config(dump_locals_json=True, dump_locals_target="exception")
+    event_dict = add_exception_info(None, "error",
+                                    {"exc_info": _exc_info("foo")})
+    assert event_dict["exception_locals"] == {"msg": "'foo'"}
+    # the frame which raised whatever the target
+    set_config(dump_locals_json=True)
+    event_dict = add_exception_info(None, "error",
+                                    {"exc_info": _exc_info("bar")})
+    assert event_dict["exception_locals"] == {"msg": "'bar'"}
+    reset_unittests()
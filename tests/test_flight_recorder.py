@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+
+import json
+import logging
+import force_unittests_mode  # noqa: F401
+from mflog import get_logger, set_config, bind_context, clear_context
+from mflog import UNIT_TESTS_STDOUT, UNIT_TESTS_JSON
+from mflog.unittests import reset_unittests
+
+
+def test_flight_recorder():
+    reset_unittests()
+    set_config(minimal_level="INFO", flight_recorder_size=2)
+    x = get_logger("foo.bar")
+    x.debug("debug1")
+    x.debug("debug%i", 2, k1=1)
+    x.debug("debug3")
+    x.info("info")
+    assert len(UNIT_TESTS_STDOUT) == 1
+    assert UNIT_TESTS_JSON == []
+    x.error("error")
+    assert len(UNIT_TESTS_JSON) == 3
+    tmp = [json.loads(x) for x in UNIT_TESTS_JSON]
+    assert tmp[0]["event"] == "debug2"
+    assert tmp[0]["k1"] == 1
+    assert tmp[0]["level"] == "debug"
+    assert tmp[0]["flight_recorder"] is True
+    assert tmp[1]["event"] == "debug3"
+    assert tmp[2]["event"] == "error"
+    assert "flight_recorder" not in tmp[2]
+    assert tmp[0]["timestamp"] <= tmp[1]["timestamp"] <= tmp[2]["timestamp"]
+    # the buffer is cleared after a dump
+    x.error("error2")
+    assert len(UNIT_TESTS_JSON) == 4
+    reset_unittests()
+
+
+def test_flight_recorder_exception():
+    reset_unittests()
+    set_config(minimal_level="INFO", flight_recorder_size=10)
+    x = get_logger("foo.bar")
+    try:
+        1 / 0
+    except Exception:
+        x.debug("catched", exc_info=True)
+    x.warning("warning")
+    assert len(UNIT_TESTS_JSON) == 1
+    x.critical("critical")
+    tmp = json.loads(UNIT_TESTS_JSON[1])
+    assert tmp["exception_type"] == "ZeroDivisionError"
+    assert tmp["flight_recorder"] is True
+    reset_unittests()
+
+
+def test_flight_recorder_standard_logging():
+    reset_unittests()
+    set_config(minimal_level="INFO", flight_recorder_size=10)
+    logging.getLogger("foo.std").debug("std %s", "debug")
+    get_logger("foo.bar").error("error")
+    assert json.loads(UNIT_TESTS_JSON[0])["event"] == "std debug"
+    reset_unittests()
+
+
+def test_flight_recorder_context_scope():
+    reset_unittests()
+    set_config(minimal_level="INFO", flight_recorder_size=10,
+               flight_recorder_scope="context", contextvars_context=True)
+    bind_context(request_id=12)
+    x = get_logger("foo.bar")
+    x.debug("debug")
+    # the event is dumped in another context
+    bind_context(request_id=13)
+    x.error("error")
+    tmp = json.loads(UNIT_TESTS_JSON[0])
+    assert tmp["request_id"] == 12
+    assert tmp["flight_recorder"] is True
+    assert json.loads(UNIT_TESTS_JSON[1])["request_id"] == 13
+    clear_context()
+    reset_unittests()
+
+
+def test_flight_recorder_mutable_arguments():
+    reset_unittests()
+    set_config(minimal_level="INFO", flight_recorder_size=10)
+    x = get_logger("foo.bar")
+    args = [1]
+    x.debug("debug %s", args)
+    x.debug("debug %i", 2)
+    # modified after the logging call
+    args.append(2)
+    x.error("error")
+    assert json.loads(UNIT_TESTS_JSON[0])["event"] == "debug [1]"
+    assert json.loads(UNIT_TESTS_JSON[1])["event"] == "debug 2"
+    set_config()
+    reset_unittests()
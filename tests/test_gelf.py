@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+
+import json
+import gzip
+import zlib
+import socket
+import force_unittests_mode  # noqa: F401
+from mflog import get_logger, set_config
+from mflog.gelf import get_chunks, CHUNK_HEADER
+from mflog.unittests import reset_unittests
+
+
+def _get_receiver():
+    receiver = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    receiver.bind(("127.0.0.1", 0))
+    receiver.settimeout(5)
+    return receiver
+
+
+def _receive(receiver, decompress=zlib.decompress):
+    datagram = receiver.recv(65535)
+    if datagram[0:2] != b"\x1e\x0f":
+        return json.loads(decompress(datagram))
+    _, message_id, seq, count = CHUNK_HEADER.unpack_from(datagram)
+    chunks = {seq: datagram[CHUNK_HEADER.size:]}
+    while len(chunks) < count:
+        datagram = receiver.recv(65535)
+        _, message_id2, seq, _ = CHUNK_HEADER.unpack_from(datagram)
+        assert message_id2 == message_id
+        chunks[seq] = datagram[CHUNK_HEADER.size:]
+    data = b"".join(chunks[i] for i in range(count))
+    return json.loads(decompress(data))
+
+
+def test_get_chunks():
+    assert get_chunks(b"foo", 100) == [b"foo"]
+    chunks = get_chunks(b"x" * 100, 22)
+    assert len(chunks) == 10
+    assert all(len(x) <= 22 for x in chunks)
+    assert chunks[3][10:12] == b"\x03\x0a"
+
+
+def test_gelf():
+    reset_unittests()
+    receiver = _get_receiver()
+    set_config(gelf_address="127.0.0.1:%i" % receiver.getsockname()[1])
+    x = get_logger("foo.bar")
+    x.info("ignored")
+    x.warning("foo %s", "bar", k1=1, id="baz", k2=[1])
+    tmp = _receive(receiver)
+    assert tmp["version"] == "1.1"
+    assert tmp["short_message"] == "foo bar"
+    assert tmp["level"] == 4
+    assert tmp["_name"] == "foo.bar"
+    assert tmp["_k1"] == 1
+    assert tmp["__id"] == "baz"
+    assert tmp["_k2"] == "[1]"
+    assert isinstance(tmp["timestamp"], float)
+    try:
+        1 / 0
+    except Exception:
+        x.exception("boom")
+    tmp = _receive(receiver)
+    assert tmp["level"] == 3
+    assert "ZeroDivisionError" in tmp["full_message"]
+    assert tmp["_exception_type"] == "ZeroDivisionError"
+    receiver.close()
+    reset_unittests()
+
+
+def test_gelf_chunked():
+    reset_unittests()
+    receiver = _get_receiver()
+    set_config(gelf_address="127.0.0.1:%i" % receiver.getsockname()[1],
+               gelf_compression="gzip", gelf_chunk_size=200)
+    big = "".join(str(i) for i in range(2000))
+    get_logger("foo.bar").error("big", big=big)
+    tmp = _receive(receiver, gzip.decompress)
+    assert tmp["_big"] == big
+    receiver.close()
+    reset_unittests()
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+
+import os
+import array
+import socket
+import force_unittests_mode  # noqa: F401
+from mflog import get_logger, set_config
+from mflog.journald import get_field_name, serialize, JournaldSender, \
+    LENGTH
+from mflog.unittests import reset_unittests
+
+
+def _get_receiver(tmp_path):
+    path = str(tmp_path / "journal.socket")
+    receiver = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+    receiver.bind(path)
+    receiver.settimeout(5)
+    return receiver, path
+
+
+def _parse(data):
+    res = {}
+    while len(data) > 0:
+        line, data = data.split(b"\n", 1)
+        if b"=" in line:
+            name, value = line.split(b"=", 1)
+        else:
+            name = line
+            size = LENGTH.unpack_from(data)[0]
+            value = data[LENGTH.size:LENGTH.size + size]
+            data = data[LENGTH.size + size + 1:]
+        res[name.decode("ascii")] = value.decode("utf8")
+    return res
+
+
+def test_get_field_name():
+    assert get_field_name("foo") == "FOO"
+    assert get_field_name("_foo.bar") == "FOO_BAR"
+    assert get_field_name("1foo") == "X_1FOO"
+    assert len(get_field_name("x" * 100)) == 64
+
+
+def test_serialize():
+    data = serialize([("FOO", "bar"), ("EXCEPTION", "foo\nbar")])
+    assert data == b"FOO=bar\nEXCEPTION\n" + LENGTH.pack(7) + b"foo\nbar\n"
+    assert _parse(data) == {"FOO": "bar", "EXCEPTION": "foo\nbar"}
+
+
+def test_journald_sink(tmp_path):
+    receiver, path = _get_receiver(tmp_path)
+    reset_unittests()
+    set_config(journald_socket=path)
+    get_logger("foo.journald").info("dropped")
+    get_logger("foo.journald").warning("foo %s", "bar", k1=1,
+                                       message="baz")
+    tmp = _parse(receiver.recv(65535))
+    assert tmp["MESSAGE"] == "foo bar"
+    assert tmp["PRIORITY"] == "4"
+    assert tmp["SYSLOG_IDENTIFIER"] == "foo.journald"
+    assert tmp["SYSLOG_PID"] == str(os.getpid())
+    assert tmp["K1"] == "1"
+    assert tmp["EXTRA_MESSAGE"] == "baz"
+    try:
+        raise Exception("boom")
+    except Exception:
+        get_logger("foo.journald").exception("error")
+    tmp = _parse(receiver.recv(65535))
+    assert tmp["PRIORITY"] == "3"
+    assert "boom" in tmp["EXCEPTION"]
+    assert tmp["EXCEPTION_TYPE"] == "Exception"
+    set_config()
+    reset_unittests()
+    receiver.close()
+
+
+def test_memfd_fallback(tmp_path):
+    receiver, path = _get_receiver(tmp_path)
+    sender = JournaldSender(path)
+    value = "x" * (4 * 1024 * 1024)
+    sender.send([("MESSAGE", value)])
+    fds = array.array("i")
+    _, ancdata, _, _ = receiver.recvmsg(1, socket.CMSG_LEN(fds.itemsize))
+    level, kind, data = ancdata[0]
+    assert (level, kind) == (socket.SOL_SOCKET, socket.SCM_RIGHTS)
+    fds.frombytes(data[:fds.itemsize])
+    with os.fdopen(fds[0], "rb") as f:
+        f.seek(0)
+        assert _parse(f.read()) == {"MESSAGE": value}
+    sender.close()
+    receiver.close()
@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+
+import force_unittests_mode  # noqa: F401
+import mflog
+from mflog.metrics import reset_stats, write_prometheus_textfile
+from mflog.unittests import reset_unittests
+
+
+def test_stats():
+    reset_unittests()
+    reset_stats()
+    x = mflog.get_logger("foo.bar")
+    x.debug("dropped")
+    x.warning("foo")
+    stats = mflog.stats()
+    assert stats["dropped"] == {"debug": 1}
+    assert stats["events"]["json"] == {"warning": 1}
+    assert stats["events"]["stderr"] == {"warning": 1}
+    assert stats["bytes"]["json"] > 10
+    assert stats["latencies"]["json_write"]["count"] == 1
+    assert stats["latencies"]["json_write"]["buckets"]["+Inf"] == 1
+
+
+def test_prometheus_textfile(tmp_path):
+    reset_unittests()
+    reset_stats()
+    mflog.get_logger("foo.bar").warning("foo")
+    path = str(tmp_path / "mflog_{pid}.prom")
+    write_prometheus_textfile(path)
+    files = list(tmp_path.iterdir())
+    assert len(files) == 1
+    content = files[0].read_text()
+    assert 'sink="json",level="warning"} 1' in content
+    assert "mflog_json_write_seconds_count" in content
@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+
+import force_unittests_mode  # noqa: F401
+import mflog
+from mflog.profiling import PROFILE, reset_profile, get_report
+from mflog.unittests import reset_unittests
+
+
+def test_profile():
+    reset_unittests()
+    reset_profile()
+    mflog.set_config(profile=True)
+    x = mflog.get_logger("foo.profiled")
+    x.debug("dropped")
+    x.warning("foo")
+    assert PROFILE[("foo.profiled", "processor:fltr")][0] == 2
+    assert PROFILE[("foo.profiled", "processor:add_pid")][0] == 1
+    assert PROFILE[("foo.profiled", "processor:TimeStamper")][0] == 1
+    assert PROFILE[("foo.profiled", "output:json")][0] == 1
+    assert PROFILE[("foo.profiled", "output:stderr")][0] == 1
+    assert PROFILE[("foo.profiled", "format:json")][0] == 1
+    report = get_report()
+    assert "output:json" in report
+    reset_profile()
+    reset_unittests()
+
+
+def test_no_profile():
+    reset_unittests()
+    reset_profile()
+    mflog.set_config()
+    mflog.get_logger("foo.not_profiled").warning("foo")
+    assert PROFILE == {}
@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import pytest
+import force_unittests_mode  # noqa: F401
+import mflog.shm
+from mflog import get_logger, set_config, UNIT_TESTS_JSON
+from mflog.shm import Ring, Writer, FLAG_JSON, FLAG_SYSLOG
+from mflog.unittests import reset_unittests
+
+
+def test_ring(tmp_path):
+    ring = Ring.create(str(tmp_path), slot_size=64, slot_count=4)
+    assert os.listdir(str(tmp_path)) == [os.path.basename(ring.path)]
+    reader = Ring.open(ring.path)
+    assert reader.pid == os.getpid()
+    assert reader.get_all() == []
+    for i in range(6):
+        ring.put(b"foo%i" % i, FLAG_JSON)
+    assert len(reader) == 4
+    assert reader.dropped == 2
+    assert reader.get_all() == [(FLAG_JSON, b"foo%i" % i) for i in range(4)]
+    assert ring.put(b"bar", FLAG_SYSLOG)
+    assert reader.get_all() == [(FLAG_SYSLOG, b"bar")]
+    with pytest.raises(ValueError):
+        ring.put(b"x" * 100)
+    ring.close()
+    reader.close()
+
+
+def test_writer(tmp_path, monkeypatch):
+    json_file = str(tmp_path / "log.json")
+    ring = Ring.create(str(tmp_path), slot_size=128, slot_count=2)
+    for i in range(3):
+        ring.put(json.dumps({"event": "foo%i" % i}).encode("utf8"))
+    writer = Writer(str(tmp_path), json_file)
+    writer.scan()
+    assert writer.drain() == 2
+    monkeypatch.setattr(mflog.shm, "is_pid_alive", lambda pid: False)
+    assert writer.drain() == 0
+    # the abandoned ring is removed
+    assert not os.path.exists(ring.path)
+    writer.close()
+    with open(json_file) as f:
+        lines = [json.loads(x) for x in f.readlines()]
+    assert [x["event"] for x in lines[0:2]] == ["foo0", "foo1"]
+    assert lines[2]["name"] == "mflog.shm"
+    assert "1 log events dropped" in lines[2]["event"]
+
+
+def test_shm_sink(tmp_path):
+    reset_unittests()
+    json_file = str(tmp_path / "log.json")
+    shm_dir = str(tmp_path / "shm")
+    set_config(json_transport="shm", shm_dir=shm_dir, json_file=json_file,
+               shm_slot_size=256)
+    x = get_logger("foo.bar")
+    x.info("info")
+    x.warning("warning")
+    x.error("error", big="x" * 500)
+    writer = Writer(shm_dir, json_file)
+    writer.scan()
+    assert writer.drain() == 1
+    writer.close()
+    with open(json_file) as f:
+        lines = [json.loads(x) for x in f.readlines()]
+    assert [x["event"] for x in lines] == ["warning"]
+    # the big event is written directly (in unit tests json output here)
+    assert len(UNIT_TESTS_JSON) == 1
+    assert json.loads(UNIT_TESTS_JSON[0])["event"] == "error"
+    reset_unittests()
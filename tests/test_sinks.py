@@ -0,0 +1,230 @@
+# -*- coding: utf-8 -*-
+
+import io
+import sys
+import json
+import time
+import pytest
+import force_unittests_mode  # noqa: F401
+import mflog.sinks
+from mflog import get_logger, set_config, register_formatter
+from mflog import UNIT_TESTS_STDOUT, UNIT_TESTS_STDERR, UNIT_TESTS_JSON
+from mflog.sinks import Sink, ConsoleBuffer, ConsoleSink
+from mflog.record import EventRecord
+from mflog.formatters import FORMATTERS
+from mflog.unittests import reset_unittests
+
+
+class ListSink(Sink):
+
+    name = "list"
+
+    def __init__(self, **kwargs):
+        Sink.__init__(self, **kwargs)
+        self.messages = []
+
+    def write(self, message, event):
+        self.messages.append(message)
+        return len(message)
+
+
+def test_default_sinks():
+    reset_unittests()
+    x = get_logger("foo.bar")
+    x.info("foo", k1=1)
+    x.warning("bar")
+    assert len(UNIT_TESTS_STDOUT) == 1
+    assert "[INFO] (foo.bar#" in UNIT_TESTS_STDOUT[0]
+    assert UNIT_TESTS_STDOUT[0].endswith("foo {k1=1}\n")
+    assert len(UNIT_TESTS_STDERR) == 1
+    assert len(UNIT_TESTS_JSON) == 1
+    assert json.loads(UNIT_TESTS_JSON[0])["event"] == "bar"
+
+
+def test_custom_sink():
+    reset_unittests()
+    sink = ListSink(minimal_level="ERROR")
+    set_config(sinks=[sink])
+    x = get_logger("foo.bar")
+    x.warning("foo")
+    x.error("bar")
+    assert len(sink.messages) == 1
+    assert json.loads(sink.messages[0])["event"] == "bar"
+    # the json serialization is shared with the json file sink
+    assert UNIT_TESTS_JSON[-1] == sink.messages[0] + "\n"
+
+
+def test_bad_sink_path(capsys):
+    reset_unittests()
+    sink = ListSink()
+    set_config(sinks=["nomodule", "mflog_missing_module.Sink",
+                      "mflog.sinks.MissingSink", sink])
+    get_logger("foo.bar").info("foo")
+    assert len(sink.messages) == 1
+    assert capsys.readouterr().err.count("MFLOG ERROR: can't build sink") \
+        == 3
+    reset_unittests()
+
+
+def test_custom_formatter():
+    reset_unittests()
+    calls = []
+
+    def upper(record):
+        calls.append(1)
+        return record.event.upper()
+
+    register_formatter("upper", upper)
+    sink1 = ListSink(formatter="upper")
+    sink2 = ListSink(formatter="upper")
+    set_config(sinks=[sink1, sink2])
+    get_logger("foo.bar").info("foo")
+    assert sink1.messages == ["FOO"]
+    assert sink2.messages == ["FOO"]
+    assert len(calls) == 1
+    reset_unittests()
+
+
+def test_event_record():
+    event_dict = {"timestamp": "2020-01-01T00:00:00.000000Z",
+                  "level": "info", "name": "foo.bar", "pid": 123,
+                  "event": "foo", "k1": 1}
+    record = EventRecord(event_dict)
+    assert record.level_no == 20
+    assert record.extra == {"k1": 1}
+    assert record.exception is None
+    tmp = record.render("plain", FORMATTERS)
+    assert tmp == "2020-01-01T00:00:00.000000Z     [INFO] (foo.bar#123) " \
+        "foo {k1=1}"
+    assert record.render("plain", FORMATTERS) is tmp
+    assert json.loads(record.render("json", FORMATTERS)) == \
+        record.as_dict()
+    assert record.extra == {"k1": 1}
+
+
+def test_deferred_formatting():
+    calls = []
+
+    class Arg(object):
+
+        def __str__(self):
+            calls.append(1)
+            return "arg"
+
+    record = EventRecord({"level": "info", "event": "foo %s",
+                          "positional_args": (Arg(),)})
+    assert calls == []
+    assert record.event_template == "foo %s"
+    assert record.render("msg_only", FORMATTERS) == "foo arg"
+    assert record.render("plain", FORMATTERS).endswith("foo arg")
+    assert len(calls) == 1
+    record = EventRecord({"level": "info", "event": "foo %(k)s",
+                          "positional_args": ({"k": "bar"},)})
+    assert record.event == "foo bar"
+
+
+def test_json_event_template():
+    reset_unittests()
+    set_config(json_event_template=True)
+    x = get_logger("foo.bar")
+    x.warning("foo %s %i", "bar", 1, k1=2)
+    x.warning("foo")
+    tmp = json.loads(UNIT_TESTS_JSON[0])
+    assert "event" not in tmp
+    assert tmp["event_template"] == "foo %s %i"
+    assert tmp["args"] == ["bar", 1]
+    assert tmp["k1"] == 2
+    assert UNIT_TESTS_STDERR[0].endswith("foo bar 1 {k1=2}\n")
+    assert json.loads(UNIT_TESTS_JSON[1])["event"] == "foo"
+    reset_unittests()
+
+
+class FakeStream(object):
+
+    def __init__(self, name, writes):
+        self.name = name
+        self.writes = writes
+
+    def write(self, data):
+        self.writes.append((self.name, data))
+
+    def flush(self):
+        pass
+
+
+def test_console_buffer(monkeypatch):
+    writes = []
+    monkeypatch.setattr(sys, "stdout", FakeStream("stdout", writes))
+    monkeypatch.setattr(sys, "stderr", FakeStream("stderr", writes))
+    buf = ConsoleBuffer(30, interval=3600)
+    buf.add("stdout", "line1\n")
+    buf.add("stdout", "line2\n")
+    buf.add("stderr", "line3\n")
+    assert writes == []
+    buf.add("stdout", "line4\n")
+    buf.add("stdout", "line5\n")
+    # size reached, consecutive lines of the same stream are written at once
+    assert writes == [("stdout", "line1\nline2\n"), ("stderr", "line3\n"),
+                      ("stdout", "line4\nline5\n")]
+    buf.add("stdout", "line6\n")
+    buf.add("stderr", "error\n", flush_now=True)
+    assert writes[3:] == [("stdout", "line6\n"), ("stderr", "error\n")]
+    buf.add("stdout", "line7\n")
+    buf.flush()
+    assert writes[5:] == [("stdout", "line7\n")]
+
+
+def test_console_buffer_interval(monkeypatch):
+    writes = []
+    monkeypatch.setattr(sys, "stdout", FakeStream("stdout", writes))
+    buf = ConsoleBuffer(1000, interval=0.01)
+    buf.add("stdout", "line1\n")
+    for i in range(500):
+        if len(writes) > 0:
+            break
+        time.sleep(0.01)
+    assert writes == [("stdout", "line1\n")]
+
+
+def test_console_buffer_close(monkeypatch):
+    writes = []
+    monkeypatch.setattr(sys, "stdout", FakeStream("stdout", writes))
+    buf = ConsoleBuffer(1000, interval=60)
+    buf.add("stdout", "line1\n")
+    thread = buf._thread
+    assert thread.is_alive()
+    buf.close()
+    assert not thread.is_alive()
+    assert writes == [("stdout", "line1\n")]
+    buf.add("stdout", "line2\n")
+    assert writes[-1] == ("stdout", "line2\n")
+    assert buf._thread is thread
+
+
+def test_console_buffer_reconfiguration(monkeypatch):
+    reset_unittests()
+    set_config(console_buffer_size=1000)
+    mflog.sinks.get_sinks()
+    buf = mflog.sinks._CONSOLE_BUFFER
+    buf.add("stdout", "")
+    thread = buf._thread
+    set_config(console_buffer_size=1000)
+    assert not thread.is_alive()
+    assert mflog.sinks._CONSOLE_BUFFER is None
+    reset_unittests()
+
+
+def test_console_fancy_exception(monkeypatch):
+    rich_console = pytest.importorskip("rich.console")
+
+    def print_exception(*args, **kwargs):
+        raise AssertionError("the traceback must not be rendered again")
+
+    monkeypatch.setattr(rich_console.Console, "print_exception",
+                        print_exception)
+    record = EventRecord({"timestamp": "2020-01-01T00:00:00.000000Z",
+                          "level": "error", "name": "foo.bar", "pid": 123,
+                          "event": "foo", "exception": "Traceback: foo"})
+    f = io.StringIO()
+    ConsoleSink("stderr")._fancy_msg(f, record)
+    assert f.getvalue().count("Traceback: foo") == 1
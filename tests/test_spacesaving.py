@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+
+import threading
+from mflog.spacesaving import SpaceSaving
+
+
+def test_space_saving():
+    ss = SpaceSaving(3)
+    for key in "aaaaabbbbccd":
+        ss.add(key)
+    assert ss.top(2) == [("a", 5, 0), ("b", 4, 0)]
+    # d replaced c (the minimal count)
+    assert len(ss.counters) == 3
+    assert ss.top(3)[2] == ("d", 3, 2)
+    other = SpaceSaving(3)
+    other.add("b", 10)
+    ss.merge(other)
+    assert ss.top(1) == [("b", 14, 0)]
+    # both full: absent keys get the minimal count of the other side
+    ss1 = SpaceSaving(2)
+    ss1.add("a", 5)
+    ss1.add("b", 2)
+    ss2 = SpaceSaving(2)
+    ss2.add("c", 3)
+    ss2.add("a", 1)
+    ss1.merge(ss2)
+    assert ss1.top() == [("a", 6, 0), ("c", 5, 2)]
+    ss1.add("e")
+    assert sorted(ss1.top()) == [("a", 6, 0), ("e", 6, 5)]
+
+
+def test_space_saving_threads():
+    ss = SpaceSaving(10)
+
+    def add():
+        for i in range(0, 10000):
+            ss.add(i % 50)
+
+    threads = [threading.Thread(target=add) for _ in range(0, 4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(ss.counters) == 10
+    assert sum(x[0] for x in ss.counters.values()) == 40000
@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+
+import os
+import socket
+import force_unittests_mode  # noqa: F401
+from mflog import get_logger, set_config
+from mflog.utils import Config
+from mflog.syslog import SyslogLogger, get_unix_transport, \
+    parse_unix_address
+from mflog.unittests import reset_unittests
+
+
+def _get_dgram_receiver(path):
+    receiver = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+    receiver.bind(path)
+    receiver.settimeout(5)
+    return receiver
+
+
+def test_syslog_address():
+    set_config(syslog_address="/dev/log")
+    assert Config.syslog_address == "/dev/log"
+    set_config(syslog_address="unix-stream:/dev/log")
+    assert Config.syslog_address == "unix-stream:/dev/log"
+    set_config(syslog_address="127.0.0.1:1514")
+    assert Config.syslog_address == ("127.0.0.1", 1514)
+    set_config()
+    assert parse_unix_address("/dev/log") == ("/dev/log", None)
+    assert parse_unix_address("unix-dgram:/foo") == ("/foo",
+                                                     socket.SOCK_DGRAM)
+
+
+def test_unix_dgram(tmp_path):
+    path = str(tmp_path / "log.socket")
+    receiver = _get_dgram_receiver(path)
+    reset_unittests()
+    set_config(syslog_address=path)
+    get_logger("foo.syslog").info("dropped")
+    get_logger("foo.syslog").warning("foo")
+    get_logger("foo.syslog").error("bar")
+    assert receiver.recv(65535) == b"<12>foo\x00"
+    assert receiver.recv(65535) == b"<11>bar\x00"
+    set_config()
+    reset_unittests()
+    receiver.close()
+
+
+def test_unix_stream(tmp_path):
+    path = str(tmp_path / "log.socket")
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(path)
+    server.listen(1)
+    server.settimeout(5)
+    logger = SyslogLogger("unix-stream:%s" % path)
+    logger.send("foo", "foo.syslog", "critical")
+    conn, _ = server.accept()
+    conn.settimeout(5)
+    assert conn.recv(65535) == b"<10>foo\x00"
+    conn.close()
+    server.close()
+
+
+def test_shared_transport(tmp_path):
+    path = str(tmp_path / "log.socket")
+    assert get_unix_transport(path) is get_unix_transport(path)
+
+
+def test_reconnect(tmp_path):
+    path = str(tmp_path / "log.socket")
+    receiver = _get_dgram_receiver(path)
+    transport = get_unix_transport(path, socket.SOCK_DGRAM)
+    assert transport.send(b"foo") == 3
+    assert receiver.recv(65535) == b"foo"
+    # syslog daemon restart
+    receiver.close()
+    os.unlink(path)
+    assert transport.send(b"bar") == 0
+    assert transport.send(b"baz") == 0
+    assert transport.dropped == 2
+    receiver = _get_dgram_receiver(path)
+    # (during the backoff delay, messages are still dropped)
+    transport._retry_at = 0.0
+    assert transport.send(b"foo") == 3
+    assert b"2 syslog messages dropped" in receiver.recv(65535)
+    assert receiver.recv(65535) == b"foo"
+    assert transport.dropped == 0
+    transport.close()
+    receiver.close()
+
+
+def test_udp_priority():
+    receiver = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    receiver.bind(("127.0.0.1", 0))
+    receiver.settimeout(5)
+    logger = SyslogLogger(receiver.getsockname())
+    logger.send("foo", "foo.syslog", "error")
+    assert receiver.recv(65535) == b"<11>foo\x00"
+    logger.close()
+    receiver.close()
+
+
+def test_reconnect_report_error(tmp_path, monkeypatch):
+    path = str(tmp_path / "log2.socket")
+    transport = get_unix_transport(path, socket.SOCK_DGRAM)
+    assert transport.send(b"foo") == 0
+    assert transport.dropped == 1
+    receiver = _get_dgram_receiver(path)
+
+    def broken_send(data):
+        raise OSError("broken")
+
+    monkeypatch.setattr(transport, "_send", broken_send)
+    transport._retry_at = 0.0
+    assert transport.send(b"bar") == 0
+    assert transport.dropped == 2
+    assert transport._socket is None
+    transport.close()
+    receiver.close()
@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+
+import json
+import force_unittests_mode  # noqa: F401
+from mflog import get_logger, set_config, UNIT_TESTS_JSON
+from mflog.sinks import Sink
+from mflog.utils import estimate_size, truncate_value, truncate_event_dict
+from mflog.unittests import reset_unittests
+
+
+class ListSink(Sink):
+
+    def __init__(self, **kwargs):
+        Sink.__init__(self, **kwargs)
+        self.messages = []
+
+    def write(self, message, event):
+        self.messages.append(message)
+        return len(message)
+
+
+def test_estimate_size():
+    assert estimate_size("foo", 100) == 5
+    assert estimate_size(list(range(10)), 1000) == 102
+    # the walk stops when the budget is reached
+    assert estimate_size(list(range(1000000)), 100) < 200
+
+
+def test_truncate_value():
+    assert truncate_value("foo", 10) == ("foo", False)
+    assert truncate_value("x" * 20, 10) == \
+        ("x" * 10 + "...[truncated, original length: 20]", True)
+    assert truncate_value(b"x" * 20, 10)[0].startswith("x" * 10 + "...")
+    tmp, truncated = truncate_value(list(range(1000000)), 50)
+    assert truncated
+    assert tmp.startswith("[0, 1, 2")
+    assert tmp.endswith("...[truncated, original length: 1000000]")
+    assert truncate_value([1, 2], 50) == ([1, 2], False)
+    assert truncate_value(12, 1) == (12, False)
+
+
+def test_truncate_event_dict():
+    event_dict = {"level": "info", "event": "foo", "k1": "x" * 1000,
+                  "k2": "y" * 1000}
+    truncate_event_dict(event_dict, max_event_size=500)
+    assert event_dict["event"] == "foo"
+    assert len(event_dict["k1"]) < 300
+    assert len(event_dict["k2"]) < 300
+
+
+def test_max_field_size():
+    reset_unittests()
+    set_config(max_field_size=100)
+    x = get_logger("foo.bar")
+    x.warning("foo %s", "z" * 200, big="x" * 1000000, small="y",
+              blob=list(range(100000)))
+    tmp = json.loads(UNIT_TESTS_JSON[0])
+    assert tmp["small"] == "y"
+    assert tmp["big"] == \
+        "x" * 100 + "...[truncated, original length: 1000000]"
+    assert tmp["blob"].endswith("[truncated, original length: 100000]")
+    # the message is formatted before being truncated
+    assert tmp["event"] == \
+        "foo " + "z" * 96 + "...[truncated, original length: 204]"
+    reset_unittests()
+
+
+def test_max_event_size_positional_args():
+    reset_unittests()
+    set_config(max_event_size=100)
+    x = get_logger("foo.bar")
+    x.warning("%s %s", "a" * 500, "b" * 500)
+    x.warning("%(foo)s", {"foo": "c" * 500})
+    tmp = json.loads(UNIT_TESTS_JSON[0])
+    assert tmp["event"].startswith("aaa")
+    assert "[truncated, original length: 1001]" in tmp["event"]
+    assert json.loads(UNIT_TESTS_JSON[1])["event"].startswith("ccc")
+    set_config(max_field_size=50)
+    x.warning("%s %s", "a" * 500, "b" * 500)
+    assert json.loads(UNIT_TESTS_JSON[2])["event"].startswith("aaa")
+    set_config()
+    reset_unittests()
+
+
+def test_max_event_size_flight_recorder():
+    reset_unittests()
+    set_config(flight_recorder_size=50, max_event_size=300)
+    x = get_logger("foo.bar")
+    for i in range(0, 10):
+        x.debug("recorded %i" % i)
+    x.error("foo")
+    events = [json.loads(line) for line in UNIT_TESTS_JSON]
+    assert len(events) == 11
+    assert events[-1]["event"] == "foo"
+    set_config()
+    reset_unittests()
+
+
+def test_sink_max_event_size():
+    reset_unittests()
+    sink = ListSink(max_event_size=1000)
+    set_config(sinks=[sink])
+    x = get_logger("foo.bar")
+    x.warning("foo", big="x" * 5000)
+    assert len(sink.messages[0]) < 1000
+    assert json.loads(sink.messages[0])["big"].startswith("xxx")
+    # other sinks are not truncated
+    assert json.loads(UNIT_TESTS_JSON[0])["big"] == "x" * 5000
+    reset_unittests()
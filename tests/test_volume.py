@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+
+import force_unittests_mode  # noqa: F401
+import mflog
+from mflog import volume, UNIT_TESTS_JSON
+from mflog.unittests import reset_unittests
+
+
+def test_volume_profile():
+    reset_unittests()
+    mflog.set_config(volume_profile=True)
+    x = mflog.get_logger("foo.chatty")
+    for i in range(0, 10):
+        x.warning("message number %i", i)
+        x.warning("other message %i" % i)
+    mflog.get_logger("foo.quiet").warning("bar")
+    tmp = volume.get_volume()
+    assert tmp["json"]["events"] == 21
+    assert tmp["json"]["bytes"] > 0
+    first = tmp["json"]["top_events"][0]
+    assert first["name"] == "foo.chatty"
+    assert first["level"] == "warning"
+    assert first["count"] == 10
+    templates = [x["template"] for x in tmp["json"]["top_bytes"]]
+    assert "message number %i" in templates
+    assert "other message N" in templates
+    assert "foo.chatty" in volume.get_report()
+    mflog.set_config()
+    reset_unittests()
+
+
+def test_volume_profile_error(monkeypatch, capsys):
+    reset_unittests()
+    mflog.set_config(volume_profile=True)
+    errors = []
+    monkeypatch.setattr(mflog, "record_error", errors.append)
+
+    def broken(*args, **kwargs):
+        raise Exception("broken")
+
+    monkeypatch.setattr(volume, "record", broken)
+    mflog.get_logger("foo").warning("foo")
+    assert len(UNIT_TESTS_JSON) == 1
+    assert errors == []
+    assert "can't profile log volume" in capsys.readouterr().err
+    mflog.set_config()
+    reset_unittests()
+
+
+def test_no_volume_profile():
+    reset_unittests()
+    mflog.set_config()
+    mflog.get_logger("foo").warning("foo")
+    assert volume.VOLUME == {}